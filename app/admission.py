@@ -0,0 +1,222 @@
+"""
+In-process admission control for the expensive endpoints.
+
+Per request to a governed route, in order:
+  * load shedding: 503 + Retry-After when `max_inflight` governed requests
+    are already running in this process;
+  * a token bucket per (client, route prefix): 429 + Retry-After when empty.
+    The client is the API key header when sent, else the peer IP (or the
+    first X-Forwarded-For hop with "trust_forwarded");
+  * bulk jobs (/bulk, /bulk/stream): at most `max_bulk_jobs` at once, held
+    until a streamed response has finished;
+  * uploads: `max_upload_bytes` from Content-Length up front, and
+    check_upload() for the byte / row caps once the body is read.
+
+Settings come from DEFAULTS, overridden by the JSON file at ADMISSION_CONFIG
+(data/admission.json), which is re-read when its mtime changes. Off unless
+ADMISSION_ENABLED=1 or the file sets "enabled": true — behind a reverse proxy
+every client shares one IP until trust_forwarded is set.
+"""
+import copy
+import json
+import math
+import os
+import time
+from collections import OrderedDict
+
+from fastapi.responses import JSONResponse
+
+from . import metrics
+
+CONFIG_PATH = os.getenv("ADMISSION_CONFIG", os.path.join(os.path.dirname(__file__), "..", "data", "admission.json"))
+RELOAD_INTERVAL_S = 2.0
+MAX_CLIENTS = 100_000
+
+DEFAULTS = {
+    "enabled": os.getenv("ADMISSION_ENABLED", "0").strip().lower() in ("1", "true", "yes", "y"),
+    # path prefix -> bucket refill rate (requests/s) and burst size; longest prefix wins
+    "limits": {
+        "/predict": {"rate": 2, "burst": 10},
+        "/api/v1/": {"rate": 20, "burst": 100},
+        "/bulk": {"rate": 0.2, "burst": 3},
+        "/chat": {"rate": 5, "burst": 20},
+        "/wage": {"rate": 5, "burst": 20},
+    },
+    "methods": ["POST"],
+    "bulk_paths": ["/bulk", "/bulk/stream"],
+    "max_bulk_jobs": 2,
+    "max_upload_bytes": 50 * 1024 * 1024,
+    "max_upload_rows": 200_000,
+    "max_inflight": 256,
+    "shed_retry_after_s": 2,
+    "trust_forwarded": False,
+    "api_key_header": "X-API-Key",
+}
+
+_config = copy.deepcopy(DEFAULTS)
+_config_mtime = None
+_checked_at = 0.0
+
+# (client, prefix) -> [tokens, last refill]; least recently used first
+_buckets: "OrderedDict[tuple, list]" = OrderedDict()
+_inflight = 0
+_bulk_jobs = 0
+
+
+def config() -> dict:
+    """Current settings, re-reading CONFIG_PATH at most every RELOAD_INTERVAL_S when it changed."""
+    global _config, _config_mtime, _checked_at
+    now = time.monotonic()
+    if now - _checked_at < RELOAD_INTERVAL_S:
+        return _config
+    _checked_at = now
+    try:
+        mtime = os.path.getmtime(CONFIG_PATH)
+    except OSError:
+        mtime = None
+    if mtime != _config_mtime:
+        cfg = copy.deepcopy(DEFAULTS)
+        if mtime is not None:
+            try:
+                with open(CONFIG_PATH) as f:
+                    override = json.load(f)
+                limits = override.pop("limits", None)
+                cfg.update(override)
+                if limits is not None:
+                    cfg["limits"] = dict(cfg["limits"], **limits)
+                print(f"✅ Admission config loaded from {CONFIG_PATH}")
+            except Exception as e:
+                print("⚠️ Admission config not reloaded, keeping the previous one:", e)
+                return _config
+        _config, _config_mtime = cfg, mtime
+        _buckets.clear()
+    return _config
+
+
+def enabled() -> bool:
+    return bool(config()["enabled"])
+
+
+def client_id(request, cfg) -> str:
+    key = request.headers.get(cfg["api_key_header"])
+    if key:
+        return "key:" + key
+    if cfg["trust_forwarded"]:
+        fwd = request.headers.get("x-forwarded-for")
+        if fwd:
+            return "ip:" + fwd.split(",")[0].strip()
+    return "ip:" + (request.client.host if request.client else "unknown")
+
+
+def _route(path, cfg):
+    best = None
+    for prefix in cfg["limits"]:
+        if path.startswith(prefix) and (best is None or len(prefix) > len(best)):
+            best = prefix
+    return best
+
+
+def _take(client, prefix, limit):
+    """Take one token; returns 0 when admitted, else seconds until a token is available."""
+    rate, burst = float(limit["rate"]), float(limit["burst"])
+    now = time.monotonic()
+    key = (client, prefix)
+    bucket = _buckets.get(key)
+    if bucket is None:
+        bucket = _buckets[key] = [burst, now]
+        while len(_buckets) > MAX_CLIENTS:
+            _buckets.popitem(last=False)
+    else:
+        bucket[0] = min(burst, bucket[0] + (now - bucket[1]) * rate)
+        bucket[1] = now
+        _buckets.move_to_end(key)
+    if bucket[0] >= 1.0:
+        bucket[0] -= 1.0
+        return 0.0
+    return (1.0 - bucket[0]) / rate if rate > 0 else 60.0
+
+
+def _reject(route, outcome, status, message, retry_after):
+    metrics.inc("visa_admission_total", route=route, outcome=outcome)
+    headers = {"Retry-After": str(max(1, math.ceil(retry_after)))} if retry_after else {}
+    return JSONResponse({"error": message}, status_code=status, headers=headers)
+
+
+def check_upload(content: bytes):
+    """Error message when an uploaded file exceeds the byte or row cap, else None."""
+    cfg = config()
+    if not cfg["enabled"]:
+        return None
+    if len(content) > cfg["max_upload_bytes"]:
+        metrics.inc("visa_admission_total", route="upload", outcome="too_large")
+        return f"Upload too large: at most {cfg['max_upload_bytes'] // (1024 * 1024)} MB."
+    from .bulk_utils import upload_rows
+    if upload_rows(content, stop_after=cfg["max_upload_rows"]) > cfg["max_upload_rows"]:
+        metrics.inc("visa_admission_total", route="upload", outcome="too_many_rows")
+        return f"Upload too large: at most {cfg['max_upload_rows']:,} rows."
+    return None
+
+
+async def middleware(request, call_next):
+    global _inflight, _bulk_jobs
+    cfg = config()
+    path = request.url.path
+    route = _route(path, cfg) if cfg["enabled"] and request.method in cfg["methods"] else None
+    if route is None:
+        return await call_next(request)
+
+    if _inflight >= cfg["max_inflight"]:
+        return _reject(route, "shed", 503, "Server busy, please retry shortly.", cfg["shed_retry_after_s"])
+
+    wait = _take(client_id(request, cfg), route, cfg["limits"][route])
+    if wait:
+        return _reject(route, "rate_limited", 429, "Too many requests, please slow down.", wait)
+
+    is_bulk = path in cfg["bulk_paths"]
+    if is_bulk:
+        length = request.headers.get("content-length")
+        if length and length.isdigit() and int(length) > cfg["max_upload_bytes"]:
+            return _reject(route, "too_large", 413,
+                           f"Upload too large: at most {cfg['max_upload_bytes'] // (1024 * 1024)} MB.", 0)
+        if _bulk_jobs >= cfg["max_bulk_jobs"]:
+            return _reject(route, "bulk_busy", 429, "Too many bulk jobs running, please retry shortly.",
+                           cfg["shed_retry_after_s"])
+        _bulk_jobs += 1
+    _inflight += 1
+    metrics.inc("visa_admission_total", route=route, outcome="admitted")
+
+    def release():
+        global _inflight, _bulk_jobs
+        _inflight -= 1
+        if is_bulk:
+            _bulk_jobs -= 1
+
+    try:
+        response = await call_next(request)
+    except Exception:
+        release()
+        raise
+
+    body = getattr(response, "body_iterator", None)
+    if body is None:
+        release()
+        return response
+
+    # streamed bodies keep their slot until the last chunk is sent
+    async def released_at_end():
+        try:
+            async for chunk in body:
+                yield chunk
+        finally:
+            release()
+
+    response.body_iterator = released_at_end()
+    return response
+
+
+@metrics.register_collector
+def _admission_stats():
+    return [
+        ("visa_admission_inflight", "gauge", {}, _inflight),
+        ("visa_admission_bulk_jobs", "gauge", {}, _bulk_jobs),
+    ]
@@ -0,0 +1,129 @@
+import threading
+from bisect import bisect_left
+from functools import lru_cache
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from .preprocess import ENCODERS
+from .wage_utils import load_index
+from . import metrics
+
+# field -> (encoder columns, wage index column)
+FIELDS = {
+    "soc_code": (["SOC_CODE"], "SOC_CODE"),
+    "soc_title": (["SOC_TITLE"], None),
+    "state": (["WORKSITE_STATE", "EMPLOYER_STATE"], "WORKSITE_STATE"),
+    "employer": (["EMPLOYER_NAME"], None),
+    "job_title": (["JOB_TITLE"], None),
+    "city": (["WORKSITE_CITY"], None),
+}
+
+MAX_K = 50
+
+_indexes: Dict[str, Tuple[List[str], List[str], np.ndarray]] = {}
+_lock = threading.Lock()
+
+
+def _norm(s) -> str:
+    return str(s or "").strip().upper()
+
+
+def _build(field: str):
+    """
+    Sorted-array prefix index for one field: normalized keys, display values
+    and a frequency weight per entry.
+
+    Encoders are built from value_counts(), so a lower code means a more
+    frequent value. Wage-index case counts (n) dominate when available; the
+    encoder rank only breaks ties and ranks values the index does not cover.
+    """
+    enc_cols, wage_col = FIELDS[field]
+    weights: Dict[str, float] = {}
+    display: Dict[str, str] = {}
+
+    for col in enc_cols:
+        mapping = ENCODERS.get(col) or {}
+        size = len(mapping) + 1
+        for val, code in mapping.items():
+            key = _norm(val)
+            if not key or key in ("MISSING", "NAN"):
+                continue
+            w = (size - int(code)) / size
+            if w > weights.get(key, 0.0):
+                weights[key] = w
+                display[key] = str(val).strip()
+
+    if wage_col:
+        try:
+            df = load_index()
+            if "level" in df.columns:  # rollup rows would double-count and add major groups
+                df = df[df["level"] == "soc_state"]
+            counts = df.groupby(wage_col)["n"].sum()
+            for val, n in counts.items():
+                key = _norm(val)
+                if not key:
+                    continue
+                weights[key] = weights.get(key, 0.0) + float(n)
+                display.setdefault(key, str(val).strip())
+        except Exception as e:
+            print("⚠️ Autocomplete wage index unavailable:", e)
+
+    keys = sorted(weights)
+    values = [display[k] for k in keys]
+    w = np.array([weights[k] for k in keys], dtype=float)
+    return keys, values, w
+
+
+def get_index(field: str):
+    idx = _indexes.get(field)
+    if idx is None:
+        with _lock:
+            idx = _indexes.get(field)
+            if idx is None:
+                idx = _build(field)
+                _indexes[field] = idx
+    return idx
+
+
+@lru_cache(maxsize=4096)
+def _suggest(field: str, prefix: str, k: int) -> Tuple[str, ...]:
+    keys, values, weights = get_index(field)
+    lo = bisect_left(keys, prefix)
+    hi = bisect_left(keys, prefix + "\uffff", lo)
+    if hi <= lo:
+        return ()
+    w = weights[lo:hi]
+    if hi - lo > k:
+        top = np.argpartition(-w, k - 1)[:k]
+    else:
+        top = np.arange(hi - lo)
+    # stable ordering: heaviest first, alphabetical among equals
+    top = top[np.lexsort((top, -w[top]))]
+    return tuple(values[lo + int(i)] for i in top)
+
+
+@metrics.register_collector
+def _cache_stats():
+    info = _suggest.cache_info()
+    return [
+        ("visa_autocomplete_cache_hits_total", "counter", {}, info.hits),
+        ("visa_autocomplete_cache_misses_total", "counter", {}, info.misses),
+    ]
+
+
+def suggest(field: str, query: str, k: int = 10) -> List[str]:
+    """Top-k values of `field` starting with `query` (case-insensitive), most frequent first."""
+    if field not in FIELDS:
+        raise KeyError(field)
+    prefix = _norm(query)
+    if not prefix:
+        return []
+    k = max(1, min(int(k), MAX_K))
+    return list(_suggest(field, prefix, k))
+
+
+def warm():
+    """Build every index up front (e.g. before forking workers)."""
+    for field in FIELDS:
+        get_index(field)
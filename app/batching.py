@@ -0,0 +1,132 @@
+"""
+Micro-batching of concurrent single-applicant scoring.
+
+Handlers await MicroBatcher.submit(form). The first queued form opens a window
+of MICROBATCH_MAX_WAIT_MS (or until MICROBATCH_MAX_ROWS are queued); everything
+collected is scored with one score_forms call in a worker thread, and each
+handler gets its own row back. If that call fails the forms are rescored one
+at a time, so a bad form only fails its own request. While a batch is being scored the next one
+keeps filling, so under load batches grow on their own. MICROBATCH=0 scores
+every request directly.
+"""
+import asyncio
+import os
+import weakref
+from typing import Any, Callable, Dict, List
+
+from . import metrics, profiling
+
+ENABLED = os.getenv("MICROBATCH", "1").strip().lower() in ("1", "true", "yes", "y")
+MAX_WAIT_MS = float(os.getenv("MICROBATCH_MAX_WAIT_MS", 2))
+MAX_ROWS = int(os.getenv("MICROBATCH_MAX_ROWS", 64))
+THREADED = os.getenv("MICROBATCH_THREADED", "1").strip().lower() in ("1", "true", "yes", "y")
+
+
+class MicroBatcher:
+
+    def __init__(self, score: Callable[[List[Dict[str, Any]], bool], List[Any]],
+                 max_rows: int = MAX_ROWS, max_wait_ms: float = MAX_WAIT_MS, threaded: bool = THREADED):
+        self.score = score
+        self.threaded = threaded
+        self.max_rows = max(1, max_rows)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        # loop -> {explain: (queue, "full" event, consumer task)}; the task and queue
+        # hold their loop, so closed loops are also pruned when a lane is created
+        self._lanes = weakref.WeakKeyDictionary()
+
+    def _lane(self, explain):
+        loop = asyncio.get_running_loop()
+        lanes = self._lanes.get(loop)
+        if lanes is None:
+            for closed in [lp for lp in self._lanes if lp.is_closed()]:
+                del self._lanes[closed]
+            lanes = self._lanes[loop] = {}
+        lane = lanes.get(explain)
+        if lane is None or lane[2].done():
+            queue, full = asyncio.Queue(), asyncio.Event()
+            task = loop.create_task(self._consume(queue, full, explain))
+            lane = lanes[explain] = (queue, full, task)
+        return lane
+
+    async def submit(self, form: Dict[str, Any], explain: bool = True):
+        queue, full, _ = self._lane(explain)
+        fut = asyncio.get_running_loop().create_future()
+        queue.put_nowait((form, fut, profiling.current()))
+        if queue.qsize() >= self.max_rows:
+            full.set()
+        return await fut
+
+    def _score_each(self, forms, explain, requests=()):
+        """[(result, exception)] per form: one batched call, row by row if it fails."""
+        with profiling.worker(requests):
+            return self._score_batch(forms, explain)
+
+    def _score_batch(self, forms, explain):
+        try:
+            return [(r, None) for r in self.score(forms, explain)]
+        except Exception as e:
+            if len(forms) == 1:
+                return [(None, e)]
+            print("⚠️ Micro-batch failed, scoring forms one by one:", e)
+            metrics.inc("visa_fallback_total", kind="microbatch_row_by_row")
+        out = []
+        for form in forms:
+            try:
+                out.append((self.score([form], explain)[0], None))
+            except Exception as e:
+                out.append((None, e))
+        return out
+
+    async def _consume(self, queue, full, explain):
+        while True:
+            batch = [await queue.get()]
+            if self.max_wait and queue.qsize() + 1 < self.max_rows:
+                try:
+                    await asyncio.wait_for(full.wait(), self.max_wait)
+                except asyncio.TimeoutError:
+                    pass
+            full.clear()
+            while len(batch) < self.max_rows and not queue.empty():
+                batch.append(queue.get_nowait())
+            if queue.qsize() >= self.max_rows:
+                full.set()
+
+            batch = [item for item in batch if not item[1].done()]
+            if not batch:
+                continue
+            metrics.inc("visa_microbatch_batches_total")
+            metrics.inc("visa_microbatch_rows_total", len(batch))
+            with metrics.stage("microbatch.score"):
+                forms = [form for form, _, _ in batch]
+                # the requests being profiled, so their profiles include the worker thread
+                requests = {req for _, _, req in batch if req is not None}
+                if self.threaded:
+                    results = await asyncio.to_thread(self._score_each, forms, explain, requests)
+                else:
+                    results = self._score_each(forms, explain, requests)
+            for (_, fut, _), (result, exc) in zip(batch, results):
+                if fut.done():
+                    continue
+                if exc is not None:
+                    fut.set_exception(exc)
+                else:
+                    fut.set_result(result)
+
+
+_batcher = None
+
+
+def get_batcher() -> MicroBatcher:
+    global _batcher
+    if _batcher is None:
+        from .scoring import score_forms
+        _batcher = MicroBatcher(lambda forms, explain: score_forms(forms, explain=explain))
+    return _batcher
+
+
+async def score_one(form: Dict[str, Any], explain: bool = True) -> Dict[str, Any]:
+    """score_forms([form])[0], coalesced with concurrent callers when MICROBATCH is on."""
+    if not ENABLED:
+        from .scoring import score_forms
+        return score_forms([form], explain=explain)[0]
+    return await get_batcher().submit(form, explain)
@@ -0,0 +1,137 @@
+"""
+Historical certification statistics per employer, per SOC and per
+(employer, worksite state), from the LCA disclosure CSV.
+
+    python app/build_employer_stats.py [path/to/disclosure.csv]
+
+The CSV is streamed in chunks. Counts are summed per key; wage percentiles
+come from a fixed log-spaced histogram per key, so memory is bounded by the
+number of distinct (key, wage bin) pairs rather than by the row count.
+Writes data/cache/employer_stats.parquet.
+"""
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+BASE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DATA = os.path.join(BASE, "data", "H1B_LCA_Disclosure_Data.csv")
+OUT = os.path.join(BASE, "data", "cache", "employer_stats.parquet")
+CHUNKSIZE = 200_000
+
+UNIT_MULT = {
+    "year": 1, "yr": 1, "annual": 1, "hour": 2080, "hr": 2080, "week": 52, "wk": 52,
+    "month": 12, "mo": 12, "day": 260, "d": 260, "bi-weekly": 26, "biweekly": 26,
+}
+# 256 log-spaced wage bins between 5k and 1M a year (about 2% wide)
+WAGE_EDGES = np.geomspace(5_000, 1_000_000, 257)
+WAGE_MID = np.sqrt(WAGE_EDGES[:-1] * WAGE_EDGES[1:])
+PRIOR_WEIGHT = 20  # pseudo-cases pulling small keys toward the global rate
+
+LEVELS = {
+    "employer": ["EMPLOYER_NAME"],
+    "soc": ["SOC_CODE"],
+    "employer_state": ["EMPLOYER_NAME", "WORKSITE_STATE"],
+}
+USECOLS = ["CASE_STATUS", "EMPLOYER_NAME", "SOC_CODE", "WORKSITE_STATE", "WAGE_RATE_OF_PAY_FROM", "WAGE_UNIT_OF_PAY"]
+
+
+def norm_employer(s: pd.Series) -> pd.Series:
+    return s.astype(str).str.upper().str.split().str.join(" ")
+
+
+def norm_soc(s: pd.Series) -> pd.Series:
+    """'15-1252.00' and '15-1252' both become '15-1252'."""
+    s = s.astype(str).str.strip()
+    return s.str.extract(r"^(\d{2}-\d{4})", expand=False).fillna(s.str.upper())
+
+
+def _prepare(chunk: pd.DataFrame) -> pd.DataFrame:
+    chunk = chunk.dropna(subset=["CASE_STATUS"])
+    mult = chunk["WAGE_UNIT_OF_PAY"].astype(str).str.strip().str.lower().map(UNIT_MULT)
+    wage = pd.to_numeric(chunk["WAGE_RATE_OF_PAY_FROM"], errors="coerce") * mult
+    wage = wage.where((wage > 5_000) & (wage < 1_000_000))
+    bins = np.searchsorted(WAGE_EDGES, wage.to_numpy(), side="right") - 1
+    return pd.DataFrame({
+        "EMPLOYER_NAME": norm_employer(chunk["EMPLOYER_NAME"].fillna("")),
+        "SOC_CODE": norm_soc(chunk["SOC_CODE"].fillna("")),
+        "WORKSITE_STATE": chunk["WORKSITE_STATE"].fillna("").astype(str).str.strip().str.upper(),
+        "certified": chunk["CASE_STATUS"].astype(str).str.lower().eq("certified").astype(np.int64),
+        "wage_bin": np.where(wage.notna().to_numpy(), bins, -1),
+    })
+
+
+def _percentiles(hist: pd.DataFrame, keys, qs=(0.25, 0.5, 0.75)) -> pd.DataFrame:
+    """Per-key wage quantiles from long-format (keys..., wage_bin, count) histograms."""
+    hist = hist[hist["wage_bin"] >= 0].sort_values(keys + ["wage_bin"])
+    cum = hist.groupby(keys, sort=False)["count"].cumsum()
+    total = hist.groupby(keys, sort=False)["count"].transform("sum")
+    out = None
+    for q, name in zip(qs, ("wage_p25", "wage_median", "wage_p75")):
+        first = hist[cum >= q * total].groupby(keys, sort=False)["wage_bin"].first()
+        col = pd.Series(WAGE_MID[first.to_numpy()].round(-2), index=first.index, name=name)
+        out = col.to_frame() if out is None else out.join(col)
+    return out
+
+
+def _collapse(parts, nlevels):
+    """Sum a list of partial aggregates into one, so memory tracks distinct keys, not chunks."""
+    return [pd.concat(parts).groupby(level=list(range(nlevels))).sum()]
+
+
+def build(path: str = DATA, out_path: str = OUT, chunksize: int = CHUNKSIZE) -> pd.DataFrame:
+    counts = {lvl: [] for lvl in LEVELS}
+    hists = {lvl: [] for lvl in LEVELS}
+    rows = 0
+    for chunk in pd.read_csv(path, usecols=lambda c: c in USECOLS, chunksize=chunksize, low_memory=False, dtype=str):
+        df = _prepare(chunk)
+        rows += len(df)
+        for lvl, keys in LEVELS.items():
+            valid = df[(df[keys] != "").all(axis=1)]
+            counts[lvl].append(valid.groupby(keys)["certified"].agg(["size", "sum"]))
+            hists[lvl].append(valid.groupby(keys + ["wage_bin"]).size().rename("count"))
+            if len(counts[lvl]) >= 8:
+                counts[lvl] = _collapse(counts[lvl], len(keys))
+                hists[lvl] = _collapse(hists[lvl], len(keys) + 1)
+        print(f"  … {rows:,} rows", flush=True)
+
+    parts = []
+    for lvl, keys in LEVELS.items():
+        if not counts[lvl]:
+            continue
+        c = _collapse(counts[lvl], len(keys))[0]
+        c.columns = ["n", "certified"]
+        h = _collapse(hists[lvl], len(keys) + 1)[0].reset_index()
+        c = c.join(_percentiles(h, keys))
+        c = c.reset_index()
+        parts.append(pd.DataFrame({
+            "level": lvl,
+            "key": c[keys[0]],
+            "state": c[keys[1]] if len(keys) > 1 else "",
+            "n": c["n"].astype(np.int32),
+            "certified": c["certified"].astype(np.int32),
+            "wage_p25": c["wage_p25"].astype(np.float32),
+            "wage_median": c["wage_median"].astype(np.float32),
+            "wage_p75": c["wage_p75"].astype(np.float32),
+        }))
+
+    stats = pd.concat(parts, ignore_index=True)
+    emp = stats[stats["level"] == "employer"]
+    global_rate = emp["certified"].sum() / max(emp["n"].sum(), 1)
+    stats["rate"] = (stats["certified"] / stats["n"]).astype(np.float32)
+    stats["rate_smoothed"] = ((stats["certified"] + PRIOR_WEIGHT * global_rate) / (stats["n"] + PRIOR_WEIGHT)).astype(np.float32)
+    stats["level"] = stats["level"].astype("category")
+
+    os.makedirs(os.path.dirname(out_path), exist_ok=True)
+    stats.to_parquet(out_path, index=False)
+    print("✅ Wrote:", out_path)
+    print("✅ Rows:", len(stats), f"(global certification rate {global_rate:.3f})")
+    return stats
+
+
+if __name__ == "__main__":
+    src = sys.argv[1] if len(sys.argv) > 1 else DATA
+    print("📥 Reading:", src)
+    build(src)
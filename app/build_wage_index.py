@@ -1,13 +1,37 @@
+"""
+Wage benchmarks from the LCA disclosure CSV, as a rollup cube:
+
+    soc_state       (SOC, worksite state)
+    major_state     (SOC major group, e.g. 15-0000, worksite state)
+    soc_national    (SOC, all states)
+    major_national  (SOC major group, all states)
+
+Each row has median/p25/p75/n and a 21-point quantile array (every 5th
+percentile) so wage_utils can answer percentile-rank queries. National rows
+have an empty WORKSITE_STATE.
+
+    python app/build_wage_index.py [path/to/disclosure.csv]
+"""
 import os
+import sys
+
 import pandas as pd
 import numpy as np
 
-BASE = os.path.dirname(os.path.dirname(__file__))
+BASE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
 DATA = os.path.join(BASE, "data", "H1B_LCA_Disclosure_Data.csv")
 OUT  = os.path.join(BASE, "data", "cache")
 
-os.makedirs(OUT, exist_ok=True)
+QUANTILES = np.linspace(0.0, 1.0, 21)
+
+# (level, SOC key column, state column or None for national), most specific first
+LEVELS = [
+    ("soc_state", "SOC_CODE", "WORKSITE_STATE"),
+    ("major_state", "SOC_MAJOR", "WORKSITE_STATE"),
+    ("soc_national", "SOC_CODE", None),
+    ("major_national", "SOC_MAJOR", None),
+]
 
 def to_yearly(value, unit):
     if pd.isna(value):
@@ -26,41 +50,63 @@ def to_yearly(value, unit):
     if u in ("bi-weekly", "biweekly"):  return v * 26
     return np.nan
 
-print("📥 Reading:", DATA)
+def major_group(soc: pd.Series) -> pd.Series:
+    """'15-1252.00' -> '15-0000'; codes without a 2-digit prefix have no major group."""
+    prefix = soc.astype(str).str.extract(r"^(\d{2})-", expand=False)
+    return (prefix + "-0000").fillna("")
 
-usecols = [
-    "SOC_CODE","WORKSITE_STATE","WAGE_RATE_OF_PAY_FROM",
-    "WAGE_UNIT_OF_PAY","JOB_TITLE"
-]
+def build_rollups(df: pd.DataFrame) -> pd.DataFrame:
+    """Rollup cube from rows with SOC_CODE, WORKSITE_STATE and yearly WAGE_YR."""
+    df = df.assign(SOC_MAJOR=major_group(df["SOC_CODE"]))
+    parts = []
+    for level, soc_col, state_col in LEVELS:
+        keys = [soc_col] + ([state_col] if state_col else [])
+        sub = df[df[soc_col] != ""]
+        q = sub.groupby(keys)["WAGE_YR"].quantile(QUANTILES).unstack()
+        n = sub.groupby(keys).size()
+        q = q.reset_index()
+        parts.append(pd.DataFrame({
+            "level": level,
+            "SOC_CODE": q[soc_col],
+            "WORKSITE_STATE": q[state_col] if state_col else "",
+            "median_wage": q[0.5],
+            "p25": q[0.25],
+            "p75": q[0.75],
+            "n": n.to_numpy(),
+            "quantiles": q[list(QUANTILES)].to_numpy().round(2).tolist(),
+        }))
+    return pd.concat(parts, ignore_index=True)
+
+def main(path=DATA):
+    os.makedirs(OUT, exist_ok=True)
+    print("📥 Reading:", path)
+
+    usecols = [
+        "SOC_CODE","WORKSITE_STATE","WAGE_RATE_OF_PAY_FROM",
+        "WAGE_UNIT_OF_PAY","JOB_TITLE"
+    ]
 
-df = pd.read_csv(DATA, usecols=usecols, low_memory=False)
+    df = pd.read_csv(path, usecols=usecols, low_memory=False)
 
-df["SOC_CODE"] = df["SOC_CODE"].astype(str).str.strip()
-df["WORKSITE_STATE"] = df["WORKSITE_STATE"].astype(str).str.strip()
+    df["SOC_CODE"] = df["SOC_CODE"].astype(str).str.strip()
+    df["WORKSITE_STATE"] = df["WORKSITE_STATE"].astype(str).str.strip()
 
-df["WAGE_YR"] = df.apply(
-    lambda r: to_yearly(r["WAGE_RATE_OF_PAY_FROM"], r["WAGE_UNIT_OF_PAY"]),
-    axis=1,
-)
+    df["WAGE_YR"] = df.apply(
+        lambda r: to_yearly(r["WAGE_RATE_OF_PAY_FROM"], r["WAGE_UNIT_OF_PAY"]),
+        axis=1,
+    )
 
-df = df.dropna(subset=["SOC_CODE","WORKSITE_STATE","WAGE_YR"])
-df = df[(df["WAGE_YR"] > 5000) & (df["WAGE_YR"] < 1_000_000)]
+    df = df.dropna(subset=["SOC_CODE","WORKSITE_STATE","WAGE_YR"])
+    df = df[(df["WAGE_YR"] > 5000) & (df["WAGE_YR"] < 1_000_000)]
 
-print("🧮 Aggregating medians…")
+    print("🧮 Aggregating rollups…")
+    agg = build_rollups(df)
 
-agg = (
-    df.groupby(["SOC_CODE","WORKSITE_STATE"])
-      .agg(
-          median_wage=("WAGE_YR","median"),
-          p25=("WAGE_YR", lambda x: np.percentile(x,25)),
-          p75=("WAGE_YR", lambda x: np.percentile(x,75)),
-          n=("WAGE_YR","size")
-      )
-      .reset_index()
-)
+    out_path = os.path.join(OUT, "wage_index.parquet")
+    agg.to_parquet(out_path, index=False)
 
-out_path = os.path.join(OUT, "wage_index.parquet")
-agg.to_parquet(out_path, index=False)
+    print("✅ Wrote:", out_path)
+    print("✅ Rows:", len(agg), dict(agg["level"].value_counts()))
 
-print("✅ Wrote:", out_path)
-print("✅ Rows:", len(agg))
+if __name__ == "__main__":
+    main(sys.argv[1] if len(sys.argv) > 1 else DATA)
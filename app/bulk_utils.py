@@ -1,139 +1,333 @@
+import codecs
+import io
 import os
 import time
+import uuid
 import pandas as pd
 import numpy as np
-from datetime import datetime
-from .preprocess import prepare_input_dict
-from .model_utils import predict_proba_from_df, generate_recommendations
-from .scorecard import compute_strength_score
+from .scoring import score_frame
+from .model_utils import BULK_MODEL
+from .employer_stats import history_columns
+from . import metrics
+
+# canonical column -> accepted (normalised) upload headers, in priority order
+BULK_ALIASES = {
+    "VISA_CLASS": ["VISA_CLASS", "VISA", "VISA_CLASS_"],
+    "JOB_TITLE": ["JOB_TITLE", "TITLE"],
+    "SOC_CODE": ["SOC_CODE"],
+    "SOC_TITLE": ["SOC_TITLE"],
+    "EMPLOYER_NAME": ["EMPLOYER_NAME", "EMPLOYER", "COMPANY"],
+    "EMPLOYER_STATE": ["EMPLOYER_STATE", "EMPLOYER_ST", "EMPLOYERSTATE"],
+    "WORKSITE_STATE": ["WORKSITE_STATE"],
+    "WORKSITE_CITY": ["WORKSITE_CITY"],
+    "FULL_TIME_POSITION": ["FULL_TIME_POSITION", "FULL_TIME", "FULLTIME_POSITION"],
+    "TOTAL_WORKER_POSITIONS": ["TOTAL_WORKER_POSITIONS", "NUM_POSITIONS", "POSITIONS"],
+    "WAGE_RATE_OF_PAY_FROM": ["WAGE_RATE_OF_PAY_FROM", "WAGE_RATE_OF_PAY", "OFFERED_WAGE", "WAGE"],
+    "WAGE_UNIT_OF_PAY": ["WAGE_UNIT_OF_PAY", "WAGE_UNIT"],
+    "PREVAILING_WAGE": ["PREVAILING_WAGE", "PREVAILING", "PW"],
+    "NEW_EMPLOYMENT": ["NEW_EMPLOYMENT"],
+    "CONTINUED_EMPLOYMENT": ["CONTINUED_EMPLOYMENT"],
+    "CHANGE_EMPLOYER": ["CHANGE_EMPLOYER"],
+    "H_1B_DEPENDENT": ["H_1B_DEPENDENT", "H1B_DEPENDENT"],
+    "WILLFUL_VIOLATOR": ["WILLFUL_VIOLATOR"],
+    "AGREE_TO_LC_STATEMENT": ["AGREE_TO_LC_STATEMENT", "AGREE_TO_LC"],
+    "BEGIN_DATE": ["BEGIN_DATE"],
+    "END_DATE": ["END_DATE"],
+    "EMAIL": ["EMAIL", "EMAIL_ADDRESS", "CONTACT_EMAIL"],
+}
+
+BULK_DEFAULTS = {"FULL_TIME_POSITION": "N"}
+
+# canonical columns that never reach the model or the result row; rows that
+# differ only here are scored once
+NON_SCORING_COLUMNS = {"EMAIL"}
+
+RESULT_COLUMNS = [
+    "EMPLOYER_NAME", "JOB_TITLE", "OFFERED_WAGE", "FULL_TIME_POSITION",
+    "probability_%", "recommendation",
+    "score_wage", "score_compliance", "score_stability", "score_docs", "score_total",
+    "employer_cert_rate", "employer_cases", "soc_cert_rate", "employer_state_cert_rate",
+]
+
+# every upload header some alias reads; other columns are never parsed
+UPLOAD_COLUMNS = {k for keys in BULK_ALIASES.values() for k in keys}
+
+# leading bytes -> upload format; anything else is read as plain CSV
+UPLOAD_MAGIC = [
+    (b"PAR1", "parquet"),
+    (b"ARROW1", "arrow"),            # Arrow IPC file, i.e. Feather v2
+    (b"FEA1", "feather_v1"),
+    (b"\xff\xff\xff\xff", "arrow_stream"),
+    (b"\x1f\x8b", "csv.gz"),
+    (b"\x28\xb5\x2f\xfd", "csv.zst"),
+]
+
+def _norm_name(c) -> str:
+    return str(c).strip().upper().replace(" ", "_")
 
 def _norm_cols(df: pd.DataFrame) -> pd.DataFrame:
     df = df.copy()
-    df.columns = [str(c).strip().upper().replace(" ", "_") for c in df.columns]
+    df.columns = [_norm_name(c) for c in df.columns]
     return df
 
-def _safe_get(row, keys, default=None):
-    for k in keys:
-        if k in row and pd.notnull(row[k]) and str(row[k]).strip() != "":
-            return row[k]
-    return default
+def _wanted(c) -> bool:
+    return _norm_name(c) in UPLOAD_COLUMNS
 
-def _to_float(x, default=0.0):
+def upload_format(content: bytes) -> str:
+    for magic, fmt in UPLOAD_MAGIC:
+        if content.startswith(magic):
+            return fmt
+    return "csv"
+
+def csv_encoding(sample: bytes) -> str:
+    """utf-8 unless `sample` (the whole file or its first block) does not decode, then latin-1."""
     try:
-        if x is None or (isinstance(x, float) and np.isnan(x)):
-            return default
-        return float(str(x).replace(',', '').strip())
-    except Exception:
-        return default
-
-def _parse_date(s):
-    if s is None or (isinstance(s, float) and np.isnan(s)):
-        return None
+        sample.decode("utf-8")
+        return "utf-8"
+    except UnicodeDecodeError as e:
+        # a block boundary can split a multi-byte character
+        return "utf-8" if e.reason == "unexpected end of data" else "latin-1"
+
+def stream_encoding(stream) -> str:
+    """csv_encoding over a whole stream, decoded block by block, so compressed uploads get the same answer as plain ones."""
+    decoder = codecs.getincrementaldecoder("utf-8")()
     try:
-        return pd.to_datetime(str(s))
-    except Exception:
-        return None
-
-def process_bulk_csv(df: pd.DataFrame, export_dir: str):
-    df = _norm_cols(df)
-    results = []
-    for idx, row in df.iterrows():
-        try:
-            form = {
-                "VISA_CLASS": _safe_get(row, ["VISA_CLASS", "VISA", "VISA_CLASS_"]),
-                "JOB_TITLE": _safe_get(row, ["JOB_TITLE", "TITLE"]),
-                "SOC_CODE": _safe_get(row, ["SOC_CODE"]),
-                "SOC_TITLE": _safe_get(row, ["SOC_TITLE"]),
-                "EMPLOYER_NAME": _safe_get(row, ["EMPLOYER_NAME", "EMPLOYER", "COMPANY"]),
-                "EMPLOYER_STATE": _safe_get(row, ["EMPLOYER_STATE", "EMPLOYER_ST", "EMPLOYERSTATE"]),
-                "WORKSITE_STATE": _safe_get(row, ["WORKSITE_STATE", "WORKSITE_STATE", "WORKSITE_STATE"]),
-                "WORKSITE_CITY": _safe_get(row, ["WORKSITE_CITY", "WORKSITE_CITY", "WORKSITE_CITY"]),
-                "FULL_TIME_POSITION": _safe_get(row, ["FULL_TIME_POSITION", "FULL_TIME", "FULLTIME_POSITION"], default="N"),
-                "TOTAL_WORKER_POSITIONS": _safe_get(row, ["TOTAL_WORKER_POSITIONS", "NUM_POSITIONS", "POSITIONS"]),
-                "WAGE_RATE_OF_PAY_FROM": _safe_get(row, ["WAGE_RATE_OF_PAY_FROM", "WAGE_RATE_OF_PAY", "OFFERED_WAGE", "WAGE"]),
-                "WAGE_UNIT_OF_PAY": _safe_get(row, ["WAGE_UNIT_OF_PAY", "WAGE_UNIT", "WAGE_UNIT_OF_PAY"]),
-                "PREVAILING_WAGE": _safe_get(row, ["PREVAILING_WAGE", "PREVAILING", "PW"]),
-                "NEW_EMPLOYMENT": _safe_get(row, ["NEW_EMPLOYMENT"]),
-                "CONTINUED_EMPLOYMENT": _safe_get(row, ["CONTINUED_EMPLOYMENT"]),
-                "CHANGE_EMPLOYER": _safe_get(row, ["CHANGE_EMPLOYER"]),
-                "H_1B_DEPENDENT": _safe_get(row, ["H_1B_DEPENDENT", "H1B_DEPENDENT"]),
-                "WILLFUL_VIOLATOR": _safe_get(row, ["WILLFUL_VIOLATOR"]),
-                "AGREE_TO_LC_STATEMENT": _safe_get(row, ["AGREE_TO_LC_STATEMENT", "AGREE_TO_LC"]),
-                "BEGIN_DATE": _safe_get(row, ["BEGIN_DATE"]),
-                "END_DATE": _safe_get(row, ["END_DATE"]),
-                "EMAIL": _safe_get(row, ["EMAIL", "EMAIL_ADDRESS", "CONTACT_EMAIL"]),
-            }
-
-            bdt = _parse_date(form.get("BEGIN_DATE"))
-            edt = _parse_date(form.get("END_DATE"))
-            derived = {
-                "BEGIN_YEAR": int(bdt.year) if bdt is not None else 0,
-                "DURATION_DAYS": int((edt - bdt).days) if (bdt is not None and edt is not None) else 0
-            }
-
-            try:
-                scorecard = compute_strength_score(form, derived)
-            except TypeError:
-                scorecard = compute_strength_score(form, derived, offered_wage=form.get("WAGE_RATE_OF_PAY_FROM"))
-
-            try:
-                X = prepare_input_dict(form)
-                prob, feature_impact = predict_proba_from_df(X)
-            except Exception as e:
-                prob = 0.0
-                feature_impact = {}
-
-            try:
-                recs = generate_recommendations(feature_impact)
-            except Exception:
-                recs = []
-
-            if isinstance(prob, (float, int)):
-                pct = float(prob) * 100.0
-                if pct > 75:
-                    rec_label = "✅ High chance of approval"
-                elif pct > 45:
-                    rec_label = "⚠️ Moderate likelihood of approval"
-                else:
-                    rec_label = "❌ High chance of denial"
-            else:
-                pct = "N/A"
-                rec_label = "Error in prediction"
-
-            results.append({
-                "EMPLOYER_NAME": form.get("EMPLOYER_NAME"),
-                "JOB_TITLE": form.get("JOB_TITLE"),
-                "OFFERED_WAGE": form.get("WAGE_RATE_OF_PAY_FROM"),
-                "FULL_TIME_POSITION": form.get("FULL_TIME_POSITION"),
-                "probability_%": round(pct, 2) if isinstance(pct, float) else pct,
-                "recommendation": rec_label,
-                "score_wage": scorecard.get("wage_score", 0),
-                "score_compliance": scorecard.get("compliance_score", 0),
-                "score_stability": scorecard.get("stability_score", 0),
-                "score_docs": scorecard.get("documentation_score", 0),
-                "score_total": scorecard.get("total_score", 0),
-            })
+        while True:
+            block = stream.read(1 << 20)
+            if not block:
+                decoder.decode(b"", final=True)
+                return "utf-8"
+            decoder.decode(block)
+    except UnicodeDecodeError as e:
+        return "utf-8" if e.reason == "unexpected end of data" else "latin-1"
+
+def _decompressed(content: bytes, fmt: str):
+    import pyarrow as pa
+    return pa.CompressedInputStream(pa.BufferReader(content), "gzip" if fmt == "csv.gz" else "zstd")
+
+def _arrow_batches(content: bytes, fmt: str):
+    """Record batches of a Parquet / Arrow upload, projected to the alias columns, one row group or batch at a time."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    import pyarrow.feather as feather
+    buf = pa.BufferReader(content)  # zero-copy over the uploaded bytes
+    if fmt == "parquet":
+        pf = pq.ParquetFile(buf)
+        cols = [c for c in pf.schema_arrow.names if _wanted(c)]
+        for i in range(pf.num_row_groups):
+            yield from pf.read_row_group(i, columns=cols).to_batches()
+        return
+    if fmt == "arrow":
+        reader = pa.ipc.open_file(buf)
+        batches = (reader.get_batch(i) for i in range(reader.num_record_batches))
+    elif fmt == "arrow_stream":
+        batches = pa.ipc.open_stream(buf)
+    else:
+        batches = feather.read_table(buf).to_batches()
+    for batch in batches:
+        yield batch.select([c for c in batch.schema.names if _wanted(c)])
+
+def iter_upload(content: bytes, chunk_size: int = 50_000):
+    """
+    Raw upload chunks (DataFrames of at most chunk_size rows) from CSV,
+    gzip/zstd CSV, Parquet or Arrow IPC / Feather bytes, detected from the
+    leading bytes. Only columns some BULK_ALIASES entry reads are parsed;
+    Parquet row groups and Arrow batches are converted one at a time and
+    compressed CSV is decompressed as it is parsed.
+    """
+    fmt = upload_format(content)
+    metrics.inc("visa_bulk_uploads_total", format=fmt)
+    if fmt == "csv":
+        yield from pd.read_csv(io.BytesIO(content), encoding=csv_encoding(content),
+                               usecols=_wanted, chunksize=chunk_size)
+    elif fmt in ("csv.gz", "csv.zst"):
+        # a first pass over the decompressed bytes: a latin-1 byte late in the file
+        # must not surface as a UnicodeDecodeError halfway through the stream
+        encoding = stream_encoding(_decompressed(content, fmt))
+        yield from pd.read_csv(_decompressed(content, fmt), encoding=encoding,
+                               usecols=_wanted, chunksize=chunk_size)
+    else:
+        for batch in _arrow_batches(content, fmt):
+            for start in range(0, batch.num_rows, chunk_size):
+                yield batch.slice(start, chunk_size).to_pandas()
+
+def upload_rows(content: bytes, stop_after: int = None) -> int:
+    """
+    Row count for the admission cap: from the footer / batches for Parquet and
+    Arrow, from newlines for CSV (which over-counts quoted multi-line cells,
+    erring on the safe side). Compressed CSV is counted while decompressing
+    and stops once past stop_after.
+    """
+    fmt = upload_format(content)
+    if fmt == "csv":
+        return content.count(b"\n") - 1
+    if fmt in ("csv.gz", "csv.zst"):
+        stream = _decompressed(content, fmt)
+        lines = 0
+        while stop_after is None or lines - 1 <= stop_after:
+            block = stream.read(1 << 20)
+            if not block:
+                break
+            lines += block.count(b"\n")
+        return lines - 1
+    if fmt == "parquet":
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        return pq.ParquetFile(pa.BufferReader(content)).metadata.num_rows
+    return sum(batch.num_rows for batch in _arrow_batches(content, fmt))
 
+def _coalesce(df: pd.DataFrame, keys, default=None) -> pd.Series:
+    """First non-blank value among `keys` per row, else `default`."""
+    out = pd.Series([default] * len(df), index=df.index, dtype=object)
+    filled = np.zeros(len(df), dtype=bool)
+    for k in keys:
+        if k not in df.columns:
+            continue
+        col = df[k]
+        ok = (col.notna() & (col.astype(str).str.strip() != "")).to_numpy()
+        take = ok & ~filled
+        if take.any():
+            out[take] = col[take].astype(object)
+        filled |= ok
+    return out
+
+def canonical_forms(df: pd.DataFrame) -> pd.DataFrame:
+    """Map an upload (already through _norm_cols) onto the canonical form columns."""
+    return pd.DataFrame({
+        col: _coalesce(df, keys, BULK_DEFAULTS.get(col)) for col, keys in BULK_ALIASES.items()
+    }, index=df.index)
+
+def _result_frame(forms: pd.DataFrame, out: pd.DataFrame) -> pd.DataFrame:
+    forms = forms.reset_index(drop=True)
+    history = history_columns(forms["EMPLOYER_NAME"], forms["SOC_CODE"], forms["WORKSITE_STATE"])
+    return pd.DataFrame({
+        "EMPLOYER_NAME": forms["EMPLOYER_NAME"],
+        "JOB_TITLE": forms["JOB_TITLE"],
+        "OFFERED_WAGE": forms["WAGE_RATE_OF_PAY_FROM"],
+        "FULL_TIME_POSITION": forms["FULL_TIME_POSITION"],
+        "probability_%": (out["probability"] * 100.0).round(2),
+        "recommendation": out["recommendation"],
+        "score_wage": out["wage_score"],
+        "score_compliance": out["compliance_score"],
+        "score_stability": out["stability_score"],
+        "score_docs": out["documentation_score"],
+        "score_total": out["total_score"],
+        **history,
+    })
+
+def _error_row(form, exc):
+    return {
+        "EMPLOYER_NAME": form.get("EMPLOYER_NAME"),
+        "JOB_TITLE": form.get("JOB_TITLE"),
+        "OFFERED_WAGE": form.get("WAGE_RATE_OF_PAY_FROM"),
+        "FULL_TIME_POSITION": form.get("FULL_TIME_POSITION"),
+        "probability_%": "N/A",
+        "recommendation": f"Error: {str(exc)}",
+        "score_wage": 0,
+        "score_compliance": 0,
+        "score_stability": 0,
+        "score_docs": 0,
+        "score_total": 0,
+        "employer_cert_rate": None,
+        "employer_cases": None,
+        "soc_cert_rate": None,
+        "employer_state_cert_rate": None,
+    }
+
+def _scenario_codes(forms: pd.DataFrame):
+    """Per-row scenario id (0..k-1 in order of first appearance) and each scenario's first row."""
+    codes = np.zeros(len(forms), dtype=np.int64)
+    for c in forms.columns:
+        if c in NON_SCORING_COLUMNS:
+            continue
+        col_codes, uniques = pd.factorize(forms[c])
+        # mixed radix over the columns so far, re-factorized to stay below len(forms)
+        codes, _ = pd.factorize(codes * (len(uniques) + 1) + col_codes + 1)
+    first = np.unique(codes, return_index=True)[1]
+    return codes, first
+
+def score_bulk_forms(forms: pd.DataFrame) -> pd.DataFrame:
+    """
+    Score canonical forms in one vectorized pass (same rules and scorecard as
+    /predict). Identical scenarios are scored once and fanned back out in
+    input order; attrs["rows"] / attrs["unique_rows"] report the collapse.
+    """
+    if forms.empty:
+        return pd.DataFrame(columns=RESULT_COLUMNS)
+    metrics.inc("visa_rows_total", len(forms), path="bulk")
+    with metrics.stage("bulk.dedup"):
+        codes, first = _scenario_codes(forms)
+    if len(first) == len(forms):
+        results = _score_unique(forms)
+    else:
+        metrics.inc("visa_bulk_duplicate_rows_total", len(forms) - len(first))
+        results = _score_unique(forms.iloc[first]).iloc[codes].reset_index(drop=True)
+    results.attrs["rows"] = len(forms)
+    results.attrs["unique_rows"] = len(first)
+    return results
+
+def _score_unique(forms: pd.DataFrame) -> pd.DataFrame:
+    """If the batch fails, fall back to row-by-row so one bad row only costs its own result."""
+    try:
+        with metrics.stage("bulk.score_chunk"):
+            out, *_ = score_frame(forms, explain=False, model=BULK_MODEL)
+        return _result_frame(forms, out)
+    except Exception as e:
+        print("⚠️ Bulk batch failed, scoring row by row:", e)
+        metrics.inc("visa_fallback_total", kind="bulk_row_by_row")
+
+    parts = []
+    for i in range(len(forms)):
+        one = forms.iloc[[i]]
+        try:
+            out, *_ = score_frame(one, explain=False, model=BULK_MODEL)
+            parts.append(_result_frame(one, out))
         except Exception as exc:
-            results.append({
-                "EMPLOYER_NAME": _safe_get(row, ["EMPLOYER_NAME"]) or None,
-                "JOB_TITLE": _safe_get(row, ["JOB_TITLE"]) or None,
-                "OFFERED_WAGE": _safe_get(row, ["WAGE_RATE_OF_PAY_FROM", "OFFERED_WAGE"]) or None,
-                "FULL_TIME_POSITION": _safe_get(row, ["FULL_TIME_POSITION"]) or None,
-                "probability_%": "N/A",
-                "recommendation": f"Error: {str(exc)}",
-                "score_wage": 0,
-                "score_compliance": 0,
-                "score_stability": 0,
-                "score_docs": 0,
-                "score_total": 0,
-            })
-
-    results_df = pd.DataFrame(results)
+            parts.append(pd.DataFrame([_error_row(one.iloc[0].to_dict(), exc)]))
+    return pd.concat(parts, ignore_index=True)[RESULT_COLUMNS]
+
+def iter_bulk_results(chunks, export_dir: str = None):
+    """
+    Score an iterable of raw upload chunks (e.g. read_csv(chunksize=...)) and
+    yield (start_row, results_df) as soon as each chunk is done. When
+    export_dir is given the results are also appended to an export CSV, whose
+    filename is the generator's return value.
+    """
+    filename = outpath = None
+    if export_dir:
+        os.makedirs(export_dir, exist_ok=True)
+        # appended to incrementally, so make concurrent streams collision-free
+        filename = f"bulk_results_{int(time.time())}_{uuid.uuid4().hex[:8]}.csv"
+        outpath = os.path.join(export_dir, filename)
+
+    start = 0
+    for chunk in chunks:
+        results_df = score_bulk_forms(canonical_forms(_norm_cols(chunk)))
+        if outpath:
+            with metrics.stage("bulk.export"):
+                results_df.to_csv(outpath, mode="a", index=False, header=(start == 0))
+        yield start, results_df
+        start += len(results_df)
+    return filename
+
+def dedup_summary(rows: int, unique_rows: int) -> dict:
+    return {
+        "rows": rows,
+        "unique_rows": unique_rows,
+        "dedup_ratio": round(rows / unique_rows, 2) if unique_rows else 1.0,
+    }
+
+def process_bulk_csv(df, export_dir: str):
+    """Score a whole upload: one DataFrame or an iterable of raw chunks (iter_upload)."""
+    chunks = [df] if isinstance(df, pd.DataFrame) else df
+    with metrics.stage("bulk.normalize"):
+        forms = pd.concat([canonical_forms(_norm_cols(c)) for c in chunks], ignore_index=True)
+    results_df = score_bulk_forms(forms)
 
     os.makedirs(export_dir, exist_ok=True)
     filename = f"bulk_results_{int(time.time())}.csv"
     outpath = os.path.join(export_dir, filename)
-    results_df.to_csv(outpath, index=False)
+    with metrics.stage("bulk.export"):
+        results_df.to_csv(outpath, index=False)
 
     return results_df, filename
@@ -1,6 +1,8 @@
 # app/chatbot.py
 import re
 
+from .wage_utils import compare_wage, load_index
+
 HELP_LINKS = {
     "single": "/",
     "wage": "/wage",
@@ -9,19 +11,24 @@ HELP_LINKS = {
 }
 
 FAQ = [
-    (r"\bhello|hi|hey\b", "Hi! I can explain your prediction, suggest improvements, compare wages, or run bulk checks. What would you like to do?"),
-    (r"\bhow (does|do) (it|this|model) work\b", 
+    (r"\b(?:hello|hi|hey)\b", "Hi! I can explain your prediction, suggest improvements, compare wages, or run bulk checks. What would you like to do?"),
+    (r"\bhow (?:does|do) (?:it|this|model) work\b",
      "We trained an XGBoost model on public LCA disclosures. We encode job, employer/worksite, wages, dates, and employment flags; we calibrate probabilities and visualize top drivers. You can also see a scorecard and wage comparator."),
-    (r"\bwhat (affects|impacts) (approval|result)\b",
+    (r"\bwhat (?:affects|impacts) (?:approval|result)\b",
      "Common drivers include offered wage vs prevailing wage, full-time status, employer compliance (H-1B dependent / willful violator), employment continuity, and duration. Use the wage comparator and our suggestions to improve."),
-    (r"\bprivacy|data (use|usage|policy)\b",
+    (r"\b(?:privacy|data (?:use|usage|policy))\b",
      "We only use the details you submit to compute the prediction and email you results if requested. Identifiers can be anonymized in logs for model improvement. Avoid sharing sensitive personal info."),
     (r"\bsupported visas?\b|\bonly h-?1b\b",
      "Right now we focus on H-1B LCA outcomes. The interface supports other visa classes in the form, but predictions are optimized for H-1B."),
-    (r"\bemail (not|didn'?t) send|mail issue\b",
+    (r"\b(?:email (?:not|didn'?t) send|mail issue)\b",
      "Please verify the email address format and email configuration (.env SMTP settings). If issues persist, we’ll still show the full result on screen."),
 ]
 
+# Compiled once. The combined pattern is a cheap "any FAQ?" test; the
+# individual ones then pick the first matching entry.
+_FAQ_PATTERNS = [re.compile(pat) for pat, _ in FAQ]
+_FAQ_ANY = re.compile("|".join(f"(?:{pat})" for pat, _ in FAQ))
+
 SUGGESTIONS_GENERAL = [
     "Compare your offered wage with market medians here → /wage",
     "Run multiple scenarios via CSV upload here → /bulk",
@@ -36,36 +43,38 @@ IMPROVE_TIPS = [
     "Aim for at least a 12-month duration for stability where feasible."
 ]
 
-def _detect_intent(user_text: str):
-    s = user_text.lower().strip()
-
-    # Direct intents
+def route(user_text: str):
+    """Intent and FAQ answer index for one message: keyword checks first, then the FAQ patterns."""
+    s = user_text.lower()
     if "wage" in s and ("compare" in s or "median" in s or "prevailing" in s):
-        return "wage_help"
+        return "wage_help", None
     if "bulk" in s or "csv" in s or "upload" in s:
-        return "bulk_help"
+        return "bulk_help", None
     if "improve" in s or "increase" in s or "boost" in s or "chance" in s:
-        return "improve"
-    if "explain" in s or "why" in s and ("low" in s or "result" in s or "score" in s or "prob" in s):
-        return "explain"
+        return "improve", None
+    if "explain" in s or ("why" in s and ("low" in s or "result" in s or "score" in s or "prob" in s)):
+        return "explain", None
     if "help" in s or "what can you do" in s:
-        return "capability"
+        return "capability", None
+    if _FAQ_ANY.search(s):
+        for i, pat in enumerate(_FAQ_PATTERNS):
+            if pat.search(s):
+                return "faq", i
+    return "fallback", None
 
-    # FAQ patterns
-    for pat, _ in FAQ:
-        if re.search(pat, s):
-            return "faq"
 
-    return "fallback"
+def _detect_intent(user_text: str):
+    return route(user_text)[0]
+
 
+FAQ_DEFAULT = ("I can answer questions about how the model works, what affects approval, "
+               "privacy, and current visa support. Try: “What affects approval?”")
 
-def _run_faq(user_text: str):
-    for pat, answer in FAQ:
-        if re.search(pat, user_text, flags=re.IGNORECASE):
-            return answer
-    # default:
-    return ("I can answer questions about how the model works, what affects approval, "
-            "privacy, and current visa support. Try: “What affects approval?”")
+
+def _run_faq(user_text: str, faq_index=None):
+    if faq_index is None:
+        faq_index = route(user_text)[1]
+    return FAQ[faq_index][1] if faq_index is not None else FAQ_DEFAULT
 
 
 def _extract_slots_for_wage(user_text: str):
@@ -73,7 +82,7 @@ def _extract_slots_for_wage(user_text: str):
     Heuristic slot extraction to help users jump into /wage with prefilled clues.
     Example matches:
       - SOC code like 15-1252 or 15.1252
-      - State as two letters (FL, CA, TX)
+      - State as two letters (FL, CA, TX; see _state_in)
       - Wage as a number
     """
     soc = None
@@ -81,10 +90,7 @@ def _extract_slots_for_wage(user_text: str):
     if m_soc:
         soc = f"{m_soc.group(1)}-{m_soc.group(2)}"
 
-    state = None
-    m_st = re.search(r"\b([A-Z]{2})\b", user_text.upper())
-    if m_st:
-        state = m_st.group(1)
+    state = _state_in(user_text)
 
     wage = None
     m_w = re.search(r"\b(\d{2,6})(?:\.\d+)?\b", user_text.replace(",", ""))
@@ -94,8 +100,96 @@ def _extract_slots_for_wage(user_text: str):
     return soc, state, wage
 
 
-def chat_respond(user_text: str):
-    intent = _detect_intent(user_text)
+_states = None
+# two-letter words that are also state codes; only taken when written in capitals
+_STATE_COLLISIONS = {"IN", "OR", "ME", "HI", "OK", "OH", "DE", "PA", "AL", "MA"}
+
+
+def _known_states():
+    global _states
+    if _states is None:
+        try:
+            _states = set(load_index()["WORKSITE_STATE"].astype(str).unique()) - {""}
+        except Exception:
+            _states = set()
+    return _states
+
+
+def _state_in(text):
+    """Last state code named in the message: capitalised as written, or lower-case when not an English word."""
+    states = _known_states()
+    found = [w for w in re.findall(r"\b([A-Za-z]{2})\b", text)
+             if w.upper() in states and (w.isupper() or w.upper() not in _STATE_COLLISIONS)]
+    return found[-1].upper() if found else None
+
+
+def _pretty(feature):
+    return feature.replace("_", " ").title()
+
+
+def _wage_reply(user_text, context):
+    """Live compare_wage() from what the message names, falling back to the last prediction's form."""
+    soc, _, _ = _extract_slots_for_wage(user_text)
+    form = (context or {}).get("form", {})
+    state = _state_in(user_text)
+    soc = soc or form.get("SOC_CODE")
+    state = state or form.get("WORKSITE_STATE")
+    unit = form.get("WAGE_UNIT_OF_PAY") or "Year"
+    # an explicit amount in the message (not the SOC code's digits) wins over the form's wage
+    rest = re.sub(r"\b\d{2}[-\.]\d{4}(?:\.\d{2})?\b", " ", user_text.replace(",", ""))
+    m_w = re.search(r"\b(\d{2,7}(?:\.\d+)?)\b", rest)
+    wage = m_w.group(1) if m_w else form.get("WAGE_RATE_OF_PAY_FROM")
+    if not (soc and state and wage):
+        return None
+    try:
+        res = compare_wage(soc, state.upper(), wage, unit)
+    except Exception as e:
+        print("⚠️ Chat wage lookup failed:", e)
+        return None
+    if not res.get("found"):
+        return f"I couldn't find a wage benchmark for SOC {soc} in {state}. Try the comparator with a nearby SOC code → {HELP_LINKS['wage']}."
+    ratio = f" ({res['ratio']:.0%} of median)" if res.get("ratio") else ""
+    where = f"SOC {soc} in {state}" if res.get("exact", True) else f"{res['level_label']} (no exact SOC {soc} / {state} data)"
+    pctl = f" That is about the {res['percentile']:.0f}th percentile." if res.get("percentile") is not None else ""
+    return (
+        f"For {where}, the median filed wage is ${res['median']:,.0f} "
+        f"(p25 ${res['p25']:,.0f}, p75 ${res['p75']:,.0f}; {res['n']} filings). "
+        f"Your offer of ${res['offered_yearly']:,.0f}/year: {res['verdict'].lower()}{ratio}.{pctl}"
+    )
+
+
+def _explain_reply(context):
+    """Explain the session's last prediction from its rule notes, SHAP drivers and scorecard."""
+    prob = context["probability"] * 100
+    parts = [f"Your last prediction was {prob:.1f}% — {context['recommendation']}."]
+    if context.get("notes"):
+        base = context["base_probability"] * 100
+        parts.append(f"The model alone gave {base:.1f}%; these rules adjusted it: " + " ".join(context["notes"]))
+    drivers = [_pretty(f) for f, v in context.get("top_drivers", []) if v]
+    if drivers:
+        parts.append("The features that moved the model most for you: " + ", ".join(drivers[:3]) + ".")
+    card = context.get("scorecard") or {}
+    areas = {"wage_score": "wage competitiveness", "compliance_score": "compliance",
+             "stability_score": "employment stability", "documentation_score": "documentation"}
+    scored = [(card[k], name) for k, name in areas.items() if isinstance(card.get(k), (int, float))]
+    if scored:
+        low, name = min(scored)
+        if low < 70:
+            parts.append(f"Your weakest scorecard area is {name} ({low:.0f}/100).")
+    return " ".join(parts)
+
+
+def chat_respond(user_text: str, context=None):
+    """
+    Reply and action buttons for one message. `context` is the session's last
+    prediction (sessions.prediction_context) when there is one.
+    """
+    intent, faq_index = route(user_text)
+
+    if intent == "wage_help" or (intent == "fallback" and context and "wage" in user_text.lower()):
+        live = _wage_reply(user_text, context)
+        if live:
+            return live, [{"label": "Open Wage Comparator", "href": HELP_LINKS["wage"]}]
 
     if intent == "wage_help":
         soc, state, wage = _extract_slots_for_wage(user_text)
@@ -121,6 +215,13 @@ def chat_respond(user_text: str):
         actions = [{"label": "Open Bulk Upload", "href": HELP_LINKS["bulk"]}]
         return reply, actions
 
+    if intent == "improve" and context and context.get("suggestions"):
+        reply = (
+            f"Based on your last prediction ({context['probability'] * 100:.1f}%), these would help most:\n"
+            "- " + "\n- ".join(context["suggestions"][:5])
+        )
+        return reply, [{"label": "Compare My Wage", "href": HELP_LINKS["wage"]}]
+
     if intent == "improve":
         reply = (
             "Here are practical steps that often improve approval likelihood:\n"
@@ -132,6 +233,12 @@ def chat_respond(user_text: str):
         ]
         return reply, actions
 
+    if intent == "explain" and context:
+        return _explain_reply(context), [
+            {"label": "Open Wage Comparator", "href": HELP_LINKS["wage"]},
+            {"label": "How can I improve?", "payload": "how can I improve my chances"},
+        ]
+
     if intent == "explain":
         reply = (
             "Your result blends model drivers (visualized on the result page) and domain rules "
@@ -157,7 +264,7 @@ def chat_respond(user_text: str):
         return reply, actions
 
     if intent == "faq":
-        return _run_faq(user_text), [{"label": "Home", "href": HELP_LINKS["single"]}]
+        return _run_faq(user_text, faq_index), [{"label": "Home", "href": HELP_LINKS["single"]}]
 
     # Fallback
     reply = (
@@ -0,0 +1,188 @@
+import itertools
+import os
+import time
+from typing import Any, Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+from .scoring import normalize_form, score_frame
+from .preprocess import date_features
+from .scenarios import _axis_values
+from . import metrics
+
+TARGET = 0.75                      # "High chance of approval" threshold in rules.recommendation_labels
+BUDGET_MS = float(os.getenv("COUNTERFACTUAL_BUDGET_MS", 250))
+MAX_WAGE_INCREASE_PCT = 50.0
+MAX_WAGE_INCREASE_LIMIT = 200.0    # largest max_wage_increase_pct the API accepts
+WAGE_GRID_POINTS = 11
+# each refinement step scores REFINE_POINTS raises inside every open bracket
+# (a k-ary bisection), shrinking it (REFINE_POINTS + 1)x per batched call
+REFINE_POINTS = 8
+REFINE_STEPS = 3
+
+# cost of each change; a wage raise costs COSTS["wage_pct"] per percent and a
+# new duration COSTS["duration_months"] per year it moves away from the base
+# duration (per year of the new duration when the base dates are missing)
+COSTS = {
+    "wage_pct": 1.0,
+    "full_time_position": 10.0,
+    "duration_months": 5.0,
+    "total_worker_positions": 3.0,
+}
+DURATION_OPTIONS = [12, 24, 36]
+POSITION_OPTIONS = ["1"]
+
+
+def _num(v) -> Optional[float]:
+    try:
+        f = float(str(v).strip())
+        return f if f > 0 else None
+    except Exception:
+        return None
+
+
+def _discrete_options(base: Dict[str, str]):
+    """Per actionable discrete field: [(option, column updates)], always starting with "keep"."""
+    axes = {}
+    if base["FULL_TIME_POSITION"].strip().upper() not in ("Y", "YES"):
+        axes["full_time_position"] = [("Y", {"FULL_TIME_POSITION": "Y"})]
+    ends = _axis_values("duration_months", DURATION_OPTIONS, base)
+    axes["duration_months"] = [(m, {"END_DATE": e}) for m, e in zip(DURATION_OPTIONS, ends) if e != base["END_DATE"]]
+    axes["total_worker_positions"] = [(p, {"TOTAL_WORKER_POSITIONS": p}) for p in POSITION_OPTIONS
+                                      if p != base["TOTAL_WORKER_POSITIONS"]]
+    return {k: [(None, {})] + v for k, v in axes.items()}
+
+
+def _score(base: Dict[str, str], updates, wages):
+    """Probabilities for base+updates[i] with the offered wage set to wages[i] (None keeps it)."""
+    rows = []
+    for upd, w in zip(updates, wages):
+        row = dict(base, **upd)
+        if w is not None:
+            row["WAGE_RATE_OF_PAY_FROM"] = f"{w:.2f}"
+        rows.append(row)
+    out, _, _, _, _ = score_frame(pd.DataFrame(rows), explain=False, monitor=False)
+    return out["probability"].to_numpy()
+
+
+def _costs(costs) -> Dict[str, float]:
+    """COSTS overridden by a request's {change: number}; ValueError for anything else."""
+    if costs is None:
+        return dict(COSTS)
+    if not isinstance(costs, dict):
+        raise ValueError(f"costs must be an object mapping {', '.join(COSTS)} to numbers.")
+    unknown = [k for k in costs if k not in COSTS]
+    if unknown:
+        raise ValueError(f"Unknown cost(s): {', '.join(map(str, unknown))}; expected {', '.join(COSTS)}.")
+    try:
+        out = {k: float(v) for k, v in costs.items()}
+    except (TypeError, ValueError):
+        raise ValueError("costs values must be numbers.")
+    if any(not np.isfinite(v) or v < 0 for v in out.values()):
+        raise ValueError("costs values must be non-negative.")
+    return dict(COSTS, **out)
+
+
+def _cost(changes, costs, base_months=0):
+    total = 0.0
+    for k, v in changes.items():
+        if k == "wage_pct":
+            total += costs["wage_pct"] * v
+        elif k == "duration_months":
+            total += costs[k] * abs(v - base_months) / 12.0
+        elif k in costs:
+            total += costs[k]
+    return total
+
+
+def search(payload: Dict[str, Any], target: float = TARGET, budget_ms: float = BUDGET_MS,
+           max_wage_increase_pct: float = MAX_WAGE_INCREASE_PCT, costs: Optional[Dict[str, float]] = None):
+    """
+    Cheapest change to the actionable fields (offered wage, full-time,
+    duration, worker positions) that lifts the adjusted probability to `target`.
+
+    Every discrete combination is scored on a coarse wage grid in one batch,
+    then the wage of each combination that can reach the target is refined
+    by k-ary bisection, one batched call per step, until REFINE_STEPS or the
+    latency budget runs out. The reported point is always one that was
+    actually scored.
+    """
+    t0 = time.perf_counter()
+    deadline = t0 + budget_ms / 1000.0
+    costs = _costs(costs)
+    base = normalize_form(payload)
+    base_months = int(date_features(pd.DataFrame([base], dtype=object))["MONTHS"][0])
+    wage0 = _num(base["WAGE_RATE_OF_PAY_FROM"]) or _num(base["PREVAILING_WAGE"])
+
+    options = _discrete_options(base)
+    names = list(options)
+    combos = list(itertools.product(*options.values()))
+    updates = [dict(kv for _, upd in c for kv in upd.items()) for c in combos]
+    changes = [{names[j]: opt for j, (opt, _) in enumerate(c) if opt is not None} for c in combos]
+
+    pcts = np.linspace(0.0, max_wage_increase_pct, WAGE_GRID_POINTS) if wage0 else np.zeros(1)
+    grid_updates = [u for u in updates for _ in pcts]
+    grid_wages = [wage0 * (1 + p / 100.0) if wage0 and p else None for _ in updates for p in pcts]
+    with metrics.stage("counterfactual.grid"):
+        probs = _score(base, grid_updates, grid_wages).reshape(len(combos), len(pcts))
+    evaluated = probs.size
+    baseline = float(probs[0, 0])
+
+    # per combination: smallest grid raise that reaches the target, bracketed from below
+    reach = probs >= target
+    hit = reach.any(axis=1)
+    hi = np.where(hit, pcts[np.argmax(reach, axis=1)], np.nan)
+    lo = np.where(hit, pcts[np.maximum(np.argmax(reach, axis=1) - 1, 0)], np.nan)
+    hi_prob = np.where(hit, probs[np.arange(len(combos)), np.argmax(reach, axis=1)], np.nan)
+
+    active = np.flatnonzero(hit & (hi > lo))
+    steps = 0
+    frac = np.arange(1, REFINE_POINTS + 1) / (REFINE_POINTS + 1.0)
+    while len(active) and steps < REFINE_STEPS and time.perf_counter() < deadline:
+        mids = lo[active, None] + (hi[active] - lo[active])[:, None] * frac
+        with metrics.stage("counterfactual.refine"):
+            p = _score(base, [updates[i] for i in active for _ in frac],
+                       [wage0 * (1 + m / 100.0) for m in mids.ravel()]).reshape(mids.shape)
+        evaluated += p.size
+        ok = p >= target
+        any_ok = ok.any(axis=1)
+        first = np.argmax(ok, axis=1)
+        rows = np.arange(len(active))
+        # new bracket: (last point below target before the first hit, first hit]
+        new_hi = np.where(any_ok, mids[rows, first], hi[active])
+        new_hi_prob = np.where(any_ok, p[rows, first], hi_prob[active])
+        below = np.where(any_ok, first - 1, REFINE_POINTS - 1)
+        new_lo = np.where(below >= 0, mids[rows, np.maximum(below, 0)], lo[active])
+        hi[active], hi_prob[active], lo[active] = new_hi, new_hi_prob, new_lo
+        steps += 1
+
+    candidates = []
+    for i in np.flatnonzero(hit):
+        ch = dict(changes[i])
+        if hi[i] > 0:
+            ch["wage_pct"] = round(float(hi[i]), 2)
+            ch["wage"] = round(float(wage0 * (1 + hi[i] / 100.0)), 2)
+        candidates.append({"changes": ch, "probability": round(float(hi_prob[i]), 4), "cost": round(_cost(ch, costs, base_months), 2)})
+    candidates.sort(key=lambda c: (c["cost"], -c["probability"]))
+
+    result = {
+        "target": target,
+        "baseline": {"probability": round(baseline, 4)},
+        "reached": bool(candidates),
+        "best": candidates[0] if candidates else None,
+        "alternatives": candidates[1:5],
+        "evaluated": int(evaluated),
+        "refine_steps": steps,
+        "elapsed_ms": round((time.perf_counter() - t0) * 1000.0, 1),
+    }
+    if not candidates:
+        # nothing in range reaches the target: report the strongest variant instead
+        i, j = np.unravel_index(np.argmax(probs), probs.shape)
+        ch = dict(changes[i])
+        if pcts[j] > 0:
+            ch["wage_pct"] = round(float(pcts[j]), 2)
+            ch["wage"] = round(float(wage0 * (1 + pcts[j] / 100.0)), 2)
+        result["closest"] = {"changes": ch, "probability": round(float(probs[i, j]), 4), "cost": round(_cost(ch, costs, base_months), 2)}
+    metrics.inc("visa_counterfactual_total", reached=str(bool(candidates)).lower())
+    return result
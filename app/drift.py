@@ -0,0 +1,230 @@
+"""
+Streaming input drift monitor.
+
+score_frame hands every scored model matrix to observe(), which only appends
+it to a buffer under a lock (a few microseconds); it does nothing when there
+is no baseline. A background thread folds the buffer into fixed per-feature
+bin counts once it holds FLUSH_ROWS rows, and reads fold whatever is pending.
+The buffer lock is only held to swap the buffer out; the fold runs under a
+separate counts lock, so no request waits for it. If the thread falls
+MAX_BUFFER_ROWS behind, further batches are dropped (and counted) rather than
+folded on the request thread, so memory stays constant however much traffic
+is seen.
+
+Bins come from the baseline written at training time (models/drift_baseline.json,
+train_xgb_full.drift_baseline): interior decile edges per model feature and
+for the predicted probability, with the expected share of each bin. Only
+columns with edges are binned, coerced to numbers (values that are not, such
+as raw categories when no encoder is fitted, are skipped). report()
+compares live counts against it with PSI and a binned KS statistic. The
+out-of-vocabulary rate per encoder in ENCODERS counts values that fell back to
+MISSING because the encoder had never seen them (prepare_input_frame records
+them in X.attrs["oov"]). The yes/no flags are encoded after being normalised
+to 0/1, so their encoders (fitted on Y/N) miss every row; those entries carry
+"train_serve_skew": true.
+
+Counts are per process and cumulative since start (or reset()).
+"""
+import json
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from . import metrics
+from .preprocess import ENCODERS, MODELS_DIR, YESNO_INPUTS
+
+ENABLED = os.getenv("DRIFT_MONITOR", "1").strip().lower() in ("1", "true", "yes", "y")
+BASELINE_PATH = os.getenv("DRIFT_BASELINE", os.path.join(MODELS_DIR, "drift_baseline.json"))
+FLUSH_ROWS = 1024
+MAX_BUFFER_ROWS = 16 * FLUSH_ROWS  # drop batches if the background thread falls this far behind
+PSI_ALERT = float(os.getenv("DRIFT_PSI_ALERT", 0.2))
+OOV_ALERT = float(os.getenv("DRIFT_OOV_ALERT", 0.05))
+EPS = 1e-4
+
+_lock = threading.Lock()         # the buffer; taken on the request path
+_buffer = []          # [(X DataFrame, probs)], at most MAX_BUFFER_ROWS rows
+_buffered = 0
+_dropped = 0
+_generation = 0       # bumped by reset() so a fold already running is discarded
+_counts_lock = threading.Lock()  # the folded counts; never taken by observe()
+_counts = None        # feature -> bin counts, "__probability__" for the model output
+_oov = {}             # encoder column -> unseen values
+_rows = 0
+_baseline = None
+_baseline_ready = False
+_wake = threading.Event()
+_flusher = None
+
+PROBABILITY = "__probability__"
+
+
+def baseline():
+    """Cached baseline dict, or None when the model was trained without one."""
+    global _baseline, _baseline_ready
+    if not _baseline_ready:
+        try:
+            with open(BASELINE_PATH) as f:
+                _baseline = json.load(f)
+        except FileNotFoundError:
+            print("⚠️ No drift baseline (train_xgb_full.py writes drift_baseline.json); PSI/KS disabled.")
+        except Exception as e:
+            print("⚠️ Drift baseline not loaded:", e)
+        _baseline_ready = True
+    return _baseline
+
+
+def _flush_loop():
+    while True:
+        _wake.wait()
+        _wake.clear()
+        try:
+            flush()
+        except Exception as e:
+            print("⚠️ Drift flush failed:", e)
+
+
+def observe(X, probs):
+    """Record one scored batch: the model matrix and the model probabilities."""
+    global _buffered, _dropped, _flusher
+    if not ENABLED or baseline() is None:
+        return
+    with _lock:
+        full = _buffered >= MAX_BUFFER_ROWS
+        if full:
+            _dropped += len(probs)
+        else:
+            _buffer.append((X, probs))
+            _buffered += len(probs)
+        buffered = _buffered
+    if full:
+        metrics.inc("visa_drift_dropped_rows_total", len(probs))
+    if buffered < FLUSH_ROWS:
+        return
+    if _flusher is None or not _flusher.is_alive():
+        # started here rather than at import so a preload-then-fork parent has no thread to lose
+        _flusher = threading.Thread(target=_flush_loop, name="drift-flush", daemon=True)
+        _flusher.start()
+    _wake.set()
+
+
+def _edges(name):
+    spec = (baseline() or {}).get("features", {}).get(name) if name != PROBABILITY else (baseline() or {}).get("probability")
+    return None if spec is None else np.asarray(spec["edges"], dtype=float)
+
+
+def flush():
+    """Fold the buffered batches into the bin counts (outside the buffer lock)."""
+    global _buffer, _buffered, _counts, _rows
+    with _lock:
+        batch, _buffer, _buffered = _buffer, [], 0
+        generation = _generation
+    if not batch:
+        return
+    with _counts_lock:
+        if generation != _generation:
+            return
+        frames = [X for X, _ in batch]
+        probs = np.concatenate([np.asarray(p, dtype=float).reshape(-1) for _, p in batch])
+        # only columns with baseline edges are binned; without fitted encoders
+        # categorical columns are still raw strings, which coerce to NaN and are skipped
+        names = list(frames[0].columns)
+        values = np.vstack([X.to_numpy() for X in frames])
+        binned = {PROBABILITY: probs}
+        for j, name in enumerate(names):
+            if _edges(name) is not None:
+                col = pd.to_numeric(pd.Series(values[:, j]), errors="coerce").to_numpy(dtype=float)
+                binned[name] = col[~np.isnan(col)]
+        for X in frames:
+            for col, n in X.attrs.get("oov", {}).items():
+                _oov[col] = _oov.get(col, 0) + n
+        if _counts is None:
+            _counts = {}
+        for name, col in binned.items():
+            edges = _edges(name)
+            if edges is None:
+                continue
+            counts = np.bincount(np.searchsorted(edges, col, side="right"), minlength=len(edges) + 1)
+            _counts[name] = _counts.get(name, 0) + counts
+        _rows += len(probs)
+    metrics.inc("visa_drift_rows_total", len(probs))
+
+
+def reset():
+    global _counts, _oov, _rows, _buffer, _buffered, _dropped, _generation
+    with _lock:
+        _buffer, _buffered, _dropped = [], 0, 0
+        _generation += 1
+    with _counts_lock:
+        _counts, _oov, _rows = None, {}, 0
+
+
+def _compare(actual_counts, expected):
+    actual = actual_counts / max(actual_counts.sum(), 1)
+    expected = np.asarray(expected, dtype=float)
+    a, e = np.clip(actual, EPS, None), np.clip(expected, EPS, None)
+    psi = float(np.sum((a - e) * np.log(a / e)))
+    ks = float(np.max(np.abs(np.cumsum(actual) - np.cumsum(expected))))
+    return round(psi, 5), round(ks, 5), actual
+
+
+def report(include_bins=False):
+    """PSI/KS per feature and for the probability, OOV rates, and alerts past the thresholds."""
+    try:
+        flush()
+    except Exception as e:
+        print("⚠️ Drift flush failed:", e)
+    base = baseline()
+    with _counts_lock:
+        counts = dict(_counts or {})
+        oov = dict(_oov)
+        rows = _rows
+
+    features, alerts = {}, []
+    for name, c in counts.items():
+        if not c.sum():
+            continue
+        spec = base["probability"] if name == PROBABILITY else base["features"][name]
+        psi, ks, actual = _compare(c, spec["expected"])
+        entry = {"psi": psi, "ks": ks}
+        if include_bins:
+            entry.update(edges=spec["edges"], expected=spec["expected"], actual=actual.round(5).tolist())
+        if psi >= PSI_ALERT:
+            alerts.append(f"{'probability' if name == PROBABILITY else name}: PSI {psi:.3f}")
+        features[name] = entry
+    probability = features.pop(PROBABILITY, None)
+
+    oov_rates = {}
+    for col in ENCODERS:
+        rate = oov.get(col, 0) / rows if rows else 0.0
+        oov_rates[col] = {"count": oov.get(col, 0), "rate": round(rate, 5)}
+        if col in YESNO_INPUTS:
+            oov_rates[col]["train_serve_skew"] = True
+        if rate >= OOV_ALERT:
+            alerts.append(f"{col}: {rate:.1%} unseen values")
+
+    return {
+        "enabled": ENABLED,
+        "baseline": base is not None,
+        "rows": rows,
+        "dropped_rows": _dropped,
+        "psi_alert": PSI_ALERT,
+        "oov_alert": OOV_ALERT,
+        "probability": probability,
+        "features": dict(sorted(features.items(), key=lambda kv: -kv[1]["psi"])),
+        "oov": oov_rates,
+        "alerts": alerts,
+    }
+
+
+@metrics.register_collector
+def _drift_stats():
+    if not ENABLED or (_rows == 0 and _buffered == 0):
+        return []
+    r = report()
+    out = [("visa_drift_psi", "gauge", {"feature": n}, v["psi"]) for n, v in r["features"].items()]
+    if r["probability"]:
+        out.append(("visa_drift_psi", "gauge", {"feature": "probability"}, r["probability"]["psi"]))
+    out += [("visa_drift_oov_rate", "gauge", {"feature": n}, v["rate"]) for n, v in r["oov"].items()]
+    return out
@@ -0,0 +1,116 @@
+import os
+import re
+from typing import Any, Dict, List, Optional
+
+import pandas as pd
+
+from . import metrics
+
+STATS_PATH = os.getenv("VISA_EMPLOYER_STATS", os.path.join(os.path.dirname(__file__), "..", "data", "cache", "employer_stats.parquet"))
+
+FIELDS = ["n", "certified", "rate", "rate_smoothed", "wage_p25", "wage_median", "wage_p75"]
+
+# numeric model features filled from the table when metadata.json lists them
+# (see train_xgb_full.py --with-history)
+HISTORY_FEATURES = {
+    "HIST_EMPLOYER_RATE": "employer",
+    "HIST_SOC_RATE": "soc",
+    "HIST_EMPLOYER_STATE_RATE": "employer_state",
+}
+
+_tables = None
+_global_rate = None
+
+
+def norm_employer(v) -> str:
+    return " ".join(str(v or "").upper().split())
+
+
+def norm_soc(v) -> str:
+    s = str(v or "").strip()
+    m = re.match(r"^(\d{2}-\d{4})", s)
+    return m.group(1) if m else s.upper()
+
+
+def norm_state(v) -> str:
+    return str(v or "").strip().upper()
+
+
+def load_tables():
+    """{level: {key: stats dict}} from employer_stats.parquet; empty if the file was never built."""
+    global _tables, _global_rate
+    metrics.cache("employer_stats", _tables is not None)
+    if _tables is None:
+        tables = {"employer": {}, "soc": {}, "employer_state": {}}
+        if os.path.exists(STATS_PATH):
+            df = pd.read_parquet(STATS_PATH)
+            df["level"] = df["level"].astype(str)
+            for level, part in df.groupby("level"):
+                keys = zip(part["key"], part["state"]) if level == "employer_state" else part["key"]
+                records = part[FIELDS].to_dict(orient="records")
+                tables[level] = dict(zip(keys, records))
+            emp = df[df["level"] == "employer"]
+            _global_rate = float(emp["certified"].sum() / max(emp["n"].sum(), 1)) if len(emp) else None
+        else:
+            print("⚠️ Employer stats not built (app/build_employer_stats.py); history lookups disabled.")
+        _tables = tables
+    return _tables
+
+
+def global_rate() -> Optional[float]:
+    load_tables()
+    return _global_rate
+
+
+def lookup(employer, soc, state) -> Dict[str, Optional[Dict[str, Any]]]:
+    """Historical stats for one applicant: employer, SOC and (employer, worksite state)."""
+    t = load_tables()
+    emp = norm_employer(employer)
+    return {
+        "employer": t["employer"].get(emp),
+        "soc": t["soc"].get(norm_soc(soc)),
+        "employer_state": t["employer_state"].get((emp, norm_state(state))),
+    }
+
+
+def lookup_many(employers, socs, states) -> List[Dict[str, Optional[Dict[str, Any]]]]:
+    t = load_tables()
+    emp_t, soc_t, es_t = t["employer"].get, t["soc"].get, t["employer_state"].get
+    out = []
+    for e, s, st in zip(employers, socs, states):
+        e = norm_employer(e)
+        out.append({"employer": emp_t(e), "soc": soc_t(norm_soc(s)), "employer_state": es_t((e, norm_state(st)))})
+    return out
+
+
+def history_columns(employers, socs, states, field="rate") -> Dict[str, list]:
+    """Flat per-row columns (employer_cert_rate, employer_cases, ...) for bulk results."""
+    rows = lookup_many(employers, socs, states)
+
+    def col(level, f):
+        return [r[level][f] if r[level] else None for r in rows]
+
+    return {
+        "employer_cert_rate": col("employer", field),
+        "employer_cases": col("employer", "n"),
+        "soc_cert_rate": col("soc", field),
+        "employer_state_cert_rate": col("employer_state", field),
+    }
+
+
+def feature_column(name, employers, socs, states) -> List[float]:
+    """Values for one HISTORY_FEATURES model input; unknown keys get the global rate."""
+    level = HISTORY_FEATURES[name]
+    t = load_tables()[level]
+    default = global_rate() or 0.0
+    if level == "employer":
+        keys = (norm_employer(e) for e in employers)
+    elif level == "soc":
+        keys = (norm_soc(s) for s in socs)
+    else:
+        keys = ((norm_employer(e), norm_state(st)) for e, st in zip(employers, states))
+    out = []
+    for k in keys:
+        rec = t.get(k)
+        out.append(float(rec["rate_smoothed"]) if rec else default)
+    return out
@@ -0,0 +1,190 @@
+"""
+Alternative inference backends for small batches.
+
+The reference path (pandas -> xgb.DMatrix -> Booster.predict) has a fixed
+cost that dominates a 24-feature row. Two cheaper backends are available,
+selected with INFERENCE_BACKEND:
+
+    xgboost   DMatrix + Booster.predict (default, reference)
+    inplace   Booster.inplace_predict on a float32 array (no DMatrix)
+    compiled  trees flattened into NumPy arrays and walked level by level
+              (batches above COMPILED_MAX_ROWS go through inplace_predict)
+
+The compiled forest is checked against the booster when it is built and the
+backend falls back to xgboost if the two disagree.
+"""
+import json
+import os
+import threading
+
+import numpy as np
+import xgboost as xgb
+
+BACKEND = os.getenv("INFERENCE_BACKEND", "xgboost").strip().lower()
+PARITY_TOL = 1e-5
+# the level-by-level walk loses to the booster's native loop on large batches
+COMPILED_MAX_ROWS = int(os.getenv("COMPILED_MAX_ROWS", 256))
+
+
+class CompiledForest:
+    """
+    All trees of a binary:logistic gbtree model in flat arrays.
+
+    Node ids are global across trees. Leaves point to themselves and compare
+    against feature 0, so every row can take exactly `depth` steps without a
+    per-node leaf test.
+    """
+
+    def __init__(self, bst: xgb.Booster):
+        model = json.loads(bst.save_raw("json"))["learner"]
+        objective = model["objective"]["name"]
+        booster = model["gradient_booster"]
+        if booster["name"] != "gbtree" or objective != "binary:logistic":
+            raise ValueError(f"unsupported model for compiled backend: {booster['name']} / {objective}")
+        if int(model["learner_model_param"].get("num_class", "0") or 0) > 1:
+            raise ValueError("multiclass models are not supported")
+
+        feats, thresholds, lefts, rights, default_left, values, roots = [], [], [], [], [], [], []
+        depth, offset = 0, 0
+        for tree in booster["model"]["trees"]:
+            left = np.asarray(tree["left_children"], dtype=np.int64)
+            right = np.asarray(tree["right_children"], dtype=np.int64)
+            n = len(left)
+            ids = np.arange(n, dtype=np.int64)
+            leaf = left < 0
+            cond = np.asarray(tree["split_conditions"], dtype=np.float32)
+
+            feats.append(np.where(leaf, 0, np.asarray(tree["split_indices"], dtype=np.int64)))
+            thresholds.append(np.where(leaf, np.float32(0), cond))
+            lefts.append(np.where(leaf, ids, left) + offset)
+            rights.append(np.where(leaf, ids, right) + offset)
+            default_left.append(np.where(leaf, True, np.asarray(tree["default_left"], dtype=bool)))
+            values.append(np.where(leaf, cond, np.float32(0)))
+            roots.append(offset)
+            depth = max(depth, _tree_depth(left, right))
+            offset += n
+
+        self.feature = np.concatenate(feats)
+        self.threshold = np.concatenate(thresholds).astype(np.float32)
+        self.left = np.concatenate(lefts)
+        self.right = np.concatenate(rights)
+        self.default_left = np.concatenate(default_left)
+        self.value = np.concatenate(values).astype(np.float32)
+        self.roots = np.asarray(roots, dtype=np.int64)
+        self.depth = depth
+        self.feature_names = list(bst.feature_names or [])
+        # Booster.save_raw reports base_score in probability space and how it is
+        # turned into a margin has changed across releases; calibrate() measures it.
+        self.base_margin = 0.0
+
+    def leaf_sum(self, X: np.ndarray) -> np.ndarray:
+        X = np.asarray(X, dtype=np.float32)
+        n = X.shape[0]
+        rows = np.arange(n)[:, None]
+        node = np.broadcast_to(self.roots, (n, len(self.roots))).copy()
+        for _ in range(self.depth):
+            x = X[rows, self.feature[node]]
+            go_left = np.where(np.isnan(x), self.default_left[node], x < self.threshold[node])
+            node = np.where(go_left, self.left[node], self.right[node])
+        return self.value[node].sum(axis=1, dtype=np.float64)
+
+    def margin(self, X) -> np.ndarray:
+        return self.leaf_sum(X) + self.base_margin
+
+    def predict(self, X) -> np.ndarray:
+        return 1.0 / (1.0 + np.exp(-self.margin(X)))
+
+    def calibrate(self, bst: xgb.Booster, X: np.ndarray) -> float:
+        """Set base_margin from the booster's own margins and return the max probability error."""
+        X = np.asarray(X, dtype=np.float32)
+        dmat = xgb.DMatrix(X, feature_names=self.feature_names or None)
+        self.base_margin = float(np.median(bst.predict(dmat, output_margin=True) - self.leaf_sum(X)))
+        return float(np.max(np.abs(self.predict(X) - bst.predict(dmat)))) if len(X) else 0.0
+
+
+def _tree_depth(left, right):
+    depth, level = 0, [0]
+    while level:
+        level = [c for i in level for c in (left[i], right[i]) if c >= 0]
+        depth += bool(level)
+    return depth
+
+
+def probe_rows(forest: CompiledForest, n=256, seed=0) -> np.ndarray:
+    """
+    Rows that exercise the trees' decision boundaries: each feature is drawn
+    from its own split thresholds (exactly, and just below), with a few NaNs
+    to follow the default branches.
+    """
+    rng = np.random.default_rng(seed)
+    n_features = max(len(forest.feature_names), int(forest.feature.max()) + 1)
+    X = np.zeros((n, n_features), dtype=np.float32)
+    internal = forest.left != np.arange(len(forest.left))
+    for j in range(n_features):
+        cuts = forest.threshold[internal & (forest.feature == j)]
+        if len(cuts):
+            picks = rng.choice(cuts, n)
+            below = rng.random(n) < 0.5
+            X[:, j] = np.where(below, np.nextafter(picks, np.float32(-np.inf)), picks)
+    X[rng.random(X.shape) < 0.02] = np.nan
+    return X
+
+
+def compile_booster(bst: xgb.Booster):
+    """Compiled forest for `bst`, or None (with a warning) if it is unsupported or fails parity."""
+    try:
+        forest = CompiledForest(bst)
+        err = forest.calibrate(bst, probe_rows(forest))
+    except Exception as e:
+        print("⚠️ Compiled inference unavailable:", e)
+        return None
+    if err > PARITY_TOL:
+        print(f"⚠️ Compiled inference disagrees with booster (max diff {err:.2e}); using xgboost.")
+        return None
+    return forest
+
+
+class InplacePredictor:
+    """Booster.inplace_predict on a reused float32 buffer (one per thread)."""
+
+    def __init__(self, bst: xgb.Booster):
+        self.bst = bst
+        self._local = threading.local()
+
+    def predict(self, X) -> np.ndarray:
+        X = np.asarray(X)
+        n, f = X.shape
+        buf = getattr(self._local, "buf", None)
+        if buf is None or buf.shape[0] < n or buf.shape[1] != f:
+            buf = self._local.buf = np.empty((max(n, 64), f), dtype=np.float32)
+        buf = buf[:n]
+        buf[...] = X
+        return np.asarray(self.bst.inplace_predict(buf, validate_features=False), dtype=float).reshape(-1)
+
+
+class RoutedPredictor:
+    """Compiled forest for small batches, inplace_predict above `max_rows`."""
+
+    def __init__(self, forest: CompiledForest, large: InplacePredictor, max_rows: int):
+        self.forest, self.large, self.max_rows = forest, large, max_rows
+
+    def predict(self, X) -> np.ndarray:
+        if len(X) > self.max_rows:
+            return self.large.predict(X)
+        return self.forest.predict(X)
+
+
+def make_predictor(bst: xgb.Booster, backend=None):
+    """
+    Predictor object with .predict(float array in bst.feature_names order),
+    or None for the reference DMatrix path.
+    """
+    backend = (backend or BACKEND).strip().lower()
+    if backend == "compiled":
+        forest = compile_booster(bst)
+        return RoutedPredictor(forest, InplacePredictor(bst), COMPILED_MAX_ROWS) if forest else None
+    if backend == "inplace":
+        return InplacePredictor(bst)
+    if backend not in ("", "xgboost"):
+        print(f"⚠️ Unknown INFERENCE_BACKEND '{backend}', using xgboost.")
+    return None
@@ -1,12 +1,12 @@
 import requests
 from bs4 import BeautifulSoup
 
-def validate_field(job_title: str, state: str):
+def validate_field(job_title: str, state: str, timeout: float = 5.0):
     try:
         q = f"{job_title} average H1B approval rate in {state} site:gov"
-        url = f"https://www.google.com/search?q={q}"
+        url = "https://www.google.com/search"
         headers = {"User-Agent": "Mozilla/5.0"}
-        res = requests.get(url, headers=headers)
+        res = requests.get(url, params={"q": q}, headers=headers, timeout=timeout)
         soup = BeautifulSoup(res.text, "html.parser")
         snippet = soup.select_one("div span")
         return snippet.text if snippet else "No relevant data found."
@@ -1,25 +1,37 @@
 import os
-import io
-import pandas as pd
-from typing import Dict, Any
+import json
+import math
+import time
+from typing import Any
 from fastapi import FastAPI, Request, Form, UploadFile, File, Body
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse, PlainTextResponse, FileResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 import uvicorn
 
-from .preprocess import prepare_input_dict
-from .model_utils import predict_proba_from_df, generate_recommendations
 from .reinforcement import log_submission
 from .email_utils import send_result_email
 from .online_validate import validate_job_employer
-from .scorecard import compute_strength_score
+from .validation import get_service as validation_service
 from .wage_utils import compare_wage
-from .bulk_utils import process_bulk_csv
-from .guides import suggest_from_flags
-from .chatbot import chat_respond
+from .bulk_utils import process_bulk_csv, iter_bulk_results, iter_upload, dedup_summary
+from .chatbot import chat_respond, route
+from .autocomplete import suggest
+from .scoring import score_forms, normalize_form
+from .batching import score_one
+from .scenarios import run_scenarios
+from .counterfactual import search as counterfactual_search, TARGET as CF_TARGET, BUDGET_MS as CF_BUDGET_MS
+from .counterfactual import MAX_WAGE_INCREASE_LIMIT as CF_MAX_PCT_LIMIT
+from . import metrics
+from . import profiling
+from . import sessions
+from . import admission
+from . import drift
 
 BASE_DIR = os.path.dirname(__file__)
+API_MAX_BATCH = int(os.getenv("API_MAX_BATCH", 1000))
+BULK_STREAM_CHUNK = int(os.getenv("BULK_STREAM_CHUNK", 500))
+ONLINE_VALIDATION = os.getenv("ONLINE_VALIDATION", "0").strip().lower() in ("1", "true", "yes", "y")
 app = FastAPI(title="Visa Approval Predictor")
 templates = Jinja2Templates(directory=os.path.join(BASE_DIR, "templates"))
 app.mount("/static", StaticFiles(directory=os.path.join(BASE_DIR, "static")), name="static")
@@ -28,6 +40,67 @@ app.mount("/static", StaticFiles(directory=os.path.join(BASE_DIR, "static")), na
 os.makedirs(os.path.join(BASE_DIR, "static", "exports"), exist_ok=True)
 
 
+# always installed so a hot-reloaded config can switch it on; a no-op while disabled
+app.middleware("http")(admission.middleware)
+
+
+if metrics.ENABLED:
+    @app.middleware("http")
+    async def _time_requests(request: Request, call_next):
+        t0 = time.perf_counter()
+        response = await call_next(request)
+        route = request.scope.get("route")
+        metrics.observe("visa_http_request_seconds", time.perf_counter() - t0,
+                        route=getattr(route, "path", "unmatched"), method=request.method,
+                        status=response.status_code)
+        return response
+
+
+if profiling.ENABLED:
+    app.middleware("http")(profiling.middleware)
+
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    if not metrics.ENABLED:
+        return PlainTextResponse("# metrics disabled (set METRICS_ENABLED=1)\n", status_code=404)
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/admin/profiles")
+async def admin_profiles(request: Request):
+    if not profiling.admin_allowed(request):
+        return JSONResponse({"error": "Forbidden."}, status_code=403)
+    return {"enabled": profiling.ENABLED, "threshold_ms": profiling.THRESHOLD_MS,
+            "sample_rate": profiling.SAMPLE_RATE, "profiles": profiling.list_profiles()}
+
+
+@app.get("/admin/drift")
+async def admin_drift(request: Request, bins: bool = False):
+    """Live input drift vs the training baseline: PSI/KS per feature and probability, OOV rates."""
+    if not profiling.admin_allowed(request):
+        return JSONResponse({"error": "Forbidden."}, status_code=403)
+    return drift.report(include_bins=bins)
+
+
+@app.post("/admin/drift/reset")
+async def admin_drift_reset(request: Request):
+    if not profiling.admin_allowed(request):
+        return JSONResponse({"error": "Forbidden."}, status_code=403)
+    drift.reset()
+    return {"reset": True}
+
+
+@app.get("/admin/profiles/{profile_id}")
+async def admin_profile_download(profile_id: str, request: Request):
+    if not profiling.admin_allowed(request):
+        return JSONResponse({"error": "Forbidden."}, status_code=403)
+    path = profiling.profile_path(profile_id)
+    if not path:
+        return JSONResponse({"error": "Profile not found."}, status_code=404)
+    return FileResponse(path, filename=os.path.basename(path), media_type="application/octet-stream")
+
+
 @app.get("/", response_class=HTMLResponse)
 async def home(request: Request):
     return templates.TemplateResponse("index.html", {"request": request})
@@ -83,84 +156,21 @@ async def predict(
             "END_DATE": (end_date or "").strip(),
         }
 
-        X = prepare_input_dict(form)
-        base_prob, feature_impact = predict_proba_from_df(X)
-        begin_dt = pd.to_datetime(begin_date or "", errors="coerce")
-        end_dt = pd.to_datetime(end_date or "", errors="coerce")
-        derived = {
-            "BEGIN_YEAR": int(begin_dt.year) if pd.notnull(begin_dt) else 0,
-            "DURATION_DAYS": int((end_dt - begin_dt).days) if (pd.notnull(begin_dt) and pd.notnull(end_dt)) else 0,
-        }
-        scorecard = compute_strength_score(form, derived)
-        notes = []
-        rule_suggestions = []
-        adjusted_prob = base_prob
-
-        def yn(v): return str(v).strip().lower() in ("y", "yes", "true", "1")
-        try:
-            wage_val = float(wage or 0)
-            prev_wage_val = float(prevailing_wage or 0)
-            if prev_wage_val > 0 and wage_val < prev_wage_val:
-                adjusted_prob *= 0.75
-                notes.append("Offered wage is below prevailing wage (-25%).")
-                rule_suggestions.append("Increase offered wage closer to or above the prevailing wage.")
-            elif prev_wage_val > 0 and wage_val >= 1.2 * prev_wage_val:
-                adjusted_prob *= 1.05
-                notes.append("Offered wage significantly exceeds prevailing wage (+5%).")
-        except Exception:
-            pass
-
-        if not yn(full_time_position):
-            adjusted_prob *= 0.8
-            notes.append("Not a full-time position (-20%).")
-            rule_suggestions.append("Convert to a full-time role if possible.")
-
-        if yn(h1b_dependent):
-            adjusted_prob *= 0.85
-            notes.append("Employer is H-1B dependent (-15%).")
-            rule_suggestions.append("Reduce dependency on H-1B workforce or justify dependency clearly.")
-
-        if yn(willful_violator):
-            adjusted_prob *= 0.8
-            notes.append("Employer flagged as willful violator (-20%).")
-            rule_suggestions.append("Ensure full compliance and file corrective documentation.")
-
-        if not yn(agree_lc):
-            adjusted_prob *= 0.7
-            notes.append("Labor Condition Statement not agreed (-30%).")
-            rule_suggestions.append("Agree to LC statement before filing.")
-
-        adjusted_prob = max(0.0, min(adjusted_prob, 1.0))
-
-        flags: Dict[str, Any] = {}
-        try:
-            flags["wage_below_prev"] = (float(prevailing_wage or 0) > 0) and (float(wage or 0) < float(prevailing_wage or 0))
-        except Exception:
-            flags["wage_below_prev"] = False
-        flags["not_full_time"] = not yn(full_time_position)
-        flags["h1b_dependent"] = yn(h1b_dependent)
-        flags["willful_violator"] = yn(willful_violator)
-        flags["no_lc_agree"] = not yn(agree_lc)
-        try:
-            months = int(max(0, (end_dt - begin_dt).days // 30)) if (pd.notnull(begin_dt) and pd.notnull(end_dt)) else 0
-        except Exception:
-            months = 0
-        flags["short_duration"] = bool(months and months < 12)
-
-        guide_snippets = suggest_from_flags(flags)
-
-        shap_suggestions = generate_recommendations(feature_impact)
-        all_suggestions = (rule_suggestions or []) + (shap_suggestions or []) + (guide_snippets or [])
-
-        if adjusted_prob > 0.75:
-            recommendation = "✅ High chance of approval"
-        elif adjusted_prob > 0.45:
-            recommendation = "⚠️ Moderate likelihood of approval"
-        else:
-            recommendation = "❌ High chance of denial"
+        with metrics.stage("predict.score"):
+            scored = await score_one(form)
+        adjusted_prob = scored["probability"]
+        recommendation = scored["recommendation"]
+        notes = scored["notes"]
+        scorecard = scored["scorecard"]
+        feature_impact = scored["feature_impact"]
+        all_suggestions = scored["suggestions"]
 
         validation_notes = validate_job_employer(job_title or "", employer_state or "OK")
-        log_submission(form, adjusted_prob)
+        if ONLINE_VALIDATION:
+            online = await validation_service().validate(job_title or "", worksite_state or employer_state or "")
+            validation_notes += " | " + online["result"]
+        with metrics.stage("predict.log_submission"):
+            log_submission(form, adjusted_prob)
 
         subj = "Visa Predictor: Your Result"
         body = (
@@ -175,9 +185,13 @@ async def predict(
             f"- Total Strength: {scorecard['total_score']:.1f}/100\n\n"
             f"Suggestions:\n- " + "\n- ".join(all_suggestions or ["Everything looks good!"])
         )
-        email_sent = send_result_email(email or "", subj, body)
+        with metrics.stage("predict.email"):
+            email_sent = send_result_email(email or "", subj, body)
 
-        return templates.TemplateResponse(
+        sid = request.cookies.get(sessions.COOKIE) or sessions.new_id()
+        sessions.put(sid, sessions.prediction_context(form, scored))
+
+        response = templates.TemplateResponse(
             "result.html",
             {
                 "request": request,
@@ -188,12 +202,17 @@ async def predict(
                 "feature_impact": feature_impact or {},
                 "suggestions": all_suggestions or ["Everything looks good!"],
                 "scorecard": scorecard,
+                "history": scored["history"],
                 "email": email,
                 "email_sent": email_sent,
             },
         )
+        response.set_cookie(sessions.COOKIE, sid, max_age=int(sessions.TTL_S), httponly=True, samesite="lax")
+        return response
 
     except Exception as e:
+        print("⚠️ /predict failed:", e)
+        metrics.inc("visa_fallback_total", kind="predict_failed")
         return templates.TemplateResponse(
             "result.html",
             {
@@ -210,6 +229,95 @@ async def predict(
             },
         )
 
+@app.post("/api/v1/predict")
+async def api_predict(payload: Any = Body(...), explain: bool = True):
+    """
+    JSON prediction. Body is one applicant object, a list of them, or
+    {"applicants": [...]}; a batch is scored in a single vectorized pass.
+    """
+    single = isinstance(payload, dict) and "applicants" not in payload
+    items = [payload] if single else (payload.get("applicants") if isinstance(payload, dict) else payload)
+    if not isinstance(items, list) or not all(isinstance(it, dict) for it in items):
+        return JSONResponse({"error": "Expected an applicant object or a list of applicant objects."}, status_code=400)
+    if len(items) > API_MAX_BATCH:
+        return JSONResponse({"error": f"At most {API_MAX_BATCH} applicants per request."}, status_code=413)
+
+    try:
+        if single:
+            results = [await score_one(normalize_form(payload), explain=explain)]
+        else:
+            results = score_forms([normalize_form(it) for it in items], explain=explain)
+    except Exception as e:
+        return JSONResponse({"error": f"Prediction failed: {e}"}, status_code=500)
+
+    if single:
+        return results[0]
+    return {"count": len(results), "results": results}
+
+@app.post("/api/v1/scenarios")
+async def api_scenarios(payload: Any = Body(...)):
+    """
+    What-if sweep: {"form": {...}, "grid": {"wage": [...], "full_time_position": ["Y"],
+    "duration_months": [36], ...}, "top": 20}. All variants are scored in one batch.
+    """
+    if not isinstance(payload, dict) or not isinstance(payload.get("form"), dict) or not isinstance(payload.get("grid"), dict):
+        return JSONResponse({"error": "Expected {\"form\": {...}, \"grid\": {field: [options]}}."}, status_code=400)
+    try:
+        return run_scenarios(payload["form"], payload["grid"], top=payload.get("top", 20))
+    except OverflowError as e:
+        return JSONResponse({"error": str(e)}, status_code=413)
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    except Exception as e:
+        return JSONResponse({"error": f"Scenario scoring failed: {e}"}, status_code=500)
+
+
+@app.post("/api/v1/counterfactual")
+async def api_counterfactual(payload: Any = Body(...)):
+    """
+    Cheapest change (wage, full-time, duration, positions) that reaches a
+    target probability: {"form": {...}, "target": 0.75, "budget_ms": 250},
+    optionally with "costs" overriding counterfactual.COSTS.
+    """
+    if not isinstance(payload, dict) or not isinstance(payload.get("form"), dict):
+        return JSONResponse({"error": "Expected {\"form\": {...}}."}, status_code=400)
+    try:
+        target = float(payload.get("target", CF_TARGET))
+        budget_ms = float(payload.get("budget_ms", CF_BUDGET_MS))
+        max_pct = float(payload.get("max_wage_increase_pct", 50))
+    except (TypeError, ValueError):
+        return JSONResponse({"error": "target, budget_ms and max_wage_increase_pct must be numbers."}, status_code=400)
+    if not all(math.isfinite(v) for v in (target, budget_ms, max_pct)):
+        return JSONResponse({"error": "target, budget_ms and max_wage_increase_pct must be finite."}, status_code=400)
+    if not 0 < target < 1:
+        return JSONResponse({"error": "target must be between 0 and 1."}, status_code=400)
+    if not 0 <= max_pct <= CF_MAX_PCT_LIMIT:
+        return JSONResponse({"error": f"max_wage_increase_pct must be between 0 and {CF_MAX_PCT_LIMIT:g}."}, status_code=400)
+    budget_ms = max(0.0, min(budget_ms, 5 * CF_BUDGET_MS))
+    try:
+        return counterfactual_search(payload["form"], target=target, budget_ms=budget_ms,
+                                     max_wage_increase_pct=max_pct, costs=payload.get("costs"))
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    except Exception as e:
+        return JSONResponse({"error": f"Counterfactual search failed: {e}"}, status_code=500)
+
+
+@app.post("/api/v1/validate")
+async def api_validate(payload: Any = Body(...)):
+    """
+    Online validation for {"items": [{"job_title": ..., "state": ...}, ...]}:
+    cached, duplicate lookups coalesced, fan-out bounded by VALIDATION_CONCURRENCY.
+    """
+    items = payload.get("items") if isinstance(payload, dict) else payload
+    if not isinstance(items, list) or not all(isinstance(it, dict) for it in items):
+        return JSONResponse({"error": "Expected {\"items\": [{\"job_title\": ..., \"state\": ...}]}."}, status_code=400)
+    if len(items) > API_MAX_BATCH:
+        return JSONResponse({"error": f"At most {API_MAX_BATCH} items per request."}, status_code=413)
+    pairs = [(it.get("job_title", ""), it.get("state", it.get("worksite_state", ""))) for it in items]
+    return {"results": await validation_service().validate_many(pairs)}
+
+
 @app.get("/wage", response_class=HTMLResponse)
 async def wage_form(request: Request):
     return templates.TemplateResponse("wage.html", {"request": request, "result": None})
@@ -233,16 +341,43 @@ async def wage_post(
     })
 
 
+@app.get("/api/v1/wage")
+async def api_wage(soc_code: str = "", state: str = "", wage: str = "", unit: str = "Year"):
+    """Benchmark and percentile rank of an offer, falling back to major-group / national rollups."""
+    result = compare_wage(soc_code.strip(), state.strip(), wage.strip(), unit.strip() or "Year")
+    return result if result["found"] else JSONResponse(result, status_code=404)
+
+
+@app.get("/autocomplete/{field}")
+async def autocomplete(field: str, q: str = "", k: int = 10):
+    try:
+        results = suggest(field, q, k)
+    except KeyError:
+        return JSONResponse({"error": f"Unknown field '{field}'."}, status_code=404)
+    return {"field": field, "query": q, "results": results}
+
+
 @app.get("/chat", response_class=HTMLResponse)
 async def chat_page(request: Request):
     return templates.TemplateResponse("chat.html", {"request": request})
 
 @app.post("/chat/message")
-async def chat_message(payload: dict = Body(...)):
+async def chat_message(request: Request, payload: dict = Body(...)):
     user_text = str(payload.get("message", "")).strip()
-    reply, actions = chat_respond(user_text)
+    context = sessions.get(request.cookies.get(sessions.COOKIE))
+    reply, actions = chat_respond(user_text, context)
     return {"reply": reply, "actions": actions}
 
+@app.post("/chat/classify")
+async def chat_classify(payload: Any = Body(...)):
+    """Bulk intent routing: {"messages": [...]} or a bare list of strings."""
+    messages = payload.get("messages") if isinstance(payload, dict) else payload
+    if not isinstance(messages, list):
+        return JSONResponse({"error": "Expected {\"messages\": [...]}."}, status_code=400)
+    if len(messages) > API_MAX_BATCH:
+        return JSONResponse({"error": f"At most {API_MAX_BATCH} messages per request."}, status_code=413)
+    return {"results": [{"intent": intent, "faq": faq} for intent, faq in (route(str(m)) for m in messages)]}
+
 @app.get("/bulk", response_class=HTMLResponse)
 async def bulk_form(request: Request):
     return templates.TemplateResponse("bulk.html", {"request": request, "preview": None})
@@ -251,24 +386,73 @@ async def bulk_form(request: Request):
 async def bulk_post(request: Request, file: UploadFile = File(...)):
     try:
         content = await file.read()
-        try:
-            df = pd.read_csv(io.BytesIO(content))
-        except UnicodeDecodeError:
-            df = pd.read_csv(io.BytesIO(content), encoding="latin-1")
-
+        too_large = admission.check_upload(content)
+        if too_large:
+            return templates.TemplateResponse("bulk.html", {"request": request, "error": too_large, "preview": None},
+                                              status_code=413)
         export_dir = os.path.join(BASE_DIR, "static", "exports")
-        results_df, filename = process_bulk_csv(df, export_dir)
+        results_df, filename = process_bulk_csv(iter_upload(content), export_dir)
         preview = results_df.head(20).to_dict(orient="records")
         download_url = f"/static/exports/{filename}"
         return templates.TemplateResponse("bulk.html", {
             "request": request,
             "preview": preview,
             "columns": list(results_df.columns),
-            "download": download_url
+            "download": download_url,
+            "summary": dedup_summary(results_df.attrs.get("rows", len(results_df)),
+                                     results_df.attrs.get("unique_rows", len(results_df))),
         })
     except Exception as e:
         return templates.TemplateResponse("bulk.html", {"request": request, "error": str(e), "preview": None})
 
 
+@app.post("/bulk/stream")
+async def bulk_stream(file: UploadFile = File(...), format: str = "ndjson", chunk_size: int = BULK_STREAM_CHUNK):
+    """
+    Stream bulk results chunk by chunk as NDJSON (default) or server-sent
+    events (format=sse). Accepts the same formats as /bulk (bulk_utils.iter_upload). Each record carries its 0-based input `row`; the
+    last record/event is a summary with the export download link.
+    """
+    content = await file.read()
+    too_large = admission.check_upload(content)
+    if too_large:
+        return JSONResponse({"error": too_large}, status_code=413)
+    chunk_size = max(1, min(int(chunk_size), 50_000))
+    sse = format.lower() == "sse"
+    media_type = "text/event-stream" if sse else "application/x-ndjson"
+    export_dir = os.path.join(BASE_DIR, "static", "exports")
+
+    def frame(event, payload):
+        if sse:
+            return f"event: {event}\ndata: {payload}\n\n"
+        return payload + "\n"
+
+    def generate():
+        rows = unique_rows = 0
+        try:
+            chunks = iter_upload(content, chunk_size)
+            results = iter_bulk_results(chunks, export_dir)
+            while True:
+                # each chunk runs in a threadpool worker; attribute it to the request's profile
+                with profiling.worker():
+                    try:
+                        start, results_df = next(results)
+                    except StopIteration as done:
+                        filename = done.value
+                        break
+                    results_df.insert(0, "row", range(start, start + len(results_df)))
+                    lines = results_df.to_json(orient="records", lines=True, force_ascii=False)
+                yield "".join(frame("result", line) for line in lines.splitlines() if line)
+                rows += len(results_df)
+                unique_rows += results_df.attrs.get("unique_rows", len(results_df))
+            summary = {"done": True, **dedup_summary(rows, unique_rows),
+                       "download": f"/static/exports/{filename}" if filename else None}
+            yield frame("done", json.dumps(summary))
+        except Exception as e:
+            yield frame("error", json.dumps({"done": True, "rows": rows, "error": str(e)}))
+
+    return StreamingResponse(generate(), media_type=media_type)
+
+
 if __name__ == "__main__":
     uvicorn.run("app.main:app", host="127.0.0.1", port=8000, reload=True)
@@ -0,0 +1,145 @@
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import nullcontext
+from typing import Callable, Dict, List, Tuple
+
+ENABLED = os.getenv("METRICS_ENABLED", "0").strip().lower() in ("1", "true", "yes", "y")
+
+# seconds
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+HELP = {
+    "visa_stage_seconds": "Latency of an internal pipeline stage.",
+    "visa_http_request_seconds": "End-to-end HTTP request latency by route.",
+    "visa_fallback_total": "Times a degraded code path was taken.",
+    "visa_cache_total": "Cache lookups by cache and result (hit/miss).",
+    "visa_rows_total": "Rows processed by a batch path.",
+    "visa_wage_lookup_total": "Wage benchmark lookups by result.",
+}
+
+_lock = threading.Lock()
+_counters: Dict[Tuple[str, tuple], float] = {}
+_histograms: Dict[Tuple[str, tuple], List[float]] = {}  # bucket counts + [sum, count]
+_collectors: List[Callable[[], List[Tuple[str, str, dict, float]]]] = []
+_NOOP = nullcontext()
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def inc(name: str, value: float = 1.0, **labels):
+    if not ENABLED:
+        return
+    k = _key(name, labels)
+    with _lock:
+        _counters[k] = _counters.get(k, 0.0) + value
+
+
+def observe(name: str, seconds: float, **labels):
+    if not ENABLED:
+        return
+    k = _key(name, labels)
+    i = bisect_left(BUCKETS, seconds)
+    with _lock:
+        h = _histograms.get(k)
+        if h is None:
+            h = _histograms[k] = [0.0] * (len(BUCKETS) + 3)
+        h[i] += 1
+        h[-2] += seconds
+        h[-1] += 1
+
+
+class _Timer:
+    __slots__ = ("name", "labels", "t0")
+
+    def __init__(self, name, labels):
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        observe(self.name, time.perf_counter() - self.t0, **self.labels)
+        return False
+
+
+def stage(name: str):
+    """`with stage("shap"): ...` records visa_stage_seconds{stage=name}; a shared no-op when disabled."""
+    if not ENABLED:
+        return _NOOP
+    return _Timer("visa_stage_seconds", {"stage": name})
+
+
+def cache(name: str, hit: bool):
+    inc("visa_cache_total", cache=name, result="hit" if hit else "miss")
+
+
+def register_collector(fn):
+    """fn() -> [(name, type, labels, value)], sampled at scrape time (e.g. lru_cache stats)."""
+    _collectors.append(fn)
+    return fn
+
+
+def _fmt_labels(labels) -> str:
+    if not labels:
+        return ""
+    body = ",".join('%s="%s"' % (k, str(v).replace("\\", "\\\\").replace('"', '\\"')) for k, v in labels)
+    return "{" + body + "}"
+
+
+def _num(v) -> str:
+    v = float(v)
+    return str(int(v)) if v.is_integer() else repr(v)
+
+
+def render() -> str:
+    """Prometheus text exposition format (0.0.4)."""
+    lines: List[str] = []
+    seen = set()
+
+    def header(name, kind):
+        if name not in seen:
+            seen.add(name)
+            if name in HELP:
+                lines.append(f"# HELP {name} {HELP[name]}")
+            lines.append(f"# TYPE {name} {kind}")
+
+    with _lock:
+        counters = sorted(_counters.items())
+        histograms = sorted((k, list(v)) for k, v in _histograms.items())
+
+    for (name, labels), value in counters:
+        header(name, "counter")
+        lines.append(f"{name}{_fmt_labels(labels)} {_num(value)}")
+
+    for (name, labels), h in histograms:
+        header(name, "histogram")
+        cumulative = 0.0
+        for bound, n in zip(BUCKETS, h):
+            cumulative += n
+            lines.append(f"{name}_bucket{_fmt_labels(labels + (('le', f'{bound:g}'),))} {_num(cumulative)}")
+        lines.append(f"{name}_bucket{_fmt_labels(labels + (('le', '+Inf'),))} {_num(h[-1])}")
+        lines.append(f"{name}_sum{_fmt_labels(labels)} {h[-2]:.6f}")
+        lines.append(f"{name}_count{_fmt_labels(labels)} {_num(h[-1])}")
+
+    for fn in _collectors:
+        try:
+            samples = fn()
+        except Exception:
+            continue
+        for name, kind, labels, value in samples:
+            header(name, kind)
+            lines.append(f"{name}{_fmt_labels(tuple(sorted(labels.items())))} {_num(value)}")
+
+    return "\n".join(lines) + "\n"
+
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
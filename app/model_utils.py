@@ -5,10 +5,16 @@ import numpy as np
 import pandas as pd
 import shap
 import xgboost as xgb
-from .preprocess import get_calibrator
+from .preprocess import get_calibrator, METADATA
+from . import metrics
+from .fast_infer import make_predictor
 
-MODELS_DIR = os.path.join(os.path.dirname(__file__), "..", "models")
+MODELS_DIR = os.getenv("VISA_MODELS_DIR", os.path.join(os.path.dirname(__file__), "..", "models"))
 MODEL_PATH = os.path.join(MODELS_DIR, "xgb_final.json")
+# shallower/trimmed variant from train_xgb_full.py --compact; see compact_report.json
+COMPACT_MODEL_PATH = os.path.join(MODELS_DIR, "xgb_compact.json")
+# model used by bulk scoring: "compact" (falls back to full when not trained) or "full"
+BULK_MODEL = os.getenv("BULK_MODEL", "compact").strip().lower()
 
 _model = None
 _calibrator = get_calibrator()
@@ -17,6 +23,7 @@ _calibrator = get_calibrator()
 def load_model():
     """Load and cache the XGBoost model."""
     global _model
+    metrics.cache("model", _model is not None)
     if _model is None:
         bst = xgb.Booster()
         bst.load_model(MODEL_PATH)
@@ -24,68 +31,158 @@ def load_model():
     return _model
 
 
-def predict_proba_from_df(X):
+_compact = None
+_compact_ready = False
 
-    import re
-    bst = load_model()
 
-    def clean_value(v):
-        if isinstance(v, (int, float, np.number)):
-            return float(v)
-        s = str(v).strip().upper()
-        s = s.replace('[', '').replace(']', '').replace('"', '').replace("'", '').replace(',', '').strip()
+def load_compact():
+    """
+    Load and cache the compact model, or None when it was not trained or was
+    built from another full model (metadata.json compact_version != version).
+    """
+    global _compact, _compact_ready
+    if not _compact_ready:
+        stamp = METADATA.get("compact_version")
+        if os.path.exists(COMPACT_MODEL_PATH) and (stamp is None or stamp != METADATA.get("version")):
+            print(f"⚠️ xgb_compact.json was built for model version {stamp}, not {METADATA.get('version')}; "
+                  "using the full model.")
+        elif os.path.exists(COMPACT_MODEL_PATH):
+            try:
+                bst = xgb.Booster()
+                bst.load_model(COMPACT_MODEL_PATH)
+                _compact = bst
+            except Exception as e:
+                print("⚠️ Compact model not loaded, using the full model:", e)
+        _compact_ready = True
+    return _compact
 
-        if s in ("Y", "YES", "TRUE", "1"):
-            return 1.0
-        if s in ("N", "NO", "FALSE", "0"):
-            return 0.0
 
-        s = re.sub(r"[^0-9E\.\-\+]", "", s)
-        try:
-            return float(s)
-        except Exception:
-            return 0.0
+def _booster(variant):
+    """(variant, booster) actually used for `variant`; compact falls back to full."""
+    if variant == "compact":
+        bst = load_compact()
+        if bst is not None:
+            return "compact", bst
+    return "full", load_model()
+
+
+_predictors = {}
+
+
+def get_predictor(variant="full"):
+    """INFERENCE_BACKEND predictor (compiled / inplace), or None for DMatrix + Booster.predict."""
+    variant, bst = _booster(variant)
+    if variant not in _predictors:
+        _predictors[variant] = make_predictor(bst)
+    return _predictors[variant]
+
 
+_explainer = None
+
+
+def get_explainer():
+    """TreeExplainer is expensive to build; share one per process."""
+    global _explainer
+    metrics.cache("shap_explainer", _explainer is not None)
+    if _explainer is None:
+        _explainer = shap.TreeExplainer(load_model())
+    return _explainer
+
+
+def clean_value(v):
+    if isinstance(v, (int, float, np.number)):
+        return float(v)
+    s = str(v).strip().upper()
+    s = s.replace('[', '').replace(']', '').replace('"', '').replace("'", '').replace(',', '').strip()
+
+    if s in ("Y", "YES", "TRUE", "1"):
+        return 1.0
+    if s in ("N", "NO", "FALSE", "0"):
+        return 0.0
+
+    s = re.sub(r"[^0-9E\.\-\+]", "", s)
+    try:
+        return float(s)
+    except Exception:
+        return 0.0
+
+
+def _clean_frame(X):
+    X = X.copy()
     for col in X.columns:
-        X[col] = X[col].apply(clean_value)
+        if not pd.api.types.is_numeric_dtype(X[col]):
+            X[col] = X[col].map(clean_value)
+    return X.fillna(0.0).astype(float)
+
+
+def predict_proba_batch(X, explain=True, model="full"):
+    """
+    Score every row of X in one booster call.
 
-    X = X.fillna(0.0).astype(float)
+    Returns (probs, shap_values) where shap_values is an (n_rows, n_features)
+    array, or None when explain=False or SHAP is unavailable. model="compact"
+    scores with the compact variant when present; SHAP always explains the
+    full model, so explain with the full one.
+    """
+    model, bst = _booster(model)
+    metrics.inc("visa_model_rows_total", len(X), model=model)
+    with metrics.stage("clean"):
+        X = _clean_frame(X)
 
     try:
-        dmat = xgb.DMatrix(X, feature_names=list(X.columns))
-        pred = bst.predict(dmat)
-        prob = float(pred[0]) if isinstance(pred, (list, np.ndarray)) else float(pred)
+        predictor = get_predictor(model)
+        if predictor is not None:
+            with metrics.stage("booster_predict"):
+                cols = bst.feature_names or list(X.columns)
+                probs = np.asarray(predictor.predict(X[cols].to_numpy(dtype=np.float32)), dtype=float).reshape(-1)
+        else:
+            with metrics.stage("dmatrix"):
+                dmat = xgb.DMatrix(X, feature_names=list(X.columns))
+            with metrics.stage("booster_predict"):
+                probs = np.asarray(bst.predict(dmat), dtype=float).reshape(-1)
     except Exception as e:
         print("⚠️ Prediction error:", e)
-        prob = 0.0
+        metrics.inc("visa_fallback_total", kind="prediction_error")
+        probs = np.zeros(len(X))
 
-    feature_impact = {}
-    try:
-        explainer = shap.TreeExplainer(bst)
-        shap_values = explainer.shap_values(X)
+    shap_values = None
+    if explain:
+        try:
+            with metrics.stage("shap"):
+                shap_values = get_explainer().shap_values(X)
+            if isinstance(shap_values, list):
+                shap_values = shap_values[0]
+            shap_values = np.array(shap_values, dtype=float)
+        except Exception as e:
+            print("⚠️ SHAP fallback:", e)
+            metrics.inc("visa_fallback_total", kind="shap")
+            shap_values = None
 
-        if isinstance(shap_values, list):  
-            shap_values = shap_values[0]
+    return probs, shap_values
 
-        shap_values = np.array(shap_values, dtype=float)
 
+def global_importance(columns):
+    try:
+        importance_dict = load_model().get_score(importance_type='gain')
+        return dict(sorted(importance_dict.items(), key=lambda x: -x[1]))
+    except Exception:
+        return {col: 0.0 for col in columns}
 
-        mean_abs = np.abs(shap_values).mean(axis=0)
-        feature_impact = dict(sorted(zip(X.columns, mean_abs), key=lambda x: -x[1]))
 
-    except Exception as e:
-        print("⚠️ SHAP fallback:", e)
- 
-        try:
-            importance_dict = bst.get_score(importance_type='gain')
-            feature_impact = dict(sorted(importance_dict.items(), key=lambda x: -x[1]))
-        except Exception:
-            feature_impact = {col: 0.0 for col in X.columns}
+def impact_from_shap(columns, shap_row):
+    return dict(sorted(zip(columns, (float(v) for v in np.abs(shap_row))), key=lambda x: -x[1]))
 
-    return prob, feature_impact
 
+def predict_proba_from_df(X):
+    probs, shap_values = predict_proba_batch(X)
+    prob = float(probs[0]) if len(probs) else 0.0
 
+    if shap_values is not None:
+        feature_impact = impact_from_shap(X.columns, np.abs(shap_values).mean(axis=0))
+    else:
+        feature_impact = global_importance(X.columns)
 
+    return prob, feature_impact
 
 
 def generate_recommendations(feature_impact):
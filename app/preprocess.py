@@ -1,9 +1,11 @@
 import os, joblib, json, pandas as pd, numpy as np
 from dateutil import parser
 
+from .employer_stats import HISTORY_FEATURES, feature_column
+
 
 BASE_DIR = os.path.dirname(__file__)
-MODELS_DIR = os.path.join(BASE_DIR, "..", "models")
+MODELS_DIR = os.getenv("VISA_MODELS_DIR", os.path.join(BASE_DIR, "..", "models"))
 
 def load_artifacts():
     enc_path = os.path.join(MODELS_DIR, "feature_encoder.joblib")
@@ -38,69 +40,180 @@ def safe_float(v):
         return 0.0
 
 
-def prepare_input_dict(form: dict):
-
-    row = {}
-
-    for col in FEATURE_COLUMNS:
-        row[col] = form.get(col, "MISSING")
+NUMERIC_INPUTS = ["TOTAL_WORKER_POSITIONS", "WAGE_RATE_OF_PAY_FROM", "PREVAILING_WAGE"]
 
+YESNO_INPUTS = [
+    "FULL_TIME_POSITION", "NEW_EMPLOYMENT", "CONTINUED_EMPLOYMENT",
+    "CHANGE_EMPLOYER", "H_1B_DEPENDENT", "WILLFUL_VIOLATOR",
+    "AGREE_TO_LC_STATEMENT"
+]
 
-    for n in ["TOTAL_WORKER_POSITIONS", "WAGE_RATE_OF_PAY_FROM", "PREVAILING_WAGE"]:
-        try:
-            row[n] = safe_float(form.get(n, 0))
-        except Exception:
-            row[n] = 0.0
+SCALED_COLUMNS = [
+    "TOTAL_WORKER_POSITIONS", "WAGE_RATE_OF_PAY_FROM", "PREVAILING_WAGE",
+    "DURATION_DAYS", "BEGIN_YEAR", "BEGIN_MONTH", "END_YEAR", "END_MONTH"
+]
 
-    for yn in [
-        "FULL_TIME_POSITION", "NEW_EMPLOYMENT", "CONTINUED_EMPLOYMENT",
-        "CHANGE_EMPLOYER", "H_1B_DEPENDENT", "WILLFUL_VIOLATOR",
-        "AGREE_TO_LC_STATEMENT"
-    ]:
-        row[yn] = normalize_yesno(form.get(yn))
 
+def parse_date(v):
+    """One form date (string or date-like) parsed leniently; None when blank or unparseable."""
+    if hasattr(v, "year"):
+        return None if pd.isna(v) else v
     try:
-        b = form.get("BEGIN_DATE", "")
-        e = form.get("END_DATE", "")
-        bd = parser.parse(b) if b else None
-        ed = parser.parse(e) if e else None
-        if bd:
-            row["BEGIN_YEAR"] = bd.year
-            row["BEGIN_MONTH"] = bd.month
-        else:
-            row["BEGIN_YEAR"] = row["BEGIN_MONTH"] = 0
-        if ed:
-            row["END_YEAR"] = ed.year
-            row["END_MONTH"] = ed.month
-        else:
-            row["END_YEAR"] = row["END_MONTH"] = 0
-        if bd and ed:
-            row["DURATION_DAYS"] = (ed - bd).days
-        else:
-            row["DURATION_DAYS"] = 0
+        return parser.parse(v) if v else None
     except Exception:
-        row["BEGIN_YEAR"] = row["BEGIN_MONTH"] = row["END_YEAR"] = row["END_MONTH"] = row["DURATION_DAYS"] = 0
-
-    X = pd.DataFrame([row])
+        return None
+
+
+def _parse_dates(values):
+    """parse_date over a column, parsing each distinct string once."""
+    seen = {}
+    out = []
+    for v in values:
+        key = v if isinstance(v, str) else None
+        if key is None:
+            out.append(parse_date(v))
+            continue
+        if key not in seen:
+            seen[key] = parse_date(key)
+        out.append(seen[key])
+    return out
+
+
+def _to_datetimes(values) -> np.ndarray:
+    """
+    Vectorized date parsing to datetime64[D]: ISO-8601 strings (what the HTML
+    form and most exports send) in one pass, anything else once per distinct
+    string with dateutil. Unparseable or blank values are NaT.
+    """
+    arr = np.asarray(list(values), dtype=object)
+    try:
+        dt = pd.to_datetime(arr, errors="coerce", format="ISO8601")
+    except ValueError:  # mixed UTC offsets
+        dt = pd.to_datetime(arr, errors="coerce", format="ISO8601", utc=True).tz_convert(None)
+    if dt.tz is not None:
+        dt = dt.tz_convert(None)
+    out = dt.to_numpy().astype("datetime64[D]")
+    nat = np.isnat(out)
+    if nat.any():
+        retry = np.flatnonzero(nat & np.array([isinstance(v, str) and v.strip() != "" for v in arr], dtype=bool))
+        for i, d in zip(retry, _parse_dates(arr[retry].tolist())):
+            if d is not None:
+                out[i] = np.datetime64(d.replace(tzinfo=None), "D")
+    return out
+
+
+def date_features(forms) -> dict:
+    """
+    Everything derived from BEGIN_DATE / END_DATE, computed once per batch:
+    the model's BEGIN/END year and month and DURATION_DAYS, plus MONTHS for
+    the rules (short-duration flag) and the scorecard. Values are per-row
+    integer arrays; missing dates give 0.
+    """
+    if isinstance(forms, pd.DataFrame):
+        n = len(forms)
+        get = lambda c: forms[c].tolist() if c in forms.columns else [None] * n
+    else:  # column dict, as built by prepare_input_frame
+        n = max((len(v) for v in forms.values()), default=0)
+        get = lambda c: forms.get(c, [None] * n)
+    begin, end = _to_datetimes(get("BEGIN_DATE")), _to_datetimes(get("END_DATE"))
+    b_ok, e_ok = ~np.isnat(begin), ~np.isnat(end)
+
+    def year(d, ok):
+        return np.where(ok, d.astype("datetime64[Y]").astype(np.int64) + 1970, 0)
+
+    def month(d, ok):
+        return np.where(ok, d.astype("datetime64[M]").astype(np.int64) % 12 + 1, 0)
+
+    both = b_ok & e_ok
+    days = np.where(both, (end - begin).astype(np.int64), 0)
+    return {
+        "BEGIN_YEAR": year(begin, b_ok),
+        "BEGIN_MONTH": month(begin, b_ok),
+        "END_YEAR": year(end, e_ok),
+        "END_MONTH": month(end, e_ok),
+        "DURATION_DAYS": days,
+        "MONTHS": np.maximum(days // 30, 0),
+    }
+
+
+def _is_missing(v):
+    return v is None or (isinstance(v, float) and np.isnan(v))
+
+
+def prepare_input_frame(forms, derived=None):
+    """
+    Build the model matrix for many forms at once.
+
+    Same encoding as prepare_input_dict, but built column by column over the
+    whole batch and assembled into a single DataFrame at the end, so a
+    one-row request does not pay pandas overhead per feature. `derived` is
+    date_features(forms) when the caller already has it.
+    """
+    if isinstance(forms, pd.DataFrame):
+        n = len(forms)
+        raw = {c: forms[c].tolist() for c in forms.columns}
+    else:
+        forms = list(forms)
+        n = len(forms)
+        keys = {k for f in forms for k in f}
+        raw = {k: [f.get(k) for f in forms] for k in keys}
+    blank = [None] * n
+    cols = {}
 
+    for col in FEATURE_COLUMNS:
+        vals = raw.get(col)
+        cols[col] = ["MISSING" if _is_missing(v) else v for v in vals] if vals is not None else ["MISSING"] * n
+
+    for c in NUMERIC_INPUTS:
+        cols[c] = [safe_float(v) for v in raw.get(c, [0] * n)]
+
+    for c in YESNO_INPUTS:
+        cols[c] = [normalize_yesno(v) for v in raw.get(c, blank)]
+
+    if derived is None:
+        derived = date_features({c: raw.get(c, blank) for c in ("BEGIN_DATE", "END_DATE")})
+    for c in ("BEGIN_YEAR", "BEGIN_MONTH", "END_YEAR", "END_MONTH", "DURATION_DAYS"):
+        cols[c] = derived[c]
+
+    hist_cols = [c for c in HISTORY_FEATURES if c in FEATURE_COLUMNS]
+    if hist_cols:
+        employers, socs, states = (raw.get(c, blank) for c in ("EMPLOYER_NAME", "SOC_CODE", "WORKSITE_STATE"))
+        for c in hist_cols:
+            cols[c] = feature_column(c, employers, socs, states)
+
+    # unseen values fall back to MISSING; counted per encoder for the drift monitor.
+    # The yes/no flags arrive here already normalised to 0/1 while their encoders
+    # were fitted on Y/N, so they always count: a known train/serve skew that
+    # drift.report() flags rather than hides.
+    oov = {}
     for col, mapping in ENCODERS.items():
-        if col in X.columns:
-            val = str(X.at[0, col])
-            X[col] = mapping.get(val, mapping.get("MISSING", 0))
+        if col in cols:
+            missing = mapping.get("MISSING", 0)
+            get = mapping.get
+            src = cols[col]
+            ids = [get(str(v)) for v in src]
+            if None in ids:
+                oov[col] = sum(1 for v, i in zip(src, ids) if i is None and v != "MISSING")
+                ids = [missing if i is None else i for i in ids]
+            cols[col] = ids
 
-    numeric_cols = [
-        "TOTAL_WORKER_POSITIONS", "WAGE_RATE_OF_PAY_FROM", "PREVAILING_WAGE",
-        "DURATION_DAYS", "BEGIN_YEAR", "BEGIN_MONTH", "END_YEAR", "END_MONTH"
-    ]
-    if SCALER and all(c in X.columns for c in numeric_cols):
-        X[numeric_cols] = SCALER.transform(X[numeric_cols])
+    X = pd.DataFrame(cols)
 
+    if SCALER and all(c in X.columns for c in SCALED_COLUMNS):
+        X[SCALED_COLUMNS] = SCALER.transform(X[SCALED_COLUMNS])
 
     for f in FEATURE_COLUMNS:
         if f not in X.columns:
             X[f] = 0
 
-    return X[FEATURE_COLUMNS]
+    X = X[FEATURE_COLUMNS]
+    X.attrs["oov"] = oov
+    return X
+
+
+def prepare_input_dict(form: dict):
+    return prepare_input_frame([form])
+
 
 def get_calibrator():
     return CALIBRATOR
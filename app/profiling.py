@@ -0,0 +1,297 @@
+import contextvars
+import cProfile
+import hmac
+import json
+import os
+import pstats
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+
+from . import metrics
+
+BASE_DIR = os.path.dirname(__file__)
+
+ENABLED = os.getenv("PROFILE_ENABLED", "0").strip().lower() in ("1", "true", "yes", "y")
+# keep a stack-sample profile of any request slower than this
+THRESHOLD_MS = float(os.getenv("PROFILE_THRESHOLD_MS", 500))
+# additionally run a full cProfile on this fraction of requests
+SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", 0.0))
+INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", 5))
+MAX_PROFILES = int(os.getenv("PROFILE_MAX", 50))
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(BASE_DIR, "..", "data", "profiles"))
+ROUTES = tuple(p for p in os.getenv("PROFILE_ROUTES", "/predict,/bulk,/api,/wage,/chat").split(",") if p)
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+
+def _fold(frame, limit=128):
+    """Collapsed stack ("root;...;leaf"), the input format of flamegraph.pl / speedscope."""
+    parts = []
+    while frame is not None and len(parts) < limit:
+        code = frame.f_code
+        parts.append(f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}")
+        frame = frame.f_back
+    return ";".join(reversed(parts))
+
+
+class _Sampler:
+    """
+    One background thread that, while profiled requests are in flight,
+    snapshots the stacks of the threads working for each of them (the event
+    loop thread, plus worker threads attached with worker()) every
+    INTERVAL_MS. Idle when nothing is being profiled.
+    """
+
+    def __init__(self, interval_s):
+        self.interval_s = interval_s
+        self.active = {}
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.thread = None
+
+    def _run(self):
+        while True:
+            self.wake.wait()
+            time.sleep(self.interval_s)
+            with self.lock:
+                if not self.active:
+                    self.wake.clear()
+                    continue
+                frames = sys._current_frames()
+                for threads, counter in self.active.values():
+                    for thread_id, name in threads.items():
+                        f = frames.get(thread_id)
+                        if f is not None:
+                            counter[f"{name};{_fold(f)}"] += 1
+
+    def start(self, key, thread_id):
+        counter = Counter()
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+                self.thread.start()
+            self.active[key] = ({thread_id: "loop"}, counter)
+            self.wake.set()
+        return counter
+
+    def attach(self, key, thread_id, name):
+        """Sample thread_id for key too; False if it already was (or key is not sampled)."""
+        with self.lock:
+            entry = self.active.get(key)
+            if entry is None or thread_id in entry[0]:
+                return False
+            entry[0][thread_id] = name
+            return True
+
+    def detach(self, key, thread_id):
+        with self.lock:
+            entry = self.active.get(key)
+            if entry is not None:
+                entry[0].pop(thread_id, None)
+
+    def stop(self, key):
+        with self.lock:
+            self.active.pop(key, None)
+
+
+class _Request:
+    """Profiling state of one in-flight request, shared with the threads working for it."""
+
+    def __init__(self):
+        self.thread_id = threading.get_ident()
+        self.counter = None
+        self.prof = None       # cProfile of the event loop thread
+        self.workers = []      # cProfiles of worker threads, merged into prof when saved
+        self.done = False
+
+
+_sampler = _Sampler(INTERVAL_MS / 1000.0)
+_write_lock = threading.Lock()
+# cProfile hooks the interpreter globally, so only one request is profiled at a time;
+# samples drawn while it is held are skipped
+_cprofile_lock = threading.Lock()
+# the request being profiled, for worker(); asyncio.to_thread and Starlette's
+# threadpool copy it into the worker threads
+_current = contextvars.ContextVar("profiled_request", default=None)
+
+
+def current():
+    """The profiled request in this context (pass it to worker() from another thread), or None."""
+    return _current.get()
+
+
+@contextmanager
+def worker(requests=None):
+    """
+    Attribute the current thread's work to profiled requests while the block
+    runs: its stack is sampled with theirs and, if one of them is under
+    cProfile, the block is profiled too. `requests` defaults to the request
+    in the current context; a no-op when nothing is being profiled.
+    """
+    if requests is None:
+        requests = (_current.get(),)
+    requests = [r for r in requests if r is not None and not r.done]
+    if not requests:
+        yield
+        return
+    thread_id = threading.get_ident()
+    name = threading.current_thread().name
+    attached = [r for r in requests if r.counter is not None and _sampler.attach(r, thread_id, name)]
+    owner = next((r for r in requests if r.prof is not None and r.thread_id != thread_id), None)
+    prof = cProfile.Profile() if owner else None
+    try:
+        if prof:
+            prof.enable()
+        yield
+    finally:
+        if prof:
+            prof.disable()
+            owner.workers.append(prof)
+        for r in attached:
+            _sampler.detach(r, thread_id)
+
+
+def _slug(path):
+    return re.sub(r"[^A-Za-z0-9]+", "_", path).strip("_")[:40] or "root"
+
+
+def _enforce_ring():
+    metas = sorted(f for f in os.listdir(PROFILE_DIR) if f.endswith(".json"))
+    for meta in metas[:max(0, len(metas) - MAX_PROFILES)]:
+        pid = meta[:-5]
+        for f in os.listdir(PROFILE_DIR):
+            if f.startswith(pid + "."):
+                try:
+                    os.remove(os.path.join(PROFILE_DIR, f))
+                except OSError:
+                    pass
+
+
+def _save(kind, meta, write):
+    pid = f"{int(time.time() * 1000)}-{_slug(meta['path'])}-{uuid.uuid4().hex[:6]}"
+    ext = "folded" if kind == "sampling" else "prof"
+    with _write_lock:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        write(os.path.join(PROFILE_DIR, f"{pid}.{ext}"))
+        meta = dict(meta, id=pid, kind=kind, file=f"{pid}.{ext}")
+        with open(os.path.join(PROFILE_DIR, f"{pid}.json"), "w") as f:
+            json.dump(meta, f)
+        _enforce_ring()
+    metrics.inc("visa_profiles_saved_total", kind=kind)
+
+
+def _finish(req, request, response, t0):
+    """Stop profiling a request once its body is sent, and store what was captured."""
+    if req.done:
+        return
+    req.done = True
+    if req.prof:
+        req.prof.disable()
+        _cprofile_lock.release()
+    if req.counter is not None:
+        _sampler.stop(req)
+    duration_ms = (time.perf_counter() - t0) * 1000.0
+
+    path = request.url.path
+    route = request.scope.get("route")
+    meta = {
+        "route": getattr(route, "path", path),
+        "path": path,
+        "method": request.method,
+        "status": response.status_code if response is not None else 500,
+        "duration_ms": round(duration_ms, 2),
+        "ts": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "in_flight": len(_sampler.active) + 1,
+    }
+    try:
+        if req.prof:
+            def dump(p):
+                stats = pstats.Stats(req.prof)
+                for prof in req.workers:
+                    stats.add(prof)
+                stats.dump_stats(p)
+            _save("cprofile", dict(meta, worker_threads=len(req.workers)), dump)
+        if req.counter and duration_ms >= THRESHOLD_MS:
+            def write(p):
+                with open(p, "w") as f:
+                    for stack, n in req.counter.most_common():
+                        f.write(f"{stack} {n}\n")
+            _save("sampling", dict(meta, samples=sum(req.counter.values()), interval_ms=INTERVAL_MS), write)
+    except Exception as e:
+        print("⚠️ Could not store profile:", e)
+
+
+async def middleware(request, call_next):
+    path = request.url.path
+    if not path.startswith(ROUTES):
+        return await call_next(request)
+
+    req = _Request()
+    if THRESHOLD_MS >= 0:
+        req.counter = _sampler.start(req, req.thread_id)
+    if SAMPLE_RATE and random.random() < SAMPLE_RATE and _cprofile_lock.acquire(blocking=False):
+        req.prof = cProfile.Profile()
+    token = _current.set(req)
+    t0 = time.perf_counter()
+    try:
+        if req.prof:
+            req.prof.enable()
+        response = await call_next(request)
+    except BaseException:
+        _finish(req, request, None, t0)
+        raise
+    finally:
+        _current.reset(token)
+
+    body = getattr(response, "body_iterator", None)
+    if body is None:
+        _finish(req, request, response, t0)
+        return response
+
+    # streamed bodies (and /bulk/stream's scoring) run after call_next returns,
+    # so timing and profiling stop at the last chunk instead
+    async def profiled_body():
+        try:
+            async for chunk in body:
+                yield chunk
+        finally:
+            _finish(req, request, response, t0)
+
+    response.body_iterator = profiled_body()
+    return response
+
+
+def list_profiles():
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    out = []
+    for f in sorted(os.listdir(PROFILE_DIR), reverse=True):
+        if f.endswith(".json"):
+            try:
+                with open(os.path.join(PROFILE_DIR, f)) as fh:
+                    out.append(json.load(fh))
+            except Exception:
+                continue
+    return out
+
+
+def profile_path(pid):
+    """Path of a stored profile by id, or None (ids are validated against the index)."""
+    for meta in list_profiles():
+        if meta.get("id") == pid:
+            p = os.path.join(PROFILE_DIR, meta["file"])
+            return p if os.path.exists(p) else None
+    return None
+
+
+def admin_allowed(request):
+    """Admin endpoints need ADMIN_TOKEN (x-admin-token header or ?token=); denied when it is unset."""
+    if not ADMIN_TOKEN:
+        return False
+    given = request.headers.get("x-admin-token") or request.query_params.get("token") or ""
+    return hmac.compare_digest(given.encode(), ADMIN_TOKEN.encode())
@@ -2,7 +2,7 @@ import os
 import pandas as pd
 from datetime import datetime
 
-REINFORCE_PATH = "../data/new_user_submissions.csv"
+REINFORCE_PATH = os.getenv("VISA_SUBMISSION_LOG", "../data/new_user_submissions.csv")
 
 def log_submission(form_dict: dict, predicted_prob: float):
     os.makedirs(os.path.dirname(REINFORCE_PATH), exist_ok=True)
@@ -0,0 +1,142 @@
+import numpy as np
+import pandas as pd
+from typing import Dict, Any, List
+
+YES = ("y", "yes", "true", "1")
+
+
+def yn(v):
+    return str(v).strip().lower() in YES
+
+
+def yes_mask(values) -> np.ndarray:
+    """Column-wise yn(): None/NaN and anything outside YES are False."""
+    s = pd.Series(values, dtype=object)
+    return s.map(lambda v: str(v).strip().lower()).isin(YES).to_numpy()
+
+
+def numeric(values) -> np.ndarray:
+    """Column-wise float(v or 0): empty -> 0.0, unparseable -> NaN."""
+    s = pd.Series(values, dtype=object)
+    blank = s.isna() | (s.astype(str) == "")
+    out = pd.to_numeric(s.where(~blank, 0), errors="coerce")
+    return out.to_numpy(dtype=float)
+
+
+def signals(frame: pd.DataFrame, months=None) -> Dict[str, np.ndarray]:
+    """Per-row inputs the rule table reads, computed once per batch."""
+    n = len(frame)
+
+    def col(name):
+        return frame[name] if name in frame.columns else pd.Series([None] * n, index=frame.index, dtype=object)
+
+    wage = numeric(col("WAGE_RATE_OF_PAY_FROM"))
+    prevailing = numeric(col("PREVAILING_WAGE"))
+    with np.errstate(invalid="ignore"):
+        has_prev = prevailing > 0
+        below = has_prev & (wage < prevailing)
+        above = has_prev & ~below & (wage >= 1.2 * prevailing)
+    months = np.zeros(n, dtype=int) if months is None else np.asarray(months, dtype=int)
+    return {
+        "wage_below_prev": below,
+        "wage_above_prev": above,
+        "full_time": yes_mask(col("FULL_TIME_POSITION")),
+        "h1b_dependent": yes_mask(col("H_1B_DEPENDENT")),
+        "willful_violator": yes_mask(col("WILLFUL_VIOLATOR")),
+        "agree_lc": yes_mask(col("AGREE_TO_LC_STATEMENT")),
+        "months": months,
+    }
+
+
+# Applied in order; each matching rule multiplies the model probability by
+# `factor`. `flag` names the guides.json section the rule maps to.
+RULES: List[Dict[str, Any]] = [
+    {
+        "name": "wage_below_prev",
+        "when": lambda s: s["wage_below_prev"],
+        "factor": 0.75,
+        "note": "Offered wage is below prevailing wage (-25%).",
+        "suggestion": "Increase offered wage closer to or above the prevailing wage.",
+        "flag": "wage_below_prev",
+    },
+    {
+        "name": "wage_above_prev",
+        "when": lambda s: s["wage_above_prev"],
+        "factor": 1.05,
+        "note": "Offered wage significantly exceeds prevailing wage (+5%).",
+        "suggestion": None,
+        "flag": None,
+    },
+    {
+        "name": "not_full_time",
+        "when": lambda s: ~s["full_time"],
+        "factor": 0.8,
+        "note": "Not a full-time position (-20%).",
+        "suggestion": "Convert to a full-time role if possible.",
+        "flag": "not_full_time",
+    },
+    {
+        "name": "h1b_dependent",
+        "when": lambda s: s["h1b_dependent"],
+        "factor": 0.85,
+        "note": "Employer is H-1B dependent (-15%).",
+        "suggestion": "Reduce dependency on H-1B workforce or justify dependency clearly.",
+        "flag": "h1b_dependent",
+    },
+    {
+        "name": "willful_violator",
+        "when": lambda s: s["willful_violator"],
+        "factor": 0.8,
+        "note": "Employer flagged as willful violator (-20%).",
+        "suggestion": "Ensure full compliance and file corrective documentation.",
+        "flag": "willful_violator",
+    },
+    {
+        "name": "no_lc_agree",
+        "when": lambda s: ~s["agree_lc"],
+        "factor": 0.7,
+        "note": "Labor Condition Statement not agreed (-30%).",
+        "suggestion": "Agree to LC statement before filing.",
+        "flag": "no_lc_agree",
+    },
+]
+
+_FACTORS = np.array([r["factor"] for r in RULES], dtype=float)
+
+
+def apply_rules(frame: pd.DataFrame, base_probs, months=None):
+    """
+    Evaluate RULES over a whole batch.
+
+    Returns (adjusted_probs, hits, flags): hits is an (n_rows, n_rules) bool
+    matrix in RULES order, flags a DataFrame of the guide flags.
+    """
+    sig = signals(frame, months)
+    n = len(frame)
+    hits = np.column_stack([np.asarray(r["when"](sig), dtype=bool) for r in RULES]) if n else np.zeros((0, len(RULES)), dtype=bool)
+    factors = np.where(hits, _FACTORS, 1.0).prod(axis=1)
+    adjusted = np.clip(np.asarray(base_probs, dtype=float) * factors, 0.0, 1.0)
+
+    flags = pd.DataFrame({r["flag"]: hits[:, i] for i, r in enumerate(RULES) if r["flag"]})
+    flags["short_duration"] = (sig["months"] > 0) & (sig["months"] < 12)
+    return adjusted, hits, flags
+
+
+def rule_notes(hit_row):
+    notes, suggestions = [], []
+    for r, hit in zip(RULES, hit_row):
+        if hit:
+            notes.append(r["note"])
+            if r["suggestion"]:
+                suggestions.append(r["suggestion"])
+    return notes, suggestions
+
+
+def recommendation_labels(probs) -> np.ndarray:
+    probs = np.asarray(probs, dtype=float)
+    return np.select(
+        [probs > 0.75, probs > 0.45],
+        ["✅ High chance of approval", "⚠️ Moderate likelihood of approval"],
+        "❌ High chance of denial",
+    )
+
@@ -0,0 +1,127 @@
+import itertools
+import os
+from datetime import date
+from typing import Any, Dict, List
+
+import numpy as np
+import pandas as pd
+
+from .scoring import FORM_FIELDS, normalize_form, score_frame
+from .preprocess import parse_date
+from . import metrics
+
+SCENARIO_MAX = int(os.getenv("SCENARIO_MAX", 2000))
+
+# axes that are not a plain "set this column" change
+DERIVED_AXES = {
+    "wage_pct": "WAGE_RATE_OF_PAY_FROM",     # % raise over the base wage
+    "duration_months": "END_DATE",           # END_DATE = BEGIN_DATE + n months
+}
+
+
+def _column_for(axis: str) -> str:
+    if axis in DERIVED_AXES:
+        return DERIVED_AXES[axis]
+    if axis in FORM_FIELDS:
+        return FORM_FIELDS[axis]
+    if axis in FORM_FIELDS.values():
+        return axis
+    raise ValueError(f"Unknown scenario field '{axis}'.")
+
+
+def _axis_values(axis: str, values, base: Dict[str, str]) -> List[str]:
+    """Column values (as strings, like a submitted form) for each option on one axis."""
+    if axis == "wage_pct":
+        try:
+            wage = float(base["WAGE_RATE_OF_PAY_FROM"] or 0)
+        except ValueError:
+            raise ValueError("wage_pct needs a numeric base wage.")
+        return [f"{wage * (1 + float(p) / 100.0):.2f}" for p in values]
+    if axis == "duration_months":
+        begin = parse_date(base.get("BEGIN_DATE")) or date.today()
+        return [(pd.Timestamp(begin) + pd.DateOffset(months=int(m))).strftime("%Y-%m-%d") for m in values]
+    return [str(v).strip() for v in values]
+
+
+def expand_grid(base: Dict[str, str], grid: Dict[str, Any]):
+    """
+    Every combination of the grid's options, each axis also allowed to keep
+    the base value. Row 0 is the unchanged base form.
+
+    Returns (frame, changes): one canonical form per row and, per row, the
+    {axis: option} it applies.
+    """
+    axes, columns, options = [], [], []
+    for axis, values in (grid or {}).items():
+        if not isinstance(values, (list, tuple)):
+            values = [values]
+        if not values:
+            continue
+        if not all(isinstance(v, (str, int, float)) for v in values):
+            raise ValueError(f"Options for '{axis}' must be strings or numbers.")
+        col = _column_for(axis)
+        if col in columns:
+            raise ValueError(f"Two scenario fields change {col}.")
+        axes.append(axis)
+        columns.append(col)
+        # an option equal to the base value is the "keep" option again
+        options.append([(v, cv) for v, cv in zip(values, _axis_values(axis, values, base)) if cv != base[col]])
+
+    n = int(np.prod([len(o) + 1 for o in options])) if options else 1
+    if n > SCENARIO_MAX:
+        raise OverflowError(f"{n} scenarios requested; the limit is {SCENARIO_MAX}.")
+
+    keep = (None, None)
+    combos = list(itertools.product(*[[keep] + o for o in options]))
+    frame = pd.DataFrame([base] * len(combos))
+    for j, col in enumerate(columns):
+        frame[col] = [base[col] if c[j][1] is None else c[j][1] for c in combos]
+    if "duration_months" in axes and not parse_date(base.get("BEGIN_DATE")):
+        frame["BEGIN_DATE"] = date.today().isoformat()
+    changes = [{axes[j]: c[j][0] for j in range(len(axes)) if c[j][1] is not None} for c in combos]
+    return frame, changes
+
+
+def run_scenarios(payload: Dict[str, Any], grid: Dict[str, Any], top: int = 20) -> Dict[str, Any]:
+    """
+    Score a base form and every perturbation in `grid` in one batch
+    (rules and scorecard included) and rank the variants by probability gain.
+
+    grid maps a form field (HTML or canonical name, or wage_pct /
+    duration_months) to a list of options, e.g.
+    {"wage": [120000, 140000], "full_time_position": ["Y"], "duration_months": [36]}.
+    """
+    base = normalize_form(payload)
+    frame, changes = expand_grid(base, grid)
+    with metrics.stage("scenarios.score"):
+        out, _, _, _, _ = score_frame(frame, explain=False, monitor=False)
+    metrics.inc("visa_scenarios_scored_total", value=len(frame))
+
+    probs = out["probability"].to_numpy()
+    delta = probs - probs[0]
+    n_changes = np.array([len(c) for c in changes])
+    # biggest gain first; for equal gains, the variant that changes less
+    # and skip variants that only add changes to one already listed
+    order, listed = [], []
+    for i in np.lexsort((n_changes, -delta)):
+        if len(order) >= max(0, int(top)):
+            break
+        items = set(changes[i].items())
+        if i == 0 or any(prev <= items for prev in listed):
+            continue
+        order.append(i)
+        listed.append(items)
+
+    def row(i):
+        return {
+            "changes": changes[i],
+            "probability": round(float(probs[i]), 4),
+            "delta": round(float(delta[i]), 4),
+            "recommendation": out["recommendation"].iat[i],
+            "total_score": float(out["total_score"].iat[i]),
+        }
+
+    baseline = row(0)
+    baseline.pop("changes")
+    baseline.pop("delta")
+    return {"baseline": baseline, "count": len(frame) - 1, "scenarios": [row(i) for i in order]}
@@ -1,11 +1,90 @@
 import math
-from datetime import datetime
+import numpy as np
+import pandas as pd
+from .rules import yes_mask
+from .preprocess import date_features
+
+DOC_FIELDS = ['JOB_TITLE', 'EMPLOYER_NAME', 'WORKSITE_STATE', 'WAGE_RATE_OF_PAY_FROM', 'BEGIN_DATE', 'END_DATE']
+
+# canonical column -> accepted spellings for compute_strength_score(form, ...)
+ALIASES = {
+    'WAGE_RATE_OF_PAY_FROM': ['offered_wage', 'WAGE_RATE_OF_PAY_FROM', 'wage'],
+    'PREVAILING_WAGE': ['PREVAILING_WAGE', 'prevailing_wage', 'prev_wage'],
+    'FULL_TIME_POSITION': ['FULL_TIME_POSITION', 'full_time_position', 'FULL_TIME'],
+    'H_1B_DEPENDENT': ['H_1B_DEPENDENT', 'h1b_dependent'],
+    'WILLFUL_VIOLATOR': ['WILLFUL_VIOLATOR', 'willful_violator'],
+    'AGREE_TO_LC_STATEMENT': ['AGREE_TO_LC_STATEMENT', 'agree_to_lc_statement', 'AGREE_TO_LC'],
+    'BEGIN_DATE': ['BEGIN_DATE', 'begin_date'],
+    'END_DATE': ['END_DATE', 'end_date'],
+    'JOB_TITLE': ['JOB_TITLE'],
+    'EMPLOYER_NAME': ['EMPLOYER_NAME'],
+    'WORKSITE_STATE': ['WORKSITE_STATE'],
+}
+
+def _present(values) -> np.ndarray:
+    s = pd.Series(values, dtype=object)
+    return (s.notna() & (s.astype(str) != "")).to_numpy()
+
+def _column(frame, name, default=None):
+    if name in frame.columns:
+        s = frame[name].astype(object)
+        return s.where(_present(s), default)
+    return pd.Series([default] * len(frame), index=frame.index, dtype=object)
+
+def compute_strength_scores(frame: pd.DataFrame, duration_days) -> pd.DataFrame:
+    """
+    Column-wise scorecard for a batch of canonical forms.
+
+    `duration_days` is one value per row (already derived from the dates).
+    """
+    offered = pd.to_numeric(_column(frame, 'WAGE_RATE_OF_PAY_FROM', 0).map(lambda v: str(v).strip()), errors="coerce").fillna(0.0).to_numpy(dtype=float)
+    prevailing = pd.to_numeric(_column(frame, 'PREVAILING_WAGE', 0).map(lambda v: str(v).strip()), errors="coerce").fillna(0.0).to_numpy(dtype=float)
+
+    ft = yes_mask(_column(frame, 'FULL_TIME_POSITION', 'N'))
+    h1b_dep = yes_mask(_column(frame, 'H_1B_DEPENDENT', 'N'))
+    willful = yes_mask(_column(frame, 'WILLFUL_VIOLATOR', 'N'))
+    agree_lc = yes_mask(_column(frame, 'AGREE_TO_LC_STATEMENT', 'Y'))
+    duration_days = np.asarray(duration_days, dtype=float)
+
+    has_prev = prevailing > 0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratio = np.where(has_prev, offered / np.where(has_prev, prevailing, 1.0), 0.0)
+    # above prevailing increases score up to 100 for 1.5x or more
+    wage_score = np.where(
+        has_prev,
+        np.select(
+            [ratio < 0.8, ratio < 1.0],
+            [np.maximum(0.0, 40.0 * (ratio / 0.8)), 40.0 + 30.0 * ((ratio - 0.8) / 0.2)],
+            np.minimum(100.0, 70.0 + 30.0 * np.minimum((ratio - 1.0) / 0.5, 1.0)),
+        ),
+        np.select([offered >= 100000, offered > 0], [70.0, 40.0], 0.0),
+    )
+    wage_note = [
+        f"Offered/median ratio = {r:.2f} (median={p:,.0f})" if h else "Prevailing wage not available"
+        for h, r, p in zip(has_prev, ratio, prevailing)
+    ]
+
+    compliance_score = 100.0 - 60.0 * willful - 20.0 * h1b_dep - 30.0 * ~agree_lc
+    compliance_score = np.clip(compliance_score, 0.0, 100.0)
+
+    # boost for full-time, then for longer durations
+    stability_score = 50.0 + np.where(ft, 20.0, -10.0)
+    stability_score += np.select([duration_days >= 365, duration_days >= 180], [20.0, 10.0], 0.0)
+    stability_score = np.clip(stability_score, 0.0, 100.0)
+
+    missing = sum((~_present(_column(frame, key))).astype(int) for key in DOC_FIELDS)
+    doc_score = np.maximum(0.0, 100.0 - missing * 10.0)
 
-def _to_float(x, default=0.0):
-    try:
-        return float(str(x).strip())
-    except Exception:
-        return default
+    total_score = (wage_score * 0.35) + (compliance_score * 0.25) + (stability_score * 0.20) + (doc_score * 0.20)
+
+    return pd.DataFrame({
+        'wage_score': np.round(wage_score, 1),
+        'wage_note': wage_note,
+        'compliance_score': np.round(compliance_score, 1),
+        'stability_score': np.round(stability_score, 1),
+        'documentation_score': np.round(doc_score, 1),
+        'total_score': np.round(total_score, 1),
+    }, index=frame.index)
 
 def compute_strength_score(form, derived=None, **kwargs):
 
@@ -18,104 +97,32 @@ def compute_strength_score(form, derived=None, **kwargs):
     if kwargs:
         f.update(kwargs)
 
+    # one pass over the keys instead of a scan per variant
+    lowered = {}
+    for fk, fv in f.items():
+        if fv not in (None, ""):
+            lowered.setdefault(str(fk).lower(), fv)
 
     def get(key_variants, default=None):
         for k in key_variants:
             if k in f and f[k] not in (None, ""):
                 return f[k]
-            # also try lowercase
-            lk = k.lower()
-            for fk in f:
-                if fk.lower() == lk and f[fk] not in (None, ""):
-                    return f[fk]
+            if k.lower() in lowered:
+                return lowered[k.lower()]
         return default
 
-    offered_raw = get(['offered_wage', 'WAGE_RATE_OF_PAY_FROM', 'wage', 'WAGE_RATE_OF_PAY_FROM'], 0)
-    prevailing_raw = get(['PREVAILING_WAGE', 'prevailing_wage', 'prev_wage'], 0)
-
-    offered = _to_float(offered_raw, 0.0)
-    prevailing = _to_float(prevailing_raw, 0.0)
-
-    ft_raw = get(['FULL_TIME_POSITION', 'full_time_position', 'FULL_TIME'], 'N')
-    ft = str(ft_raw).strip().upper() in ('Y', 'YES', 'TRUE', '1')
-
-    h1b_dep = str(get(['H_1B_DEPENDENT', 'h1b_dependent'], 'N')).strip().upper() in ('Y','YES','TRUE','1')
-    willful = str(get(['WILLFUL_VIOLATOR', 'willful_violator'], 'N')).strip().upper() in ('Y','YES','TRUE','1')
-    agree_lc = str(get(['AGREE_TO_LC_STATEMENT', 'agree_to_lc_statement', 'AGREE_TO_LC'], 'Y')).strip().upper() in ('Y','YES','TRUE','1')
+    row = {col: get(variants) for col, variants in ALIASES.items()}
 
     duration_days = derived.get('DURATION_DAYS', None)
     if duration_days is None:
-        begin = get(['BEGIN_DATE', 'begin_date'], None)
-        end = get(['END_DATE', 'end_date'], None)
-        try:
-            if begin and end:
-                b = datetime.fromisoformat(str(begin))
-                e = datetime.fromisoformat(str(end))
-                duration_days = max(0, (e - b).days)
-        except Exception:
-            duration_days = 0
+        duration_days = max(0, int(date_features(pd.DataFrame([row], dtype=object))['DURATION_DAYS'][0]))
     try:
         duration_days = int(duration_days or 0)
     except Exception:
         duration_days = 0
 
-    wage_score = 0.0
-    wage_note = ""
-    if prevailing > 0:
-        ratio = offered / prevailing if prevailing else 0.0
-
-        if ratio < 0.8:
-            wage_score = max(0.0, 40.0 * (ratio / 0.8))
-        elif ratio < 1.0:
-            wage_score = 40.0 + 30.0 * ((ratio - 0.8) / 0.2)
-        else:
-            # above prevailing increases score up to 100 for 1.5x or more
-            wage_score = min(100.0, 70.0 + 30.0 * min( (ratio - 1.0) / 0.5, 1.0))
-        wage_note = f"Offered/median ratio = {ratio:.2f} (median={prevailing:,.0f})"
-    else:
-        if offered >= 100000:
-            wage_score = 70.0
-        elif offered > 0:
-            wage_score = 40.0
-        else:
-            wage_score = 0.0
-        wage_note = "Prevailing wage not available"
-
-    compliance_score = 100.0
-    if willful:
-        compliance_score -= 60.0
-    if h1b_dep:
-        compliance_score -= 20.0
-    if not agree_lc:
-        compliance_score -= 30.0
-    compliance_score = max(0.0, min(100.0, compliance_score))
-
-    stability_score = 50.0
-    # boost for full-time
-    stability_score += 20.0 if ft else -10.0
-    # boost for longer durations
-    if duration_days >= 365:
-        stability_score += 20.0
-    elif duration_days >= 180:
-        stability_score += 10.0
-    stability_score = max(0.0, min(100.0, stability_score))
-
-    doc_score = 90.0
-
-    missing = 0
-    for key in ['JOB_TITLE','EMPLOYER_NAME','WORKSITE_STATE','WAGE_RATE_OF_PAY_FROM','BEGIN_DATE','END_DATE']:
-        if not get([key]):
-            missing += 1
-    doc_score = max(0.0, 100.0 - missing*10.0)
-
-    total_score = (wage_score * 0.35) + (compliance_score * 0.25) + (stability_score * 0.20) + (doc_score * 0.20)
-    total_score = round(total_score, 1)
-
-    return {
-        'wage_score': round(wage_score, 1),
-        'wage_note': wage_note,
-        'compliance_score': round(compliance_score, 1),
-        'stability_score': round(stability_score, 1),
-        'documentation_score': round(doc_score, 1),
-        'total_score': total_score
-    }
+    scores = compute_strength_scores(pd.DataFrame([row], dtype=object), [duration_days])
+    out = scores.iloc[0].to_dict()
+    for k in ('wage_score', 'compliance_score', 'stability_score', 'documentation_score', 'total_score'):
+        out[k] = float(out[k])
+    return out
@@ -0,0 +1,129 @@
+import pandas as pd
+from typing import Dict, Any, List
+
+from .preprocess import prepare_input_frame, date_features
+from .model_utils import predict_proba_batch, impact_from_shap, global_importance, generate_recommendations
+from .rules import apply_rules, rule_notes, recommendation_labels
+from .scorecard import compute_strength_scores
+from .guides import suggest_from_flags
+from .employer_stats import lookup_many
+from . import drift, metrics
+
+# HTML form / JSON field name -> canonical LCA column
+FORM_FIELDS = {
+    "visa_class": "VISA_CLASS",
+    "job_title": "JOB_TITLE",
+    "soc_code": "SOC_CODE",
+    "soc_title": "SOC_TITLE",
+    "employer_name": "EMPLOYER_NAME",
+    "employer_state": "EMPLOYER_STATE",
+    "worksite_state": "WORKSITE_STATE",
+    "worksite_city": "WORKSITE_CITY",
+    "full_time_position": "FULL_TIME_POSITION",
+    "total_worker_positions": "TOTAL_WORKER_POSITIONS",
+    "wage": "WAGE_RATE_OF_PAY_FROM",
+    "wage_unit": "WAGE_UNIT_OF_PAY",
+    "prevailing_wage": "PREVAILING_WAGE",
+    "new_employment": "NEW_EMPLOYMENT",
+    "continued_employment": "CONTINUED_EMPLOYMENT",
+    "change_employer": "CHANGE_EMPLOYER",
+    "h1b_dependent": "H_1B_DEPENDENT",
+    "willful_violator": "WILLFUL_VIOLATOR",
+    "agree_lc": "AGREE_TO_LC_STATEMENT",
+    "begin_date": "BEGIN_DATE",
+    "end_date": "END_DATE",
+}
+
+
+def normalize_form(payload: Dict[str, Any]) -> Dict[str, str]:
+    """
+    Accept either the HTML form names (wage, agree_lc, ...) or the canonical
+    upper-case column names and return the dict main.predict builds.
+    """
+    form = {}
+    for name, col in FORM_FIELDS.items():
+        v = payload.get(col, payload.get(name))
+        form[col] = "" if v is None else str(v).strip()
+    if not form["WAGE_UNIT_OF_PAY"]:
+        form["WAGE_UNIT_OF_PAY"] = "Year"
+    return form
+
+
+def score_frame(forms: pd.DataFrame, explain: bool = True, model: str = "full", monitor: bool = True):
+    """
+    Columnar scoring for a DataFrame of canonical forms (one row each).
+
+    Returns (out, hits, flags, shap_values, columns): `out` holds
+    probability, base_probability, recommendation and the scorecard columns;
+    hits/flags come from rules.apply_rules; columns are the model features.
+    model is "full" or "compact" (see model_utils.predict_proba_batch);
+    monitor=False keeps synthetic what-if rows out of the drift monitor.
+    """
+    forms = forms.reset_index(drop=True)
+    with metrics.stage("dates"):
+        derived = date_features(forms)
+    with metrics.stage("preprocess"):
+        X = prepare_input_frame(forms, derived)
+    probs, shap_values = predict_proba_batch(X, explain=explain, model=model)
+    if monitor:
+        drift.observe(X, probs)
+
+    with metrics.stage("rules"):
+        adjusted, hits, flags = apply_rules(forms, probs, derived["MONTHS"])
+    with metrics.stage("scorecard"):
+        scores = compute_strength_scores(forms, derived["DURATION_DAYS"])
+
+    out = pd.DataFrame({
+        "probability": adjusted,
+        "base_probability": probs,
+        "recommendation": recommendation_labels(adjusted),
+    })
+    out = pd.concat([out, scores.reset_index(drop=True)], axis=1)
+    return out, hits, flags, shap_values, list(X.columns)
+
+
+def score_forms(forms: List[Dict[str, Any]], explain: bool = True) -> List[Dict[str, Any]]:
+    """
+    Full prediction for a batch of canonical forms with a single booster
+    (and SHAP) call: probability, rule adjustments, scorecard, suggestions.
+    """
+    forms = list(forms)
+    if not forms:
+        return []
+
+    frame = pd.DataFrame.from_records(forms)
+    out, hits, flags, shap_values, columns = score_frame(frame, explain=explain)
+    fallback_impact = None
+    history = lookup_many(frame.get("EMPLOYER_NAME", [None] * len(frame)),
+                          frame.get("SOC_CODE", [None] * len(frame)),
+                          frame.get("WORKSITE_STATE", [None] * len(frame)))
+    score_cols = ["wage_score", "wage_note", "compliance_score", "stability_score", "documentation_score", "total_score"]
+
+    results = []
+    for i, rec in enumerate(out.to_dict(orient="records")):
+        if shap_values is not None:
+            feature_impact = impact_from_shap(columns, shap_values[i])
+        elif explain:
+            if fallback_impact is None:
+                fallback_impact = global_importance(columns)
+            feature_impact = fallback_impact
+        else:
+            feature_impact = {}
+
+        notes, rule_suggestions = rule_notes(hits[i])
+        row_flags = {k: bool(v) for k, v in flags.iloc[i].items()}
+        guide_snippets = suggest_from_flags(row_flags)
+        shap_suggestions = generate_recommendations(feature_impact) if explain else []
+
+        results.append({
+            "probability": float(rec["probability"]),
+            "base_probability": float(rec["base_probability"]),
+            "recommendation": rec["recommendation"],
+            "notes": notes,
+            "suggestions": (rule_suggestions or []) + (shap_suggestions or []) + (guide_snippets or []),
+            "flags": row_flags,
+            "scorecard": {k: (rec[k] if k == "wage_note" else float(rec[k])) for k in score_cols},
+            "feature_impact": feature_impact,
+            "history": history[i],
+        })
+    return results
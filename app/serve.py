@@ -0,0 +1,131 @@
+"""
+Preload-then-fork server.
+
+    python -m app.serve --workers 4 [--host 127.0.0.1] [--port 8000]
+
+`uvicorn --workers N` spawns fresh interpreters, so every worker loads its
+own booster, encoders, SHAP explainer and indexes. Here the parent imports
+the app and loads those artifacts once, freezes the GC (so collections do
+not write to the shared objects' headers), binds the socket and forks the
+workers. Workers share the read-only pages copy-on-write and only pay for
+what they allocate per request. Dead workers are replaced; SIGTERM/SIGINT
+stop them all.
+
+Per-process state is not shared between workers. In particular the chat
+session store (app/sessions.py) lives in each worker's memory, so a
+follow-up /chat/message ("explain my result") only finds the context of the
+/predict that set its cookie when both land on the same worker: run chat
+with --workers 1 or behind a load balancer with sticky sessions on the
+visa_sid cookie. Metrics, drift counts and profiles are per worker too.
+"""
+import argparse
+import gc
+import os
+import signal
+import socket
+import time
+
+import uvicorn
+
+WORKERS = int(os.getenv("WEB_CONCURRENCY", 1))
+
+
+def preload():
+    """Import the app and load every lazily cached artifact in this process."""
+    from .main import app
+    from . import model_utils, wage_utils, employer_stats, preprocess, drift
+
+    steps = [
+        ("model", model_utils.load_model),
+        ("predictor", model_utils.get_predictor),
+        ("compact model", lambda: model_utils.get_predictor(model_utils.BULK_MODEL)),
+        ("explainer", model_utils.get_explainer),
+        ("wage benchmarks", wage_utils.benchmarks),
+        ("employer stats", employer_stats.load_tables),
+        ("drift baseline", drift.baseline),
+    ]
+    t0 = time.perf_counter()
+    for name, fn in steps:
+        try:
+            fn()
+        except Exception as e:
+            print(f"⚠️ Preload of {name} failed; workers will load it lazily:", e)
+    print(f"✅ Preloaded artifacts in {time.perf_counter() - t0:.1f}s ({len(preprocess.FEATURE_COLUMNS)} features)")
+    gc.collect()
+    gc.freeze()
+    return app
+
+
+def _bind(host, port):
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def _worker(app, sock, args):
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    config = uvicorn.Config(app, log_level=args.log_level, timeout_keep_alive=args.keep_alive)
+    uvicorn.Server(config).run(sockets=[sock])
+    os._exit(0)
+
+
+def _spawn(app, sock, args):
+    pid = os.fork()
+    if pid == 0:
+        try:
+            _worker(app, sock, args)
+        finally:
+            os._exit(1)
+    return pid
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Preload artifacts once, then fork uvicorn workers.")
+    ap.add_argument("--host", default=os.getenv("HOST", "127.0.0.1"))
+    ap.add_argument("--port", type=int, default=int(os.getenv("PORT", 8000)))
+    ap.add_argument("--workers", type=int, default=WORKERS)
+    ap.add_argument("--log-level", default="warning")
+    ap.add_argument("--keep-alive", type=int, default=5)
+    args = ap.parse_args(argv)
+
+    app = preload()
+    sock = _bind(args.host, args.port)
+    workers = {_spawn(app, sock, args) for _ in range(max(1, args.workers))}
+    print(f"🚀 Serving on {args.host}:{args.port} with {len(workers)} forked workers (parent {os.getpid()})")
+    if len(workers) > 1:
+        print("⚠️ Chat sessions are per worker; route visa_sid sticky or chat follow-ups may lose their context.")
+
+    stopping = False
+
+    def stop(signum, _frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    while workers:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        workers.discard(pid)
+        if not stopping:
+            print(f"⚠️ Worker {pid} exited ({status}); restarting.")
+            workers.add(_spawn(app, sock, args))
+    sock.close()
+
+
+if __name__ == "__main__":
+    main()
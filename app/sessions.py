@@ -0,0 +1,76 @@
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from . import metrics
+
+COOKIE = "visa_sid"
+TTL_S = float(os.getenv("SESSION_TTL_S", 1800))
+MAX_SESSIONS = int(os.getenv("SESSION_MAX", 10000))
+
+# sid -> (last access, context); least recently used first, so expired
+# entries are always at the front. Per process: with app.serve --workers N a
+# session is only found on the worker that created it (see serve.py).
+_store: "OrderedDict[str, tuple]" = OrderedDict()
+_lock = threading.Lock()
+
+
+def new_id() -> str:
+    return secrets.token_urlsafe(18)
+
+
+def _evict(now):
+    while _store:
+        sid, (ts, _) = next(iter(_store.items()))
+        if now - ts <= TTL_S and len(_store) <= MAX_SESSIONS:
+            break
+        _store.popitem(last=False)
+
+
+def get(sid: Optional[str]) -> Optional[Dict[str, Any]]:
+    """Context stored for `sid`, refreshing its TTL, or None."""
+    if not sid:
+        return None
+    now = time.monotonic()
+    with _lock:
+        item = _store.get(sid)
+        if item is None or now - item[0] > TTL_S:
+            _store.pop(sid, None)
+            metrics.cache("session", False)
+            return None
+        _store[sid] = (now, item[1])
+        _store.move_to_end(sid)
+    metrics.cache("session", True)
+    return item[1]
+
+
+def put(sid: str, context: Dict[str, Any]):
+    now = time.monotonic()
+    with _lock:
+        _store[sid] = (now, context)
+        _store.move_to_end(sid)
+        _evict(now)
+
+
+def prediction_context(form: Dict[str, str], scored: Dict[str, Any]) -> Dict[str, Any]:
+    """What the chatbot needs from one /predict result (no model objects)."""
+    return {
+        "form": dict(form),
+        "probability": scored["probability"],
+        "base_probability": scored["base_probability"],
+        "recommendation": scored["recommendation"],
+        "notes": list(scored["notes"]),
+        "suggestions": list(dict.fromkeys(scored["suggestions"])),
+        "flags": dict(scored["flags"]),
+        "scorecard": dict(scored["scorecard"]),
+        "top_drivers": list(scored["feature_impact"].items())[:5],
+        "at": time.time(),
+    }
+
+
+@metrics.register_collector
+def _session_stats():
+    return [("visa_sessions_active", "gauge", {}, len(_store))]
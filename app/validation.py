@@ -0,0 +1,173 @@
+"""
+Online validation of (job title, state) pairs behind a provider interface.
+
+Providers are looked up with a per-call timeout, results are kept in a
+TTL+LRU cache, concurrent lookups of the same key share one in-flight call,
+and fan-out (validate_many) is bounded by a semaphore. VALIDATION_PROVIDER
+selects "offline" (default; no network) or "google".
+"""
+import asyncio
+import os
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from . import metrics
+
+PROVIDER = os.getenv("VALIDATION_PROVIDER", "offline").strip().lower()
+TIMEOUT_S = float(os.getenv("VALIDATION_TIMEOUT_S", 3.0))
+CACHE_TTL_S = float(os.getenv("VALIDATION_CACHE_TTL_S", 24 * 3600))
+CACHE_MAX = int(os.getenv("VALIDATION_CACHE_MAX", 5000))
+CONCURRENCY = int(os.getenv("VALIDATION_CONCURRENCY", 8))
+
+UNAVAILABLE = "Could not verify online."
+
+
+class ValidationError(Exception):
+    """Provider could not answer; the result is not cached."""
+
+
+class OfflineProvider:
+    """Network-free stand-in: answers from the training encoders when they are present."""
+
+    name = "offline"
+
+    def __init__(self, known_titles=None):
+        if known_titles is None:
+            try:
+                from .preprocess import ENCODERS
+                known_titles = ENCODERS.get("JOB_TITLE", {})
+            except Exception:
+                known_titles = {}
+        self.known_titles = known_titles
+
+    async def lookup(self, job_title: str, state: str) -> str:
+        if not self.known_titles:
+            return f"Offline check only: '{job_title}' in {state} was not looked up online."
+        if job_title in self.known_titles:
+            return f"'{job_title}' appears in past LCA filings."
+        return f"'{job_title}' does not appear in past LCA filings; double-check the title."
+
+
+class GoogleProvider:
+    """google_validate.validate_field in a worker thread (it uses blocking requests)."""
+
+    name = "google"
+
+    def __init__(self, timeout: float = TIMEOUT_S):
+        self.timeout = timeout
+
+    async def lookup(self, job_title: str, state: str) -> str:
+        from .google_validate import validate_field
+        text = await asyncio.to_thread(validate_field, job_title, state, self.timeout)
+        if text == UNAVAILABLE:
+            raise ValidationError(text)
+        return text
+
+
+PROVIDERS = {"offline": OfflineProvider, "google": GoogleProvider}
+
+
+class ValidationService:
+
+    def __init__(self, provider, timeout: float = TIMEOUT_S, ttl: float = CACHE_TTL_S,
+                 max_entries: int = CACHE_MAX, concurrency: int = CONCURRENCY):
+        self.provider = provider
+        self.timeout = timeout
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.concurrency = concurrency
+        self._cache: "OrderedDict[Tuple[str, str], Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        # per event loop: in-flight futures and the fan-out semaphore (dropped with the loop)
+        self._inflight: Dict[Tuple[asyncio.AbstractEventLoop, Tuple[str, str]], asyncio.Future] = {}
+        self._semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = weakref.WeakKeyDictionary()
+
+    @staticmethod
+    def key(job_title, state) -> Tuple[str, str]:
+        return " ".join(str(job_title or "").upper().split()), str(state or "").strip().upper()
+
+    def _cached(self, key) -> Optional[str]:
+        now = time.monotonic()
+        with self._lock:
+            item = self._cache.get(key)
+            if item is None:
+                return None
+            if item[0] < now:
+                del self._cache[key]
+                return None
+            self._cache.move_to_end(key)
+            return item[1]
+
+    def _store(self, key, value):
+        with self._lock:
+            self._cache[key] = (time.monotonic() + self.ttl, value)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+
+    def _semaphore(self):
+        loop = asyncio.get_running_loop()
+        sem = self._semaphores.get(loop)
+        if sem is None:
+            # a semaphore that has had waiters holds its loop, so the weak key alone
+            # does not free it; drop closed loops whenever a new one shows up
+            for closed in [lp for lp in self._semaphores if lp.is_closed()]:
+                del self._semaphores[closed]
+            sem = self._semaphores[loop] = asyncio.Semaphore(self.concurrency)
+        return sem
+
+    async def _fetch(self, key):
+        async with self._semaphore():
+            with metrics.stage(f"validate.{self.provider.name}"):
+                value = await asyncio.wait_for(self.provider.lookup(*key), self.timeout)
+        self._store(key, value)
+        return value
+
+    async def validate(self, job_title: str, state: str) -> Dict[str, object]:
+        """{"job_title", "state", "result", "source": cache|provider name|error, "ok"}"""
+        key = self.key(job_title, state)
+        out = {"job_title": key[0], "state": key[1]}
+        if not key[0]:
+            return dict(out, result="Job title is empty.", source="local", ok=False)
+
+        cached = self._cached(key)
+        metrics.cache("validation", cached is not None)
+        if cached is not None:
+            return dict(out, result=cached, source="cache", ok=True)
+
+        slot = (asyncio.get_running_loop(), key)
+        fut = self._inflight.get(slot)
+        leader = fut is None
+        if leader:
+            fut = self._inflight[slot] = asyncio.ensure_future(self._fetch(key))
+            fut.add_done_callback(lambda _: self._inflight.pop(slot, None))
+        else:
+            metrics.inc("visa_validation_coalesced_total")
+        try:
+            value = await asyncio.shield(fut)
+        except Exception as e:  # timeout, ValidationError or a provider bug
+            if leader:
+                metrics.inc("visa_fallback_total", kind="validation_" + type(e).__name__)
+            return dict(out, result=UNAVAILABLE, source="error", ok=False)
+        return dict(out, result=value, source=self.provider.name, ok=True)
+
+    async def validate_many(self, pairs: List[Tuple[str, str]]) -> List[Dict[str, object]]:
+        """Validate every pair; duplicates share a lookup and at most `concurrency` run at once."""
+        return list(await asyncio.gather(*(self.validate(j, s) for j, s in pairs)))
+
+
+_service = None
+
+
+def get_service() -> ValidationService:
+    global _service
+    if _service is None:
+        cls = PROVIDERS.get(PROVIDER)
+        if cls is None:
+            print(f"⚠️ Unknown VALIDATION_PROVIDER '{PROVIDER}', using offline.")
+            cls = OfflineProvider
+        _service = ValidationService(cls())
+    return _service
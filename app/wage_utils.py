@@ -1,7 +1,23 @@
 
-import os, pandas as pd, numpy as np
+import os, re, pandas as pd, numpy as np
+from . import metrics
 
-CACHE = os.path.join(os.path.dirname(__file__), "..", "data", "cache", "wage_index.parquet")
+CACHE = os.getenv("VISA_WAGE_INDEX", os.path.join(os.path.dirname(__file__), "..", "data", "cache", "wage_index.parquet"))
+# read the index through a memory-mapped Arrow IPC copy (<index>.arrow, written
+# next to the parquet on first use) so every worker shares the same pages
+MMAP = os.getenv("WAGE_INDEX_MMAP", "1") == "1"
+# smallest sample a rollup level must have to answer; thinner levels fall through
+MIN_N = int(os.getenv("WAGE_MIN_N", 1))
+
+# build_wage_index.py rollup levels, most specific first
+LEVELS = ("soc_state", "major_state", "soc_national", "major_national")
+LEVEL_LABELS = {
+    "soc_state": "this SOC in this state",
+    "major_state": "the SOC major group in this state",
+    "soc_national": "this SOC nationwide",
+    "major_national": "the SOC major group nationwide",
+}
+QUANTILE_POINTS = np.linspace(0.0, 100.0, 21)
 
 def to_yearly(value, unit):
     try:
@@ -17,37 +33,105 @@ def to_yearly(value, unit):
     if u in ("day","d"):                                    return v*260
     return None
 
+def _read_mapped(path):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    arrow = os.path.splitext(path)[0] + ".arrow"
+    if not os.path.exists(arrow) or os.path.getmtime(arrow) < os.path.getmtime(path):
+        table = pq.read_table(path)
+        tmp = f"{arrow}.{os.getpid()}.tmp"
+        with pa.OSFile(tmp, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+        os.replace(tmp, arrow)
+    # the table's buffers keep the mapping alive; ArrowDtype columns avoid a copy into numpy/object
+    table = pa.ipc.open_file(pa.memory_map(arrow, "r")).read_all()
+    return table.to_pandas(types_mapper=pd.ArrowDtype)
+
 _wage_df = None
 def load_index():
     global _wage_df
+    metrics.cache("wage_index", _wage_df is not None)
     if _wage_df is None:
-        _wage_df = pd.read_parquet(CACHE)
+        if MMAP:
+            try:
+                _wage_df = _read_mapped(CACHE)
+            except OSError as e:
+                print("⚠️ Wage index mmap unavailable, reading parquet:", e)
+        if _wage_df is None:
+            _wage_df = pd.read_parquet(CACHE)
     return _wage_df
 
+def soc_key(soc):
+    """'15-1252' and '15-1252.00' both index as '15-1252.00'."""
+    soc = str(soc or "").strip()
+    return soc + ".00" if re.fullmatch(r"\d{2}-\d{4}", soc) else soc
+
+def major_group(soc):
+    m = re.match(r"^(\d{2})-", str(soc or "").strip())
+    return m.group(1) + "-0000" if m else ""
+
+_benchmarks = None
+def benchmarks():
+    """{(SOC or major group, state or ""): (level, row)} over every rollup level in the index."""
+    global _benchmarks
+    if _benchmarks is None:
+        df = load_index()
+        levels = df["level"].astype(str).tolist() if "level" in df.columns else ["soc_state"] * len(df)
+        cols = ["median_wage", "p25", "p75", "n"] + (["quantiles"] if "quantiles" in df.columns else [])
+        rows = df[cols].to_dict(orient="records")
+        table = {}
+        for level, soc, st, r in zip(levels, df["SOC_CODE"].astype(str), df["WORKSITE_STATE"].astype(str), rows):
+            q = r.get("quantiles")
+            r["quantiles"] = np.asarray(q, dtype=float) if q is not None and len(q) else None
+            table[(soc, st)] = (level, r)
+        _benchmarks = table
+    return _benchmarks
+
+def resolve(soc_code, state):
+    """(level, row) of the most specific rollup with at least MIN_N filings, or (None, None)."""
+    soc, st = soc_key(soc_code), str(state or "").strip().upper()
+    major = major_group(soc)
+    table = benchmarks()
+    for key in ((soc, st), (major, st), (soc, ""), (major, "")):
+        hit = table.get(key)
+        if hit and key[0] and hit[1]["n"] >= MIN_N:
+            return hit
+    return None, None
+
+def percentile_rank(row, yearly):
+    """Percentile (0-100) of `yearly` within the row's stored quantiles; None without them."""
+    q = row.get("quantiles")
+    if q is None or yearly is None:
+        return None
+    return round(float(np.interp(yearly, q, QUANTILE_POINTS)), 1)
+
 def compare_wage(soc_code, state, offered_value, offered_unit):
-    df = load_index()
-    soc = str(soc_code or "").strip()
-    st  = str(state or "").strip()
-    row = df[(df["SOC_CODE"]==soc) & (df["WORKSITE_STATE"]==st)]
-    if row.empty:
-        return {"found": False, "message": "No benchmark found for SOC/state."}
+    with metrics.stage("wage.lookup"):
+        level, r = resolve(soc_code, state)
+    if r is None:
+        metrics.inc("visa_wage_lookup_total", result="miss")
+        return {"found": False, "message": "No benchmark found for this SOC code, its major group, or nationwide."}
+    metrics.inc("visa_wage_lookup_total", result="hit", level=level)
 
     offered_yearly = to_yearly(offered_value, offered_unit)
     if offered_yearly is None:
         return {"found": False, "message": "Invalid offered wage."}
 
-    r = row.iloc[0].to_dict()
     pct = offered_yearly / r["median_wage"] if r["median_wage"] else None
     verdict = ("Below median" if pct and pct < 1.0 else
                "Meets median" if pct and 0.99 <= pct <= 1.05 else
                "Above median")
     return {
         "found": True,
+        "level": level,
+        "level_label": LEVEL_LABELS.get(level, level),
+        "exact": level == "soc_state",
         "offered_yearly": round(offered_yearly,2),
         "median": round(r["median_wage"],2),
         "p25": round(r["p25"],2),
         "p75": round(r["p75"],2),
         "n": int(r["n"]),
         "ratio": round(pct,3) if pct else None,
+        "percentile": percentile_rank(r, offered_yearly),
         "verdict": verdict
     }
@@ -0,0 +1,84 @@
+"""
+Accuracy and throughput of the chatbot intent router.
+
+    python bench/bench_chat.py                # corpus accuracy + messages/s
+    python bench/bench_chat.py --repeat 2000
+
+Accuracy is checked against bench/chat_corpus.jsonl (text, intent, faq
+index); exits 1 on any mismatch. Throughput (best of three replays) is
+reported for route() and for the previous router, with the speedup.
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from app.chatbot import FAQ, route  # noqa: E402
+
+# the router before it was compiled: substring chain, then one re.search per FAQ pattern
+LEGACY_FAQ = [r"\bhello|hi|hey\b", r"\bhow (does|do) (it|this|model) work\b", r"\bwhat (affects|impacts) (approval|result)\b",
+              r"\bprivacy|data (use|usage|policy)\b", r"\bsupported visas?\b|\bonly h-?1b\b", r"\bemail (not|didn'?t) send|mail issue\b"]
+
+
+def legacy_route(user_text):
+    s = user_text.lower().strip()
+    if "wage" in s and ("compare" in s or "median" in s or "prevailing" in s):
+        return "wage_help", None
+    if "bulk" in s or "csv" in s or "upload" in s:
+        return "bulk_help", None
+    if "improve" in s or "increase" in s or "boost" in s or "chance" in s:
+        return "improve", None
+    if "explain" in s or "why" in s and ("low" in s or "result" in s or "score" in s or "prob" in s):
+        return "explain", None
+    if "help" in s or "what can you do" in s:
+        return "capability", None
+    for i, pat in enumerate(LEGACY_FAQ):
+        if re.search(pat, s):
+            for j, p in enumerate(LEGACY_FAQ):
+                if re.search(p, user_text, flags=re.IGNORECASE):
+                    return "faq", j
+    return "fallback", None
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--corpus", default=os.path.join(ROOT, "bench", "chat_corpus.jsonl"))
+    ap.add_argument("--repeat", type=int, default=500, help="times the corpus is replayed for throughput")
+    args = ap.parse_args(argv)
+
+    with open(args.corpus) as f:
+        corpus = [json.loads(line) for line in f if line.strip()]
+    expected = [(c["intent"], c.get("faq")) for c in corpus]
+    texts = [c["text"] for c in corpus]
+
+    got = [route(t) for t in texts]
+    legacy = [legacy_route(t) for t in texts]
+    wrong = [(t, e, g) for t, e, g in zip(texts, expected, got) if e != g]
+    print(f"corpus: {len(corpus)} messages, {len(FAQ)} FAQ entries")
+    print(f"accuracy: router {1 - len(wrong) / len(corpus):.1%}  legacy {sum(e == l for e, l in zip(expected, legacy)) / len(corpus):.1%}")
+    for t, e, g in wrong:
+        print(f"  MISMATCH {t!r}: expected {e}, got {g}")
+
+    stream = texts * args.repeat
+    rates = {}
+    for name, fn in [("legacy", legacy_route), ("route", route)]:
+        best = float("inf")
+        for _ in range(3):
+            t0 = time.perf_counter()
+            for t in stream:
+                fn(t)
+            best = min(best, time.perf_counter() - t0)
+        rates[name] = len(stream) / best
+        print(f"{name:>8}: {rates[name]:,.0f} messages/s")
+    print(f" speedup: {rates['route'] / rates['legacy']:.2f}x over legacy")
+
+    return 1 if wrong else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,87 @@
+"""
+Parity and latency of the inference backends (see app/fast_infer.py).
+
+    python bench/bench_infer.py                          # models/xgb_final.json
+    python bench/bench_infer.py --model /path/xgb_final.json --sizes 1,10,100,1000,10000
+
+Parity is checked on rows drawn from the model's own split thresholds (the
+hardest inputs for a re-implementation); exits 1 if any backend differs from
+Booster.predict by more than --tol.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import xgboost as xgb
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from app.fast_infer import CompiledForest, InplacePredictor, probe_rows  # noqa: E402
+
+
+def _time(fn, min_time=0.3, min_reps=5):
+    fn()
+    reps, samples, t_end = 0, [], time.perf_counter() + min_time
+    while reps < min_reps or time.perf_counter() < t_end:
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+        reps += 1
+    return float(np.median(samples))
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--model", default=os.path.join(ROOT, "models", "xgb_final.json"))
+    ap.add_argument("--sizes", default="1,10,100,1000,10000")
+    ap.add_argument("--tol", type=float, default=1e-5)
+    ap.add_argument("--out", help="write results JSON here")
+    args = ap.parse_args(argv)
+
+    bst = xgb.Booster()
+    bst.load_model(args.model)
+    bst.set_param({"nthread": 1})
+    names = bst.feature_names
+
+    forest = CompiledForest(bst)
+    forest.calibrate(bst, probe_rows(forest, seed=0))
+    inplace = InplacePredictor(bst)
+
+    def reference(X):
+        return bst.predict(xgb.DMatrix(X, feature_names=names))
+
+    backends = {"xgboost": reference, "inplace": inplace.predict, "compiled": forest.predict}
+
+    X = probe_rows(forest, n=20000, seed=1)
+    ref = reference(X)
+    parity = {name: float(np.max(np.abs(fn(X) - ref))) for name, fn in backends.items() if name != "xgboost"}
+    print("parity (max |p - p_ref| over", len(X), "rows):", json.dumps(parity))
+
+    latency = {}
+    for n in [int(s) for s in args.sizes.split(",") if s]:
+        batch = probe_rows(forest, n=n, seed=n)
+        row = {}
+        for name, fn in backends.items():
+            t = _time(lambda: fn(batch))
+            row[name] = {"ms": round(t * 1000, 4), "us_per_row": round(t * 1e6 / n, 3)}
+        latency[n] = row
+        print(f"n={n:>6}  " + "  ".join(f"{k}={v['ms']:.3f}ms" for k, v in row.items()))
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"model": args.model, "trees": len(forest.roots), "depth": forest.depth,
+                       "parity": parity, "latency": latency}, f, indent=2)
+
+    failed = {k: v for k, v in parity.items() if v > args.tol}
+    if failed:
+        print("PARITY FAILURE", failed)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,158 @@
+"""
+Throughput of single-applicant /api/v1/predict under concurrency, with and
+without micro-batching (app/batching.py).
+
+    python bench/load_test.py                                  # 1, 10, 100, 200 clients
+    python bench/load_test.py --clients 100 --duration 10 --modes batched
+    python bench/load_test.py --url http://127.0.0.1:8000      # an already running server
+
+Unless --url is given, one uvicorn worker is started per mode with
+MICROBATCH=0 ("direct") or MICROBATCH=1 ("batched"). Each client keeps one
+keep-alive connection and sends requests back to back.
+"""
+import argparse
+import asyncio
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from urllib.parse import urlsplit
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+APPLICANT = {
+    "job_title": "Software Engineer", "soc_code": "15-1252.00", "employer_name": "ACME CORP",
+    "worksite_state": "CA", "wage_rate_of_pay_from": "120000", "wage_unit_of_pay": "Year",
+    "prevailing_wage": "110000", "full_time_position": "Y",
+    "begin_date": "2025-10-01", "end_date": "2028-09-30",
+}
+
+
+async def _open(host, port):
+    return await asyncio.open_connection(host, port)
+
+
+async def _post(reader, writer, host, path, body):
+    writer.write(f"POST {path} HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n"
+                 f"Content-Length: {len(body)}\r\n\r\n".encode() + body)
+    head = await reader.readuntil(b"\r\n\r\n")
+    status = int(head.split(b" ", 2)[1])
+    length = 0
+    for line in head.split(b"\r\n"):
+        if line.lower().startswith(b"content-length:"):
+            length = int(line.split(b":", 1)[1])
+    await reader.readexactly(length)
+    return status
+
+
+async def _client(host, port, path, body, t_end, latencies, errors):
+    # a bare HTTP/1.1 keep-alive client: an HTTP library costs more CPU than
+    # the server at 100+ clients and would end up measuring itself
+    conn = None
+    while time.perf_counter() < t_end:
+        t0 = time.perf_counter()
+        try:
+            conn = conn or await _open(host, port)
+            ok = await _post(*conn, host, path, body) == 200
+        except (OSError, asyncio.IncompleteReadError, ValueError):
+            conn, ok = None, False
+        if ok:
+            latencies.append(time.perf_counter() - t0)
+        else:
+            errors.append(1)
+    if conn:
+        conn[1].close()
+
+
+async def run_load(base_url, clients, duration, explain):
+    url = urlsplit(base_url)
+    host, port = url.hostname, url.port or 80
+    path = "/api/v1/predict?explain=" + str(explain).lower()
+    body = json.dumps(APPLICANT).encode()
+    latencies, errors = [], []
+    reader, writer = await _open(host, port)
+    await _post(reader, writer, host, path, body)  # warm-up: model, explainer, indexes
+    writer.close()
+    t0 = time.perf_counter()
+    t_end = t0 + duration
+    await asyncio.gather(*(_client(host, port, path, body, t_end, latencies, errors) for _ in range(clients)))
+    elapsed = time.perf_counter() - t0
+    lat = np.array(latencies) * 1000 if latencies else np.zeros(1)
+    return {
+        "clients": clients,
+        "requests": len(latencies),
+        "errors": len(errors),
+        "rps": len(latencies) / elapsed,
+        "p50_ms": float(np.percentile(lat, 50)),
+        "p99_ms": float(np.percentile(lat, 99)),
+    }
+
+
+def _start(mode, port, timeout):
+    env = dict(os.environ, MICROBATCH="1" if mode == "batched" else "0")
+    proc = subprocess.Popen([sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port),
+                             "--log-level", "warning", "--backlog", "4096"],
+                            cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    t_end = time.time() + timeout
+    while time.time() < t_end:
+        if proc.poll() is not None:
+            raise RuntimeError(f"server exited with {proc.returncode}")
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/", timeout=2).close()
+            return proc
+        except urllib.error.HTTPError:
+            return proc
+        except OSError:
+            time.sleep(0.25)
+    proc.kill()
+    raise TimeoutError("server did not come up")
+
+
+def _stop(proc):
+    proc.send_signal(signal.SIGTERM)
+    try:
+        proc.wait(timeout=15)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        proc.wait()
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--clients", default="1,10,100,200")
+    ap.add_argument("--duration", type=float, default=5.0)
+    ap.add_argument("--modes", default="direct,batched")
+    ap.add_argument("--url", default=None, help="benchmark a running server instead of starting one")
+    ap.add_argument("--port", type=int, default=8766)
+    ap.add_argument("--no-explain", action="store_true", help="score without SHAP")
+    ap.add_argument("--json", action="store_true")
+    args = ap.parse_args(argv)
+
+    counts = [int(c) for c in args.clients.split(",")]
+    modes = ["external"] if args.url else [m.strip() for m in args.modes.split(",")]
+    rows = []
+    for mode in modes:
+        proc = None if args.url else _start(mode, args.port, 120)
+        try:
+            base = args.url or f"http://127.0.0.1:{args.port}"
+            for c in counts:
+                r = dict(asyncio.run(run_load(base, c, args.duration, not args.no_explain)), mode=mode)
+                rows.append(r)
+                if not args.json:
+                    print(f"{mode:>8} {c:>4} clients  {r['rps']:8.1f} req/s  p50 {r['p50_ms']:7.1f} ms  "
+                          f"p99 {r['p99_ms']:7.1f} ms  ({r['errors']} errors)", flush=True)
+        finally:
+            if proc is not None:
+                _stop(proc)
+    if args.json:
+        print(json.dumps(rows, indent=2))
+
+
+if __name__ == "__main__":
+    main()
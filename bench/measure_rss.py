@@ -0,0 +1,150 @@
+"""
+Per-worker memory with `uvicorn --workers N` vs the preload-then-fork server
+(app/serve.py).
+
+    python bench/measure_rss.py                      # 1, 4 and 8 workers, both modes
+    python bench/measure_rss.py --workers 1,4 --modes fork --requests 40
+
+Each server is started, warmed with /api/v1/predict calls (so lazily loaded
+artifacts are in every worker), then /proc/<pid>/smaps_rollup is read for
+each worker. USS (private clean + dirty) is what a worker costs on its own;
+PSS splits shared pages between the processes mapping them, so the PSS total
+is the real footprint of the whole server. Linux only.
+"""
+import argparse
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+APPLICANT = {
+    "job_title": "Software Engineer", "soc_code": "15-1252.00", "employer_name": "ACME CORP",
+    "worksite_state": "CA", "wage_rate_of_pay_from": "120000", "wage_unit_of_pay": "Year",
+    "prevailing_wage": "110000", "full_time_position": "Y",
+    "begin_date": "2025-10-01", "end_date": "2028-09-30",
+}
+
+
+def _command(mode, workers, port):
+    if mode == "fork":
+        return [sys.executable, "-m", "app.serve", "--workers", str(workers), "--port", str(port)]
+    return [sys.executable, "-m", "uvicorn", "app.main:app", "--workers", str(workers),
+            "--port", str(port), "--log-level", "warning"]
+
+
+def _children(pid):
+    kids = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                stat = f.read()
+            with open(f"/proc/{entry}/cmdline", "rb") as f:
+                cmd = f.read()
+        except OSError:
+            continue
+        if int(stat.rsplit(")", 1)[1].split()[1]) == pid and b"resource_tracker" not in cmd:
+            kids.append(int(entry))
+    return kids
+
+
+def _smaps(pid):
+    out = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                out[parts[0].rstrip(":")] = int(parts[1]) / 1024
+    return {
+        "rss": out.get("Rss", 0.0),
+        "pss": out.get("Pss", 0.0),
+        "uss": out.get("Private_Clean", 0.0) + out.get("Private_Dirty", 0.0),
+    }
+
+
+def _post(url, body, timeout=30):
+    req = urllib.request.Request(url, data=json.dumps(body).encode(), headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(req, timeout=timeout) as r:
+        return r.status
+
+
+def _wait_ready(port, proc, timeout):
+    t_end = time.time() + timeout
+    while time.time() < t_end:
+        if proc.poll() is not None:
+            raise RuntimeError(f"server exited with {proc.returncode}")
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/", timeout=2):
+                return
+        except urllib.error.HTTPError:
+            return
+        except OSError:
+            time.sleep(0.25)
+    raise TimeoutError("server did not come up")
+
+
+def measure(mode, workers, port, requests, timeout):
+    proc = subprocess.Popen(_command(mode, workers, port), cwd=ROOT, env=dict(os.environ),
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        _wait_ready(port, proc, timeout)
+        url = f"http://127.0.0.1:{port}/api/v1/predict"
+        # one connection per request, many in flight, so every worker gets traffic
+        with ThreadPoolExecutor(max(4, workers * 2)) as pool:
+            codes = list(pool.map(lambda _: _post(url, APPLICANT), range(requests * workers)))
+        time.sleep(0.5)
+        pids = _children(proc.pid) or [proc.pid]
+        stats = [_smaps(p) for p in pids]
+        parent = _smaps(proc.pid) if pids != [proc.pid] else {"pss": 0.0}
+        return {
+            "mode": mode,
+            "workers": len(pids),
+            "ok": sum(c == 200 for c in codes),
+            "uss_mb": sum(s["uss"] for s in stats) / len(stats),
+            "rss_mb": sum(s["rss"] for s in stats) / len(stats),
+            "pss_total_mb": sum(s["pss"] for s in stats) + parent["pss"],
+        }
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        try:
+            proc.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.wait()
+        for p in _children(proc.pid):
+            os.kill(p, signal.SIGKILL)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--workers", default="1,4,8")
+    ap.add_argument("--modes", default="uvicorn,fork")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--requests", type=int, default=25, help="warm-up requests per worker")
+    ap.add_argument("--timeout", type=float, default=120.0)
+    ap.add_argument("--json", action="store_true")
+    args = ap.parse_args(argv)
+
+    rows = []
+    for mode in args.modes.split(","):
+        for n in [int(x) for x in args.workers.split(",")]:
+            rows.append(measure(mode.strip(), n, args.port, args.requests, args.timeout))
+            r = rows[-1]
+            if not args.json:
+                print(f"{r['mode']:>8} x{r['workers']:<2}  uss/worker {r['uss_mb']:7.1f} MB  "
+                      f"rss/worker {r['rss_mb']:7.1f} MB  pss total {r['pss_total_mb']:8.1f} MB  "
+                      f"({r['ok']} ok)", flush=True)
+    if args.json:
+        print(json.dumps(rows, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,320 @@
+"""
+Replay logged or synthetic submissions against /predict, /wage, /bulk and
+/chat and report throughput, latency percentiles and error rates per route.
+
+    python bench/replay.py --inprocess --duration 20
+    python bench/replay.py --serve --qps 50 --concurrency 32 --mix predict=5,api=3,wage=2,chat=2,bulk=0.1
+    python bench/replay.py --url http://127.0.0.1:8000 --log data/new_user_submissions.csv --json
+    python bench/replay.py --inprocess --max-error-rate 0.01 --max-p99-ms 500   # exits 1 on regression
+
+Payloads come from the submission log written by reinforcement.log_submission
+(--log, default data/new_user_submissions.csv when present), else from
+bench/synthetic.make_forms. Targets:
+
+    --inprocess   httpx over the app's ASGI interface, no sockets; the load
+                  generator shares the process (and CPU) with the app
+    --serve       start one uvicorn worker on --port (as bench/load_test.py)
+    --url         an already running server
+
+--qps > 0 is open loop: requests start on a fixed schedule with at most
+--concurrency in flight, and latency is measured from the scheduled start, so
+a stalled server shows up as latency rather than as fewer requests. --qps 0
+is closed loop: --concurrency clients send back to back.
+
+Like real traffic, /predict appends to a submission log and bulk uploads
+write export CSVs to app/static/exports. With --inprocess and --serve the
+log is a throwaway file (--submission-log, default a temp file, passed to the
+app as VISA_SUBMISSION_LOG), so replaying never feeds its own input back into
+the log train/train_incremental.py reads; with --url the server's own log is
+written.
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+import zlib
+
+import httpx
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from app.scoring import FORM_FIELDS  # noqa: E402
+from synthetic import make_forms  # noqa: E402
+
+DEFAULT_LOG = os.path.join(ROOT, "data", "new_user_submissions.csv")
+DEFAULT_MIX = "predict=4,api=4,wage=2,chat=2,bulk=0.05"
+
+CHAT_MESSAGES = [
+    "hi",
+    "How can I improve my chances?",
+    "Compare my wage with the prevailing median",
+    "Why is my result so low?",
+    "Can I upload a CSV for bulk checks?",
+    "What do you do with my data? privacy",
+    "explain my prediction",
+    "what can you do",
+]
+
+
+def load_forms(path, n, seed):
+    """(canonical forms as strings, source label): the submission log when it has rows, else synthetic."""
+    if path and os.path.exists(path):
+        df = pd.read_csv(path, dtype=str, keep_default_na=False)
+        cols = [c for c in FORM_FIELDS.values() if c in df.columns]
+        if cols and len(df):
+            return df[cols].reset_index(drop=True), path
+    return make_forms(n, seed=seed).astype(str), "synthetic"
+
+
+def _predict(form, _args):
+    data = {name: form.get(col, "") for name, col in FORM_FIELDS.items()}
+    return {"method": "POST", "url": "/predict", "data": data}
+
+
+def _api(form, _args):
+    return {"method": "POST", "url": "/api/v1/predict", "json": form}
+
+
+def _wage(form, _args):
+    return {"method": "POST", "url": "/wage", "data": {
+        "soc_code": form.get("SOC_CODE", ""),
+        "worksite_state": form.get("WORKSITE_STATE", ""),
+        "offered_wage": form.get("WAGE_RATE_OF_PAY_FROM", ""),
+        "wage_unit": form.get("WAGE_UNIT_OF_PAY", "") or "Year",
+    }}
+
+
+def _chat(form, args):
+    # crc32, not hash(): str hashes are salted per process and would change the mix between runs
+    msg = CHAT_MESSAGES[zlib.crc32(str(form.get("EMPLOYER_NAME", "")).encode()) % len(CHAT_MESSAGES)]
+    return {"method": "POST", "url": "/chat/message", "json": {"message": msg}}
+
+
+def _bulk(_form, args):
+    return {"method": "POST", "url": "/bulk/stream", "files": {"file": ("replay.csv", args.bulk_csv, "text/csv")}}
+
+
+ROUTES = {"predict": _predict, "api": _api, "wage": _wage, "chat": _chat, "bulk": _bulk}
+
+
+def parse_mix(spec):
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in ROUTES:
+            raise SystemExit(f"Unknown route '{name}' in --mix; expected {', '.join(ROUTES)}.")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def build_schedule(forms, mix, args, size=10_000):
+    """Pre-built request kwargs so the timed loop only sends."""
+    rng = np.random.default_rng(args.seed)
+    names = list(mix)
+    weights = np.array([mix[n] for n in names], dtype=float)
+    routes = rng.choice(len(names), size, p=weights / weights.sum())
+    rows = rng.integers(0, len(forms), size)
+    records = forms.to_dict(orient="records")
+    return [(names[r], ROUTES[names[r]](records[i], args)) for r, i in zip(routes, rows)]
+
+
+class Stats:
+    def __init__(self):
+        self.latencies = {}
+        self.statuses = {}
+
+    def record(self, route, status, latency):
+        self.latencies.setdefault(route, []).append(latency)
+        counts = self.statuses.setdefault(route, {})
+        counts[status] = counts.get(status, 0) + 1
+
+    def report(self, elapsed):
+        rows = []
+        for route in sorted(self.latencies) + ["all"]:
+            if route == "all":
+                lat = np.concatenate([np.array(v) for v in self.latencies.values()]) if self.latencies else np.zeros(0)
+                statuses = {}
+                for counts in self.statuses.values():
+                    for s, c in counts.items():
+                        statuses[s] = statuses.get(s, 0) + c
+            else:
+                lat, statuses = np.array(self.latencies[route]), self.statuses[route]
+            n = len(lat)
+            errors = sum(c for s, c in statuses.items() if not (isinstance(s, int) and 200 <= s < 300))
+            ms = lat * 1000 if n else np.zeros(1)
+            rows.append({
+                "route": route,
+                "requests": n,
+                "rps": n / elapsed if elapsed else 0.0,
+                "error_rate": errors / n if n else 0.0,
+                "p50_ms": float(np.percentile(ms, 50)),
+                "p90_ms": float(np.percentile(ms, 90)),
+                "p99_ms": float(np.percentile(ms, 99)),
+                "max_ms": float(ms.max()),
+                "statuses": {str(s): c for s, c in sorted(statuses.items(), key=lambda kv: str(kv[0]))},
+            })
+        return rows
+
+
+async def _send(client, route, kwargs, started, stats):
+    try:
+        async with client.stream(**kwargs) as resp:
+            async for _ in resp.aiter_raw():
+                pass
+            status = resp.status_code
+    except httpx.HTTPError as e:
+        status = type(e).__name__
+    stats.record(route, status, time.perf_counter() - started)
+
+
+async def _open_loop(client, schedule, qps, concurrency, duration, stats):
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one(route, kwargs, due):
+        async with sem:
+            await _send(client, route, kwargs, due, stats)
+
+    t0 = time.perf_counter()
+    tasks = []
+    i = 0
+    while True:
+        due = t0 + i / qps
+        if due >= t0 + duration:
+            break
+        delay = due - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        route, kwargs = schedule[i % len(schedule)]
+        tasks.append(asyncio.create_task(one(route, kwargs, due)))
+        i += 1
+    await asyncio.gather(*tasks)
+
+
+async def _closed_loop(client, schedule, concurrency, duration, stats):
+    t_end = time.perf_counter() + duration
+
+    async def worker(k):
+        i = k
+        while time.perf_counter() < t_end:
+            route, kwargs = schedule[i % len(schedule)]
+            await _send(client, route, kwargs, time.perf_counter(), stats)
+            i += concurrency
+
+    await asyncio.gather(*(worker(k) for k in range(concurrency)))
+
+
+async def run_replay(client, schedule, args):
+    # warm-up: one request per route loads the model, explainer and indexes
+    warm = Stats()
+    seen = set()
+    for route, kwargs in schedule:
+        if route not in seen:
+            seen.add(route)
+            await _send(client, route, kwargs, time.perf_counter(), warm)
+    stats = Stats()
+    t0 = time.perf_counter()
+    if args.qps > 0:
+        await _open_loop(client, schedule, args.qps, args.concurrency, args.duration, stats)
+    else:
+        await _closed_loop(client, schedule, args.concurrency, args.duration, stats)
+    return stats.report(time.perf_counter() - t0)
+
+
+async def _run(args, schedule, base_url):
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    timeout = httpx.Timeout(args.timeout)
+    if base_url is None:
+        from app.main import app
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://replay", timeout=timeout) as client:
+            return await run_replay(client, schedule, args)
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits) as client:
+        return await run_replay(client, schedule, args)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    target = ap.add_mutually_exclusive_group()
+    target.add_argument("--inprocess", action="store_true", help="drive the ASGI app in this process (default)")
+    target.add_argument("--serve", action="store_true", help="start a local uvicorn worker")
+    target.add_argument("--url", default=None, help="replay against a running server")
+    ap.add_argument("--port", type=int, default=8767)
+    ap.add_argument("--log", default=DEFAULT_LOG, help="submission log CSV to replay")
+    ap.add_argument("--submission-log", default=None,
+                    help="where the app logs replayed /predict calls (--inprocess/--serve; default a temp file)")
+    ap.add_argument("--synthetic", type=int, default=5000, help="synthetic forms when there is no log")
+    ap.add_argument("--mix", default=DEFAULT_MIX, help="route weights: predict, api, wage, chat, bulk")
+    ap.add_argument("--qps", type=float, default=0.0, help="open-loop request rate; 0 = closed loop")
+    ap.add_argument("--concurrency", type=int, default=16)
+    ap.add_argument("--duration", type=float, default=10.0)
+    ap.add_argument("--bulk-rows", type=int, default=500, help="rows per bulk upload")
+    ap.add_argument("--timeout", type=float, default=120.0)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--json", action="store_true")
+    ap.add_argument("--max-error-rate", type=float, default=None, help="exit 1 when exceeded (all routes)")
+    ap.add_argument("--max-p99-ms", type=float, default=None, help="exit 1 when exceeded (all routes)")
+    args = ap.parse_args(argv)
+
+    forms, source = load_forms(args.log, args.synthetic, args.seed)
+    mix = parse_mix(args.mix)
+    buf = io.StringIO()
+    forms.sample(args.bulk_rows, replace=len(forms) < args.bulk_rows, random_state=args.seed).to_csv(buf, index=False)
+    args.bulk_csv = buf.getvalue().encode()
+    schedule = build_schedule(forms, mix, args)
+
+    if args.url:
+        print("⚠️ Replaying against --url: /predict appends to that server's submission log.")
+    else:
+        # set before the app is imported or the server started, both read it at import
+        os.environ["VISA_SUBMISSION_LOG"] = args.submission_log or os.path.join(
+            tempfile.mkdtemp(prefix="visa-replay-"), "new_user_submissions.csv")
+
+    proc = None
+    if args.serve:
+        from load_test import _start
+        proc = _start("batched", args.port, 120)
+        base_url = f"http://127.0.0.1:{args.port}"
+    else:
+        base_url = args.url
+    try:
+        rows = asyncio.run(_run(args, schedule, base_url))
+    finally:
+        if proc is not None:
+            from load_test import _stop
+            _stop(proc)
+
+    if args.json:
+        print(json.dumps({"source": source, "forms": len(forms), "mix": mix, "qps": args.qps,
+                          "concurrency": args.concurrency, "duration": args.duration, "routes": rows}, indent=2))
+    else:
+        mode = f"open loop {args.qps:g} qps" if args.qps > 0 else "closed loop"
+        print(f"{len(forms)} forms from {source}; {mode}, concurrency {args.concurrency}, {args.duration:g}s")
+        print(f"{'route':<8} {'requests':>9} {'req/s':>8} {'errors':>7} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+        for r in rows:
+            print(f"{r['route']:<8} {r['requests']:>9} {r['rps']:>8.1f} {r['error_rate']:>6.1%} "
+                  f"{r['p50_ms']:>8.1f} {r['p90_ms']:>8.1f} {r['p99_ms']:>8.1f} {r['max_ms']:>8.1f}")
+            bad = {s: c for s, c in r["statuses"].items() if not s.startswith("2")}
+            if bad:
+                print(f"{'':<8} non-2xx: {bad}")
+
+    total = rows[-1]
+    failed = []
+    if args.max_error_rate is not None and total["error_rate"] > args.max_error_rate:
+        failed.append(f"error rate {total['error_rate']:.2%} > {args.max_error_rate:.2%}")
+    if args.max_p99_ms is not None and total["p99_ms"] > args.max_p99_ms:
+        failed.append(f"p99 {total['p99_ms']:.1f} ms > {args.max_p99_ms:g} ms")
+    if failed:
+        print("⚠️ Regression: " + "; ".join(failed))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+"""
+Reproducible performance benchmarks for the prediction, bulk (scoring and
+upload ingest per format) and wage paths.
+
+    python bench/run_bench.py                      # full run -> bench_results.json
+    python bench/run_bench.py --quick              # small sizes, for a quick check
+    python bench/run_bench.py --baseline bench/baseline.json   # compare, exit 1 on regression
+    python bench/run_bench.py --save-baseline bench/baseline.json
+
+Every case runs in its own subprocess against a tiny synthetic model (see
+synthetic.py), so cold start and peak RSS are measured in isolation and the
+real models/ directory is never needed.
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "bench"))
+
+# metric -> True when higher is better
+DIRECTION = {
+    "p50_ms": False, "p99_ms": False, "mean_ms": False,
+    "rows_per_s": True, "qps": True,
+    "import_s": False, "first_predict_s": False,
+    "peak_rss_mb": False,
+}
+
+
+def _peak_rss_mb():
+    kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return kb / 1024.0 if sys.platform != "darwin" else kb / (1024.0 * 1024.0)
+
+
+def _latency_stats(samples):
+    a = np.asarray(samples) * 1000.0
+    return {"p50_ms": float(np.percentile(a, 50)), "p99_ms": float(np.percentile(a, 99)), "mean_ms": float(a.mean()), "n": len(a)}
+
+
+# ---------------------------------------------------------------- cases
+# Each case runs inside a child process with VISA_MODELS_DIR/VISA_WAGE_INDEX set.
+
+def case_cold_start(args):
+    t0 = time.perf_counter()
+    from app import main  # noqa: F401  (loads encoders, templates, routes)
+    from app.scoring import score_forms, normalize_form
+    from synthetic import make_forms
+    t1 = time.perf_counter()
+    form = make_forms(1, seed=1).iloc[0].astype(str).to_dict()
+    score_forms([normalize_form(form)])
+    t2 = time.perf_counter()
+    return {"import_s": t1 - t0, "first_predict_s": t2 - t1}
+
+
+def case_single(args):
+    from app.scoring import score_forms, normalize_form
+    from synthetic import make_forms
+    forms = [normalize_form(f) for f in make_forms(args.iterations, seed=2).astype(str).to_dict(orient="records")]
+    for f in forms[:10]:
+        score_forms([f])
+    samples = []
+    for f in forms:
+        t0 = time.perf_counter()
+        score_forms([f])
+        samples.append(time.perf_counter() - t0)
+    return _latency_stats(samples)
+
+
+def case_bulk(args):
+    from app.bulk_utils import process_bulk_csv
+    from synthetic import make_forms
+    df = make_forms(args.rows, seed=3)
+    with tempfile.TemporaryDirectory() as export_dir:
+        t0 = time.perf_counter()
+        results_df, _ = process_bulk_csv(df, export_dir)
+        dt = time.perf_counter() - t0
+    return {"rows": len(results_df), "seconds": dt, "rows_per_s": len(results_df) / dt}
+
+
+def case_wage(args):
+    from app.wage_utils import compare_wage, load_index
+    idx = load_index()
+    rng = np.random.default_rng(4)
+    picks = rng.integers(0, len(idx), 1000)
+    queries = [(idx["SOC_CODE"].iat[i], idx["WORKSITE_STATE"].iat[i], str(rng.integers(60_000, 200_000))) for i in picks]
+    queries += [("00-0000.00", "ZZ", "100000")] * 50  # misses
+    compare_wage(*queries[0], "Year")
+    n, t0 = 0, time.perf_counter()
+    deadline = t0 + args.duration
+    while time.perf_counter() < deadline:
+        soc, st, w = queries[n % len(queries)]
+        compare_wage(soc, st, w, "Year")
+        n += 1
+    dt = time.perf_counter() - t0
+    return {"queries": n, "qps": n / dt}
+
+
+def _upload_bytes(df, fmt):
+    import gzip
+    import io
+    import pyarrow as pa
+    import pyarrow.feather as feather
+    import pyarrow.parquet as pq
+    if fmt in ("csv", "csv.gz", "csv.zst"):
+        raw = df.to_csv(index=False).encode()
+        return {"csv": raw, "csv.gz": gzip.compress(raw, 6), "csv.zst": pa.compress(raw, "zstd", asbytes=True)}[fmt]
+    buf = io.BytesIO()
+    if fmt == "parquet":
+        pq.write_table(pa.Table.from_pandas(df, preserve_index=False), buf, row_group_size=50_000)
+    else:
+        feather.write_feather(df, buf)
+    return buf.getvalue()
+
+
+def case_ingest(args):
+    """Upload bytes -> canonical forms (no scoring), with 40 columns the bulk path never reads."""
+    from app.bulk_utils import iter_upload, canonical_forms, _norm_cols
+    from synthetic import make_forms
+    df = make_forms(args.rows, seed=5)
+    for i in range(40):
+        df[f"UNUSED_{i}"] = np.arange(len(df)) * i if i % 2 else "lorem ipsum dolor"
+    content = _upload_bytes(df, args.format)
+    t0 = time.perf_counter()
+    rows = sum(len(canonical_forms(_norm_cols(c))) for c in iter_upload(content))
+    dt = time.perf_counter() - t0
+    return {"rows": rows, "mb": len(content) / 1e6, "seconds": dt, "rows_per_s": rows / dt}
+
+
+CASES = {"cold_start": case_cold_start, "single": case_single, "bulk": case_bulk, "wage": case_wage,
+         "ingest": case_ingest}
+INGEST_FORMATS = ["csv", "csv.gz", "csv.zst", "parquet", "arrow"]
+
+
+def _child(args):
+    result = CASES[args.child](args)
+    result["peak_rss_mb"] = _peak_rss_mb()
+    print(json.dumps(result))
+
+
+# ---------------------------------------------------------------- driver
+
+def _run_case(env, case, **kw):
+    cmd = [sys.executable, os.path.abspath(__file__), "--child", case]
+    for k, v in kw.items():
+        cmd += [f"--{k.replace('_', '-')}", str(v)]
+    out = subprocess.run(cmd, env=env, cwd=ROOT, capture_output=True, text=True)
+    if out.returncode != 0:
+        raise RuntimeError(f"{case} failed:\n{out.stderr[-2000:]}")
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def compare(results, baseline, tolerance):
+    """Relative change per metric vs baseline; a regression is a move in the bad direction beyond tolerance."""
+    report, regressions = {}, []
+    for name, metrics in results["cases"].items():
+        base = baseline.get("cases", {}).get(name)
+        if not base:
+            continue
+        for metric, higher_better in DIRECTION.items():
+            if metric not in metrics or metric not in base or not base[metric]:
+                continue
+            change = (metrics[metric] - base[metric]) / base[metric]
+            worse = -change if higher_better else change
+            report[f"{name}.{metric}"] = round(change, 4)
+            if worse > tolerance:
+                regressions.append(f"{name}.{metric}: {base[metric]:.4g} -> {metrics[metric]:.4g} ({change:+.1%})")
+    return report, regressions
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--child", choices=sorted(CASES), help=argparse.SUPPRESS)
+    ap.add_argument("--rows", type=int, default=1000, help=argparse.SUPPRESS)
+    ap.add_argument("--format", default="csv", help=argparse.SUPPRESS)
+    ap.add_argument("--iterations", type=int, default=300, help="single-request samples")
+    ap.add_argument("--duration", type=float, default=3.0, help="seconds per QPS measurement")
+    ap.add_argument("--bulk-sizes", default="1000,100000,1000000")
+    ap.add_argument("--quick", action="store_true", help="bulk sizes 1k/10k, fewer samples")
+    ap.add_argument("--artifacts", help="reuse a synthetic artifact dir instead of training a fresh one")
+    ap.add_argument("--out", default=os.path.join(ROOT, "bench_results.json"))
+    ap.add_argument("--baseline", help="baseline JSON to compare against")
+    ap.add_argument("--tolerance", type=float, default=0.10, help="allowed relative regression")
+    ap.add_argument("--save-baseline", help="also write the results here")
+    args = ap.parse_args(argv)
+
+    if args.child:
+        return _child(args)
+
+    sizes = [1000, 10000] if args.quick else [int(s) for s in args.bulk_sizes.split(",") if s]
+    if args.quick:
+        args.iterations, args.duration = min(args.iterations, 100), min(args.duration, 1.0)
+
+    from synthetic import build_artifacts
+    art_dir = args.artifacts or tempfile.mkdtemp(prefix="visa_bench_")
+    if not os.path.exists(os.path.join(art_dir, "xgb_final.json")):
+        build_artifacts(art_dir)
+    env = dict(os.environ, VISA_MODELS_DIR=art_dir, VISA_WAGE_INDEX=os.path.join(art_dir, "wage_index.parquet"),
+               PYTHONPATH=ROOT, METRICS_ENABLED="0")
+
+    cases = {}
+    print("cold start…", flush=True)
+    cases["cold_start"] = _run_case(env, "cold_start")
+    print("single request latency…", flush=True)
+    cases["single"] = _run_case(env, "single", iterations=args.iterations)
+    for n in sizes:
+        print(f"bulk {n:,} rows…", flush=True)
+        cases[f"bulk_{n}"] = _run_case(env, "bulk", rows=n)
+    for fmt in INGEST_FORMATS:
+        print(f"ingest {fmt} {sizes[-1]:,} rows…", flush=True)
+        cases[f"ingest_{fmt}"] = _run_case(env, "ingest", rows=sizes[-1], format=fmt)
+    print("wage lookup QPS…", flush=True)
+    cases["wage"] = _run_case(env, "wage", duration=args.duration)
+
+    results = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "cases": cases,
+    }
+
+    exit_code = 0
+    if args.baseline and os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            report, regressions = compare(results, json.load(f), args.tolerance)
+        results["vs_baseline"] = report
+        results["regressions"] = regressions
+        for r in regressions:
+            print("REGRESSION", r)
+        exit_code = 1 if regressions else 0
+
+    for path in filter(None, [args.out, args.save_baseline]):
+        with open(path, "w") as f:
+            json.dump(results, f, indent=2)
+        print("wrote", path)
+
+    print(json.dumps(cases, indent=2))
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main() or 0)
@@ -0,0 +1,147 @@
+"""
+Synthetic LCA-shaped data and a tiny locally trained model, so benchmarks
+(and anything else that needs artifacts) run without the disclosure CSV or
+the production xgb_final.json.
+"""
+import os
+import sys
+import json
+import joblib
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "train"))
+sys.path.insert(0, ROOT)
+
+SOCS = [
+    ("15-1252.00", "Software Developers"), ("15-1211.00", "Computer Systems Analysts"),
+    ("15-1299.08", "Computer Systems Engineers/Architects"), ("15-2051.00", "Data Scientists"),
+    ("15-1253.00", "Software Quality Assurance Analysts and Testers"), ("15-1244.00", "Network and Computer Systems Administrators"),
+    ("17-2141.00", "Mechanical Engineers"), ("17-2071.00", "Electrical Engineers"),
+    ("13-2011.00", "Accountants and Auditors"), ("13-1111.00", "Management Analysts"),
+    ("11-3021.00", "Computer and Information Systems Managers"), ("29-1141.00", "Registered Nurses"),
+    ("25-1071.00", "Health Specialties Teachers, Postsecondary"), ("19-1042.00", "Medical Scientists"),
+]
+JOB_TITLES = [
+    "SOFTWARE ENGINEER", "SENIOR SOFTWARE ENGINEER", "DATA SCIENTIST", "SYSTEMS ANALYST",
+    "QA ANALYST", "PROGRAMMER ANALYST", "MECHANICAL ENGINEER", "ACCOUNTANT", "BUSINESS ANALYST",
+    "ASSISTANT PROFESSOR", "RESEARCH SCIENTIST", "REGISTERED NURSE", "IT MANAGER", "DEVOPS ENGINEER",
+]
+STATES = ["CA", "TX", "NY", "NJ", "WA", "IL", "MA", "GA", "PA", "NC", "FL", "VA", "MI", "OH", "AZ", "CO", "MN", "MD"]
+STATE_P = np.array([22, 13, 10, 8, 8, 6, 5, 4, 4, 3, 3, 3, 3, 2, 2, 2, 1, 1], dtype=float)
+CITIES = {
+    "CA": ["SAN JOSE", "SAN FRANCISCO", "SUNNYVALE", "LOS ANGELES"], "TX": ["AUSTIN", "DALLAS", "HOUSTON", "IRVING"],
+    "NY": ["NEW YORK", "BROOKLYN"], "NJ": ["JERSEY CITY", "PRINCETON"], "WA": ["SEATTLE", "REDMOND", "BELLEVUE"],
+    "IL": ["CHICAGO"], "MA": ["BOSTON", "CAMBRIDGE"], "GA": ["ATLANTA"], "PA": ["PHILADELPHIA", "PITTSBURGH"],
+    "NC": ["CHARLOTTE", "RALEIGH"], "FL": ["MIAMI", "TAMPA"], "VA": ["HERNDON", "RESTON"], "MI": ["DETROIT"],
+    "OH": ["COLUMBUS"], "AZ": ["PHOENIX"], "CO": ["DENVER"], "MN": ["MINNEAPOLIS"], "MD": ["BALTIMORE"],
+}
+VISAS = ["H-1B", "E-3 Australian", "H-1B1 Singapore", "H-1B1 Chile"]
+VISA_P = np.array([0.93, 0.04, 0.02, 0.01])
+
+
+def _yn(rng, n, p_yes):
+    return np.where(rng.random(n) < p_yes, "Y", "N")
+
+
+def make_forms(n: int, seed: int = 0, n_employers: int = 2000, with_status: bool = False) -> pd.DataFrame:
+    """`n` canonical forms with LCA-like marginals (Zipf employers, skewed states, log-normal wages)."""
+    rng = np.random.default_rng(seed)
+    soc_idx = rng.integers(0, len(SOCS), n)
+    states = np.array(STATES)[rng.choice(len(STATES), n, p=STATE_P / STATE_P.sum())]
+    emp_rank = np.minimum(rng.zipf(1.3, n), n_employers) - 1
+    emp_state = np.array(STATES)[(emp_rank * 7) % len(STATES)]
+    emp_state = np.where(rng.random(n) < 0.6, states, emp_state)
+    cities = np.array([CITIES[s][i % len(CITIES[s])] for s, i in zip(states, rng.integers(0, 4, n))])
+
+    yearly = np.round(np.exp(rng.normal(np.log(110_000), 0.3, n)), -2)
+    hourly = rng.random(n) < 0.08
+    unit = np.where(hourly, "Hour", "Year")
+    wage = np.where(hourly, np.round(yearly / 2080, 2), yearly)
+    prevailing = np.round(wage * rng.uniform(0.75, 1.05, n), 2)
+
+    begin = pd.Timestamp("2023-01-01") + pd.to_timedelta(rng.integers(0, 3 * 365, n), unit="D")
+    end = begin + pd.to_timedelta(rng.choice([180, 365, 730, 1095], n, p=[0.05, 0.15, 0.3, 0.5]), unit="D")
+    us_fmt = rng.random(n) < 0.1
+    begin_s = np.where(us_fmt, begin.strftime("%m/%d/%Y"), begin.strftime("%Y-%m-%d"))
+    end_s = np.where(us_fmt, end.strftime("%m/%d/%Y"), end.strftime("%Y-%m-%d"))
+
+    df = pd.DataFrame({
+        "VISA_CLASS": np.array(VISAS)[rng.choice(len(VISAS), n, p=VISA_P)],
+        "JOB_TITLE": np.array(JOB_TITLES)[(soc_idx + rng.integers(0, 3, n)) % len(JOB_TITLES)],
+        "SOC_CODE": np.array([s[0] for s in SOCS])[soc_idx],
+        "SOC_TITLE": np.array([s[1] for s in SOCS])[soc_idx],
+        "EMPLOYER_NAME": np.char.add("EMPLOYER ", emp_rank.astype(str)),
+        "EMPLOYER_STATE": emp_state,
+        "WORKSITE_STATE": states,
+        "WORKSITE_CITY": cities,
+        "FULL_TIME_POSITION": _yn(rng, n, 0.95),
+        "TOTAL_WORKER_POSITIONS": rng.choice([1, 1, 1, 1, 2, 5], n),
+        "WAGE_RATE_OF_PAY_FROM": wage,
+        "WAGE_UNIT_OF_PAY": unit,
+        "PREVAILING_WAGE": prevailing,
+        "NEW_EMPLOYMENT": _yn(rng, n, 0.4),
+        "CONTINUED_EMPLOYMENT": _yn(rng, n, 0.4),
+        "CHANGE_EMPLOYER": _yn(rng, n, 0.2),
+        "H_1B_DEPENDENT": _yn(rng, n, 0.15),
+        "WILLFUL_VIOLATOR": _yn(rng, n, 0.01),
+        "AGREE_TO_LC_STATEMENT": _yn(rng, n, 0.98),
+        "BEGIN_DATE": begin_s,
+        "END_DATE": end_s,
+    })
+    if with_status:
+        logit = (
+            3.0
+            + 2.0 * (wage >= prevailing)
+            - 1.5 * (df["FULL_TIME_POSITION"] == "N")
+            - 2.5 * (df["WILLFUL_VIOLATOR"] == "Y")
+            - 3.0 * (df["AGREE_TO_LC_STATEMENT"] == "N")
+            - 0.02 * np.sqrt(emp_rank)
+        )
+        certified = rng.random(n) < 1.0 / (1.0 + np.exp(-logit.to_numpy(dtype=float)))
+        df["CASE_STATUS"] = np.where(certified, "Certified", "Denied")
+    return df
+
+
+def make_wage_index(forms: pd.DataFrame) -> pd.DataFrame:
+    """Same shape as build_wage_index.py output (rollup cube of yearly wage)."""
+    from app.build_wage_index import build_rollups
+    mult = forms["WAGE_UNIT_OF_PAY"].map({"Year": 1, "Hour": 2080}).fillna(1)
+    df = forms.assign(WAGE_YR=pd.to_numeric(forms["WAGE_RATE_OF_PAY_FROM"]) * mult)
+    return build_rollups(df)
+
+
+def build_artifacts(out_dir: str, n_train: int = 20_000, n_trees: int = 40, max_depth: int = 6, seed: int = 0) -> dict:
+    """
+    Train a small booster with the real training pipeline's preprocessing and
+    write xgb_final.json, encoders, scaler, metadata, drift baseline and a wage index to
+    `out_dir`. Point VISA_MODELS_DIR / VISA_WAGE_INDEX at it before importing app.
+    """
+    from train_xgb_full import preprocess, encode_and_scale, drift_baseline, TARGET_COL
+
+    os.makedirs(out_dir, exist_ok=True)
+    raw = make_forms(n_train, seed=seed, with_status=True)
+    df = preprocess(raw)
+    X, enc, scaler = encode_and_scale(df)
+    y = df[TARGET_COL].astype(int)
+
+    params = {"objective": "binary:logistic", "max_depth": max_depth, "eta": 0.1, "eval_metric": "auc", "nthread": 1}
+    bst = xgb.train(params, xgb.DMatrix(X, label=y, feature_names=list(X.columns)), num_boost_round=n_trees)
+
+    bst.save_model(os.path.join(out_dir, "xgb_final.json"))
+    joblib.dump(enc, os.path.join(out_dir, "feature_encoder.joblib"))
+    joblib.dump(scaler, os.path.join(out_dir, "feature_scaler.joblib"))
+    with open(os.path.join(out_dir, "metadata.json"), "w") as f:
+        json.dump({"features": list(X.columns)}, f, indent=2)
+    drift_baseline(X, bst.predict(xgb.DMatrix(X, feature_names=list(X.columns))), os.path.join(out_dir, "drift_baseline.json"))
+
+    wage_path = os.path.join(out_dir, "wage_index.parquet")
+    make_wage_index(raw).to_parquet(wage_path, index=False)
+    return {"models_dir": out_dir, "wage_index": wage_path}
+
+
+if __name__ == "__main__":
+    out = sys.argv[1] if len(sys.argv) > 1 else os.path.join(ROOT, "bench", ".artifacts")
+    print(build_artifacts(out))
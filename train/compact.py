@@ -0,0 +1,136 @@
+"""
+Compact variant of the production booster, for latency-sensitive paths (bulk).
+
+Candidates built from the trained full model:
+  trimmed    the full model cut at its best validation iteration
+  distilled  a shallow booster trained on the full model's probabilities
+             (soft labels), with early stopping
+
+Trimming, distillation and selection only look at a validation split carved
+out of the training rows: the smallest candidate (fewest tree nodes) whose
+validation AUC is within MAX_AUC_DROP of the full model's is saved as
+xgb_compact.json. Every model's AUC and expected calibration error on the
+untouched test split, its validation AUC, and p50/p99 single-row latency and
+bulk rows/s go to compact_report.json.
+"""
+import json
+import os
+import time
+
+import numpy as np
+import xgboost as xgb
+from sklearn.metrics import roc_auc_score
+
+MAX_AUC_DROP = float(os.getenv("COMPACT_MAX_AUC_DROP", 0.005))
+DISTILL_PARAMS = {
+    "objective": "binary:logistic",
+    "max_depth": 4,
+    "eta": 0.1,
+    "subsample": 0.9,
+    "colsample_bytree": 0.8,
+    "tree_method": "hist",
+    "eval_metric": "logloss",
+}
+DISTILL_ROUNDS = 400
+
+
+def expected_calibration_error(y, p, bins=10):
+    y, p = np.asarray(y, dtype=float), np.asarray(p, dtype=float)
+    idx = np.minimum((p * bins).astype(int), bins - 1)
+    ece = 0.0
+    for b in range(bins):
+        m = idx == b
+        if m.any():
+            ece += m.mean() * abs(p[m].mean() - y[m].mean())
+    return float(ece)
+
+
+def _nodes(bst):
+    return int(sum(len(t["split_indices"]) for t in json.loads(bst.save_raw("json"))["learner"]["gradient_booster"]["model"]["trees"]))
+
+
+def _latency(bst, X, single=300, bulk_rows=10_000):
+    X = np.ascontiguousarray(X, dtype=np.float32)
+    rows = X[np.arange(single) % len(X)]
+    samples = []
+    for i in range(single):
+        t0 = time.perf_counter()
+        bst.inplace_predict(rows[i:i + 1])
+        samples.append(time.perf_counter() - t0)
+    big = X[np.arange(bulk_rows) % len(X)]
+    t0 = time.perf_counter()
+    bst.inplace_predict(big)
+    bulk_s = time.perf_counter() - t0
+    return {
+        "p50_ms": round(float(np.percentile(samples, 50)) * 1000, 3),
+        "p99_ms": round(float(np.percentile(samples, 99)) * 1000, 3),
+        "bulk_rows_per_s": round(bulk_rows / bulk_s, 1),
+    }
+
+
+def evaluate(bst, X, y):
+    p = bst.inplace_predict(np.ascontiguousarray(X, dtype=np.float32))
+    return {
+        "trees": bst.num_boosted_rounds(),
+        "nodes": _nodes(bst),
+        "auc": round(float(roc_auc_score(y, p)), 5),
+        "ece": round(expected_calibration_error(y, p), 5),
+        **_latency(bst, X),
+    }
+
+
+def trimmed(full, best_iteration):
+    return full[: best_iteration + 1] if best_iteration + 1 < full.num_boosted_rounds() else None
+
+
+def distilled(full, X_train, X_valid):
+    """Shallow booster fit to the full model's probabilities; stops when validation logloss stalls."""
+    names = full.feature_names
+    soft_train = full.inplace_predict(np.ascontiguousarray(X_train, dtype=np.float32))
+    soft_valid = full.inplace_predict(np.ascontiguousarray(X_valid, dtype=np.float32))
+    dtrain = xgb.DMatrix(X_train, label=soft_train, feature_names=names)
+    dvalid = xgb.DMatrix(X_valid, label=soft_valid, feature_names=names)
+    student = xgb.train(DISTILL_PARAMS, dtrain, DISTILL_ROUNDS, evals=[(dvalid, "valid")],
+                        early_stopping_rounds=20, verbose_eval=False)
+    return student[: student.best_iteration + 1]
+
+
+def _valid_auc(bst, X, y):
+    return round(float(roc_auc_score(y, bst.inplace_predict(X))), 5)
+
+
+def build_compact(full, X_train, X_valid, y_valid, X_test, y_test, best_iteration, out_dir):
+    """
+    Build the candidates, write xgb_compact.json and compact_report.json; returns the report.
+    best_iteration must come from X_valid, which is disjoint from both X_train and X_test.
+    """
+    X_train, X_valid, X_test = (np.asarray(X, dtype=np.float32) for X in (X_train, X_valid, X_test))
+    candidates = {"trimmed": trimmed(full, best_iteration), "distilled": distilled(full, X_train, X_valid)}
+    report = {"full": dict(evaluate(full, X_test, y_test), valid_auc=_valid_auc(full, X_valid, y_valid))}
+    for name, bst in candidates.items():
+        if bst is not None:
+            report[name] = dict(evaluate(bst, X_test, y_test), valid_auc=_valid_auc(bst, X_valid, y_valid))
+
+    ok = [n for n in candidates
+          if n in report and report["full"]["valid_auc"] - report[n]["valid_auc"] <= MAX_AUC_DROP]
+    selected = min(ok, key=lambda n: report[n]["nodes"]) if ok else None
+    report["selected"] = selected
+    report["max_auc_drop"] = MAX_AUC_DROP
+
+    if selected:
+        candidates[selected].save_model(os.path.join(out_dir, "xgb_compact.json"))
+    with open(os.path.join(out_dir, "compact_report.json"), "w") as f:
+        json.dump(report, f, indent=2)
+
+    print(f"{'model':<10} {'trees':>6} {'nodes':>8} {'val auc':>8} {'test auc':>8} {'ece':>7} "
+          f"{'p50 ms':>8} {'p99 ms':>8} {'bulk rows/s':>12}")
+    for name in ("full", "trimmed", "distilled"):
+        if name in report:
+            r = report[name]
+            print(f"{name:<10} {r['trees']:>6} {r['nodes']:>8} {r['valid_auc']:>8.4f} {r['auc']:>8.4f} {r['ece']:>7.4f} "
+                  f"{r['p50_ms']:>8.3f} {r['p99_ms']:>8.3f} {r['bulk_rows_per_s']:>12,.0f}")
+    if selected:
+        print(f"✅ Compact model: {selected}")
+    else:
+        print(f"⚠️ No candidate within {MAX_AUC_DROP} validation AUC of the full model; xgb_compact.json not written.")
+    return report
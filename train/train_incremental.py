@@ -0,0 +1,232 @@
+"""
+Warm-start retraining: append boosting rounds to the current model on new
+labelled rows instead of retraining on the full CSV.
+
+    python train/train_incremental.py [new_rows.csv] [--rounds 50] [--extend-categories] [--reference old_sample.csv]
+
+Input is any CSV with the training columns and CASE_STATUS, by default the
+submission log written by app/reinforcement.py (data/new_user_submissions.csv)
+once outcomes have been filled in; rows without an outcome are skipped.
+
+Rows are encoded with the saved encoders and scaler. Unseen categories go to
+MISSING like the app does, or with --extend-categories get new ids appended
+after the existing ones (encoder_version in metadata.json goes up). A
+stratified holdout of the new rows (plus --reference, a labelled sample of the
+original data, to catch forgetting) scores the current and the updated model;
+the update is rejected when holdout AUC drops by more than --max-auc-drop.
+Early stopping uses a separate split of the remaining rows (--early-stop).
+HIST_* rates come from data/cache/employer_stats.parquet, as in the app.
+
+On acceptance the previous xgb_final.json, feature_encoder.joblib,
+metadata.json and xgb_compact.json are moved to models/versions/<version>/
+and the run is summarised in models/incremental_report.json.
+The compact model is not carried over (bulk falls back to the full model until
+train_xgb_full.py --compact runs again), and prob_calibrator.joblib still wraps
+the original fit.
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+from sklearn.metrics import roc_auc_score
+from sklearn.model_selection import train_test_split
+
+from train_xgb_full import OUT_DIR, TARGET_COL, HISTORY_KEYS, preprocess
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+from app.employer_stats import feature_column  # noqa: E402
+
+LOG_PATH = os.path.join("data", "new_user_submissions.csv")
+
+
+def load_current(models_dir):
+    bst = xgb.Booster()
+    bst.load_model(os.path.join(models_dir, "xgb_final.json"))
+    enc_path = os.path.join(models_dir, "feature_encoder.joblib")
+    enc = joblib.load(enc_path) if os.path.exists(enc_path) else {}
+    scaler_path = os.path.join(models_dir, "feature_scaler.joblib")
+    scaler = joblib.load(scaler_path) if os.path.exists(scaler_path) else None
+    with open(os.path.join(models_dir, "metadata.json")) as f:
+        meta = json.load(f)
+    return bst, enc, scaler, meta
+
+
+def load_labelled(path, features):
+    df = pd.read_csv(path, low_memory=False)
+    if TARGET_COL not in df.columns:
+        raise SystemExit(f"⚠️ {path} has no {TARGET_COL} column; fill in outcomes before retraining.")
+    labelled = df[TARGET_COL].notna() & (df[TARGET_COL].astype(str).str.strip() != "")
+    if (~labelled).any():
+        print(f"⚠️ Skipping {int((~labelled).sum())} rows without an outcome.")
+    df = preprocess(df[labelled])
+    # filled from the persisted employer stats exactly as the app serves them,
+    # never re-estimated from the batch's own labels
+    for col in HISTORY_KEYS:
+        if col in features:
+            df[col] = feature_column(col, df["EMPLOYER_NAME"], df["SOC_CODE"], df["WORKSITE_STATE"])
+    return df
+
+
+def encode(df, encoders, scaler, features, extend=False):
+    """
+    Model matrix with the saved encoders and scaler.
+
+    Returns (X, encoders, added) where `added` counts the new ids per column
+    (always empty unless extend=True).
+    """
+    X = pd.DataFrame(index=df.index)
+    out, added = {}, {}
+    for col, mapping in encoders.items():
+        vals = df[col].astype(str) if col in df.columns else pd.Series("MISSING", index=df.index)
+        if extend:
+            # most frequent first, after every existing id
+            unseen = vals[~vals.isin(list(mapping))].value_counts().index.tolist()
+            if unseen:
+                start = max(mapping.values(), default=-1) + 1
+                mapping = dict(mapping, **{v: start + i for i, v in enumerate(unseen)})
+                added[col] = len(unseen)
+        out[col] = mapping
+        X[col] = vals.map(mapping).fillna(mapping.get("MISSING", 0)).astype(int)
+
+    num_cols = list(getattr(scaler, "feature_names_in_", []))
+    for col in num_cols:
+        X[col] = pd.to_numeric(df[col], errors="coerce").fillna(0) if col in df.columns else 0.0
+    if scaler is not None and num_cols:
+        X[num_cols] = scaler.transform(X[num_cols])
+
+    for col in HISTORY_KEYS:
+        if col in df.columns:
+            X[col] = df[col].astype(float)
+    for col in features:
+        if col not in X.columns:
+            X[col] = 0
+    return X[features], out, added
+
+
+def _auc(bst, X, y):
+    if y.nunique() < 2:
+        return None
+    return float(roc_auc_score(y, bst.inplace_predict(X.to_numpy(dtype=np.float32))))
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("data", nargs="?", default=LOG_PATH)
+    ap.add_argument("--models-dir", default=OUT_DIR)
+    ap.add_argument("--rounds", type=int, default=50, help="boosting rounds to append at most")
+    ap.add_argument("--eta", type=float, default=0.05)
+    ap.add_argument("--max-depth", type=int, default=8)
+    ap.add_argument("--holdout", type=float, default=0.2, help="share of rows kept for the AUC guard")
+    ap.add_argument("--early-stop", type=float, default=0.2, help="share of the training rows used for early stopping")
+    ap.add_argument("--max-auc-drop", type=float, default=0.002)
+    ap.add_argument("--extend-categories", action="store_true", help="give unseen categories new ids")
+    ap.add_argument("--reference", default=None, help="labelled sample of the original data, also guarded")
+    ap.add_argument("--dry-run", action="store_true", help="evaluate only, write nothing")
+    args = ap.parse_args(argv)
+
+    t0 = time.time()
+    bst, enc, scaler, meta = load_current(args.models_dir)
+    features = bst.feature_names or meta["features"]
+    df = load_labelled(args.data, features)
+    y = df[TARGET_COL].astype(int)
+    print(f"Loaded {len(df)} labelled rows from {args.data}.")
+    if len(df) < 20 or y.nunique() < 2:
+        raise SystemExit("⚠️ Need at least 20 labelled rows with both outcomes to retrain.")
+
+    train_idx, hold_idx = train_test_split(df.index, test_size=args.holdout, random_state=42, stratify=y)
+    # early stopping gets its own rows so the guard below scores on data nothing was tuned on
+    train_idx, stop_idx = train_test_split(train_idx, test_size=args.early_stop, random_state=42,
+                                           stratify=y.loc[train_idx])
+    X_train, new_enc, added = encode(df.loc[train_idx], enc, scaler, features, extend=args.extend_categories)
+    X_stop, _, _ = encode(df.loc[stop_idx], new_enc, scaler, features)
+    # holdout ids come from the new encoders, so extended categories are scored as the updated app would
+    X_hold, _, _ = encode(df.loc[hold_idx], new_enc, scaler, features)
+    X_hold_base, _, _ = encode(df.loc[hold_idx], enc, scaler, features)
+    y_train, y_stop, y_hold = y.loc[train_idx], y.loc[stop_idx], y.loc[hold_idx]
+    if added:
+        print("New categories:", added)
+
+    params = {
+        "objective": "binary:logistic",
+        "eta": args.eta,
+        "max_depth": args.max_depth,
+        "subsample": 0.9,
+        "colsample_bytree": 0.8,
+        "tree_method": "hist",
+        "eval_metric": "auc",
+    }
+    base_rounds = bst.num_boosted_rounds()
+    dtrain = xgb.DMatrix(X_train, label=y_train, feature_names=features)
+    dstop = xgb.DMatrix(X_stop, label=y_stop, feature_names=features)
+    updated = xgb.train(params, dtrain, args.rounds, evals=[(dstop, "early_stop")], xgb_model=bst,
+                        early_stopping_rounds=10, verbose_eval=False)
+    updated = updated[: updated.best_iteration + 1]
+
+    checks = {"holdout": (_auc(bst, X_hold_base, y_hold), _auc(updated, X_hold, y_hold))}
+    if args.reference:
+        ref = load_labelled(args.reference, features)
+        X_ref, _, _ = encode(ref, new_enc, scaler, features)
+        X_ref_base, _, _ = encode(ref, enc, scaler, features)
+        y_ref = ref[TARGET_COL].astype(int)
+        checks["reference"] = (_auc(bst, X_ref_base, y_ref), _auc(updated, X_ref, y_ref))
+
+    accepted = updated.num_boosted_rounds() > base_rounds
+    for name, (before, after) in checks.items():
+        if before is None or after is None:
+            print(f"⚠️ {name}: AUC undefined (one outcome only)")
+            accepted = False
+            continue
+        ok = after >= before - args.max_auc_drop
+        accepted = accepted and ok
+        print(f"{name:<10} AUC {before:.4f} -> {after:.4f} ({after - before:+.4f}) {'ok' if ok else 'REGRESSED'}")
+
+    version = time.strftime("%Y%m%d-%H%M%S")
+    report = {
+        "version": version,
+        "parent": meta.get("version"),
+        "data": args.data,
+        "rows": len(df),
+        "rounds_added": updated.num_boosted_rounds() - base_rounds,
+        "new_categories": added,
+        "auc": {k: {"before": b, "after": a} for k, (b, a) in checks.items()},
+        "accepted": accepted,
+        "seconds": round(time.time() - t0, 1),
+    }
+    print(f"Appended {report['rounds_added']} rounds to {base_rounds} in {report['seconds']}s.")
+
+    if not accepted:
+        print("⚠️ Update rejected; current model kept.")
+        sys.exit(1)
+    if args.dry_run:
+        print("✅ Update would be accepted (dry run, nothing written).")
+        return
+
+    archive = os.path.join(args.models_dir, "versions", meta.get("version") or f"before-{version}")
+    os.makedirs(archive, exist_ok=True)
+    for name in ("xgb_final.json", "feature_encoder.joblib", "metadata.json", "xgb_compact.json"):
+        src = os.path.join(args.models_dir, name)
+        if os.path.exists(src):
+            shutil.move(src, os.path.join(archive, name))
+
+    updated.save_model(os.path.join(args.models_dir, "xgb_final.json"))
+    joblib.dump(new_enc, os.path.join(args.models_dir, "feature_encoder.joblib"))
+    meta = dict(meta, features=features, version=version, parent=report["parent"],
+                encoder_version=meta.get("encoder_version", 1) + (1 if added else 0))
+    meta.pop("compact_version", None)
+    with open(os.path.join(args.models_dir, "metadata.json"), "w") as f:
+        json.dump(meta, f, indent=2)
+    with open(os.path.join(args.models_dir, "incremental_report.json"), "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"✅ Model {version} saved; previous artifacts in {archive}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,9 @@
-import os, json, pandas as pd, numpy as np
+import os, sys, json, shutil, time, pandas as pd, numpy as np
 from collections import Counter
 import joblib
 import xgboost as xgb
 from sklearn.preprocessing import StandardScaler
-from sklearn.model_selection import train_test_split
+from sklearn.model_selection import KFold, train_test_split
 from sklearn.calibration import CalibratedClassifierCV
 
 CSV_PATH = os.path.join("data", "H1B_LCA_Disclosure_Data.csv")
@@ -21,6 +21,22 @@ FEATURE_COLUMNS = [
 ]
 TARGET_COL = "CASE_STATUS"
 
+# --with-history: add the employer/SOC certification-rate features the app
+# fills from data/cache/employer_stats.parquet (app/build_employer_stats.py)
+WITH_HISTORY = "--with-history" in sys.argv or os.getenv("TRAIN_WITH_HISTORY") == "1"
+PRIOR_WEIGHT = 20  # same smoothing as build_employer_stats.py
+HISTORY_FOLDS = 5
+HISTORY_KEYS = {
+    "HIST_EMPLOYER_RATE": ["EMPLOYER_NAME"],
+    "HIST_SOC_RATE": ["SOC_CODE"],
+    "HIST_EMPLOYER_STATE_RATE": ["EMPLOYER_NAME", "WORKSITE_STATE"],
+}
+
+# --compact: also write xgb_compact.json (served to bulk scoring) and
+# compact_report.json comparing it with the full model (train/compact.py).
+# Either way a compact model from an earlier run is moved to models/versions/.
+WITH_COMPACT = "--compact" in sys.argv or os.getenv("TRAIN_COMPACT") == "1"
+
 def preprocess(df):
     df = df.copy()
     df = df.dropna(subset=[TARGET_COL])
@@ -39,6 +55,54 @@ def preprocess(df):
     df = df.fillna("MISSING")
     return df
 
+def history_keys(df):
+    """Employer / SOC / state keys normalized like app/employer_stats.py; NaN when unknown."""
+    return pd.DataFrame({
+        "EMPLOYER_NAME": df["EMPLOYER_NAME"].astype(str).str.upper().str.split().str.join(" "),
+        "SOC_CODE": df["SOC_CODE"].astype(str).str.strip().str.extract(r"^(\d{2}-\d{4})", expand=False),
+        "WORKSITE_STATE": df["WORKSITE_STATE"].astype(str).str.strip().str.upper(),
+    }, index=df.index).replace({"MISSING": np.nan, "": np.nan})
+
+
+def _smoothed_rates(keys, y, cols, fit, apply):
+    """Rates fitted on the `fit` rows, for the `apply` rows; unseen or unknown keys get the prior."""
+    prior = y[fit].mean()
+    known = keys[cols].notna().all(axis=1)
+    stats = (keys.loc[fit & known, cols].assign(_y=y[fit & known])
+             .groupby(cols)["_y"].agg(["sum", "size"]).reset_index())
+    rows = keys.loc[apply, cols].merge(stats, on=cols, how="left")
+    rate = (rows["sum"] + PRIOR_WEIGHT * prior) / (rows["size"] + PRIOR_WEIGHT)
+    rate = rate.fillna(prior).to_numpy()
+    return np.where(known[apply].to_numpy(), rate, prior)
+
+
+def add_history_features(df, train_index=None):
+    """
+    Smoothed certification rates per employer, SOC and (employer, state),
+    target-encoded out of fold so no row's feature sees its own label: the
+    training rows are split into HISTORY_FOLDS folds and each fold is encoded
+    from the other folds; every other row (the test split) is encoded from
+    the whole training split. train_index=None treats every row as training.
+    """
+    y = df[TARGET_COL].astype(float)
+    keys = history_keys(df)
+    is_train = np.ones(len(df), dtype=bool) if train_index is None else df.index.isin(train_index)
+    fold = np.full(len(df), -1)
+    train_pos = np.flatnonzero(is_train)
+    for f, (_, part) in enumerate(KFold(HISTORY_FOLDS, shuffle=True, random_state=42).split(train_pos)):
+        fold[train_pos[part]] = f
+    for name, cols in HISTORY_KEYS.items():
+        rate = np.empty(len(df), dtype=np.float32)
+        for f in range(HISTORY_FOLDS):
+            apply = fold == f
+            rate[apply] = _smoothed_rates(keys, y, cols, is_train & ~apply, apply)
+        if (~is_train).any():
+            rate[~is_train] = _smoothed_rates(keys, y, cols, is_train, ~is_train)
+        df[name] = rate
+    print(f"Added {len(HISTORY_KEYS)} history features ({HISTORY_FOLDS}-fold out-of-fold).")
+    return df
+
+
 def encode_and_scale(df):
     print("Encoding and scaling features...")
     encoders = {}
@@ -75,21 +139,77 @@ def encode_and_scale(df):
     scaler = StandardScaler()
     X[num_cols] = scaler.fit_transform(X[num_cols])
 
+    # rates are already in [0, 1]; left unscaled so the app can fill them as-is
+    for col in HISTORY_KEYS:
+        if col in df.columns:
+            X[col] = df[col].astype(float)
+
     print(f"Encoded {len(cat_cols)} categorical + {len(num_cols)} numeric features.")
     return X, encoders, scaler
 
 
+def drift_baseline(X, probs, path, bins=10):
+    """
+    Reference distributions for app/drift.py: interior quantile edges per
+    feature and for the predicted probability, with the share of rows in each
+    bin (bin i holds values with edges[i-1] <= v < edges[i]).
+    """
+    qs = np.linspace(0, 1, bins + 1)[1:-1]
+
+    def spec(values):
+        values = np.asarray(values, dtype=float)
+        edges = np.unique(np.quantile(values, qs))
+        counts = np.bincount(np.searchsorted(edges, values, side="right"), minlength=len(edges) + 1)
+        return {"edges": edges.round(6).tolist(), "expected": (counts / counts.sum()).round(6).tolist()}
+
+    baseline = {
+        "rows": len(X),
+        "features": {col: spec(X[col]) for col in X.columns},
+        "probability": spec(probs),
+    }
+    with open(path, "w") as f:
+        json.dump(baseline, f)
+    print(f"Drift baseline written for {len(X.columns)} features.")
+
+
+def retire_compact(version):
+    """Move an earlier run's compact model out of OUT_DIR so bulk never serves it with new encoders."""
+    src = os.path.join(OUT_DIR, "xgb_compact.json")
+    if not os.path.exists(src):
+        return
+    try:
+        with open(os.path.join(OUT_DIR, "metadata.json")) as f:
+            previous = json.load(f).get("version")
+    except Exception:
+        previous = None
+    archive = os.path.join(OUT_DIR, "versions", previous or f"before-{version}")
+    os.makedirs(archive, exist_ok=True)
+    for name in ("xgb_compact.json", "compact_report.json"):
+        if os.path.exists(os.path.join(OUT_DIR, name)):
+            shutil.move(os.path.join(OUT_DIR, name), os.path.join(archive, name))
+    print(f"⚠️ Previous compact model moved to {archive}")
+
+
 def main():
     print("Loading CSV...")
     df = pd.read_csv(CSV_PATH, low_memory=False)
     df = preprocess(df)
+    # split first so the target-derived history features only learn from training rows
+    train_idx, test_idx = train_test_split(df.index, test_size=0.1, random_state=42, stratify=df[TARGET_COL])
+    # validation rows for the compact model (trimming, distillation, selection) are held out
+    # in every mode, so --compact only adds an artifact and never changes xgb_final.json
+    train_idx, valid_idx = train_test_split(train_idx, test_size=0.1, random_state=42,
+                                            stratify=df.loc[train_idx, TARGET_COL])
+    if WITH_HISTORY:
+        df = add_history_features(df, train_idx)
     print("Preprocessing done.")
     X, enc, scaler = encode_and_scale(df)
     y = df[TARGET_COL].astype(int)
     print("Encoding done.")
 
-
-    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.1, random_state=42, stratify=y)
+    X_train, y_train = X.loc[train_idx], y.loc[train_idx]
+    X_valid, y_valid = X.loc[valid_idx], y.loc[valid_idx]
+    X_test, y_test = X.loc[test_idx], y.loc[test_idx]
     print("Training XGBoost...")
     model = xgb.XGBClassifier(
         n_estimators=500,
@@ -102,20 +222,34 @@ def main():
         use_label_encoder=False,
         n_jobs=-1
     )
-    model.fit(X_train, y_train, eval_set=[(X_test, y_test)], verbose=100)
+    model.fit(X_train, y_train, eval_set=[(X_valid, y_valid), (X_test, y_test)], verbose=100)
 
     print("Calibrating probabilities...")
     calibrator = CalibratedClassifierCV(estimator=model, method="sigmoid", cv="prefit")
     calibrator.fit(X_test, y_test)
 
     print("Saving artifacts...")
+    version = time.strftime("%Y%m%d-%H%M%S")
+    retire_compact(version)
     model.save_model(os.path.join(OUT_DIR, "xgb_final.json"))
     joblib.dump(enc, os.path.join(OUT_DIR, "feature_encoder.joblib"))
     joblib.dump(scaler, os.path.join(OUT_DIR, "feature_scaler.joblib"))
     joblib.dump(calibrator, os.path.join(OUT_DIR, "prob_calibrator.joblib"))
-    metadata = {"features": list(X.columns)}
+    metadata = {"features": list(X.columns), "version": version}
     with open(os.path.join(OUT_DIR, "metadata.json"), "w") as f:
         json.dump(metadata, f, indent=2)
+    drift_baseline(X_test, model.predict_proba(X_test)[:, 1], os.path.join(OUT_DIR, "drift_baseline.json"))
+
+    if WITH_COMPACT:
+        from compact import build_compact
+        print("Building compact model...")
+        best_iteration = int(np.argmax(model.evals_result()["validation_0"]["auc"]))  # X_valid
+        report = build_compact(model.get_booster(), X_train, X_valid, y_valid, X_test, y_test, best_iteration, OUT_DIR)
+        if report["selected"]:
+            # model_utils.load_compact only serves a compact model stamped with this version
+            metadata["compact_version"] = version
+            with open(os.path.join(OUT_DIR, "metadata.json"), "w") as f:
+                json.dump(metadata, f, indent=2)
 
     print("✅ Training complete. Model ready.")
 